@@ -9,7 +9,7 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent))
 
 # Import utility modules
-from utils.load_data import load_all_data
+from utils.load_data import load_page_data, load_page_aggregates, load_page_unlabelled_rows
 from utils.preprocessing import preprocess_data
 from pages_content import home, data_exploration, clustering, classification, about
 
@@ -57,6 +57,12 @@ NAV_ITEMS = [
     {"icon": "ℹ️", "label": "About"}
 ]
 
+# Dataset columns read by the sidebar statistics
+SIDEBAR_COLUMNS = {
+    'data': ['Status_Dropout', 'Passing_ratio_1st_sem', 'Scholarship_holder'],
+    'labelled': ['Risk_Category']
+}
+
 # Initialize session state
 if 'page' not in st.session_state:
     st.session_state.page = NAV_ITEMS[0]["label"]
@@ -250,9 +256,12 @@ def main():
     # Load custom CSS
     load_css()
     
-    # Load all required data
+    # Only the sidebar statistics columns are loaded up front, each page
+    # loads the columns it declares when it's opened. The statistics come
+    # from running aggregates that are updated as new rows are appended.
     with st.spinner("Loading data..."):
-        df, df_with_risk_labels, clustering_data = load_all_data()
+        stats = load_page_aggregates(SIDEBAR_COLUMNS, 'data')
+        risk_stats = load_page_aggregates(SIDEBAR_COLUMNS, 'labelled')
     
     # Sidebar
     with st.sidebar:
@@ -311,36 +320,30 @@ def main():
                 font-size: 0.9rem;
                 color: {COLORS['text_secondary']};
             ">
-                <div style="margin-bottom: 0.5rem;"><b>Total Students:</b> {df.shape[0]}</div>
+                <div style="margin-bottom: 0.5rem;"><b>Total Students:</b> {stats.n_rows}</div>
             """
             
-            if 'Status_Dropout' in df.columns:
-                if df['Status_Dropout'].dtype == 'object':
-                    dropout_rate = df['Status_Dropout'].map({'True': 1, 'False': 0}).mean() * 100
-                else:
-                    dropout_rate = df['Status_Dropout'].mean() * 100
+            if 'Status_Dropout' in stats.columns:
+                dropout_rate = stats.mean('Status_Dropout', {'True': 1, 'False': 0}) * 100
                 stats_content += f'<div style="margin-bottom: 0.5rem;"><b>Dropout Rate:</b> {dropout_rate:.1f}%</div>'
             
-            if 'Passing_ratio_1st_sem' in df.columns:
+            if 'Passing_ratio_1st_sem' in stats.columns:
                 try:
-                    avg_passing_ratio = df['Passing_ratio_1st_sem'].astype(float).mean() * 100
+                    avg_passing_ratio = stats.mean('Passing_ratio_1st_sem') * 100
                     stats_content += f'<div style="margin-bottom: 0.5rem;"><b>Avg. Passing Ratio:</b> {avg_passing_ratio:.1f}%</div>'
                 except:
                     stats_content += '<div style="margin-bottom: 0.5rem;"><b>Avg. Passing Ratio:</b> N/A</div>'
             
-            if 'Scholarship_holder' in df.columns:
-                if df['Scholarship_holder'].dtype == 'object':
-                    scholarship_rate = df['Scholarship_holder'].map({'Yes': 1, 'No': 0, 'True': 1, 'False': 0}).mean() * 100
-                else:
-                    scholarship_rate = df['Scholarship_holder'].mean() * 100
+            if 'Scholarship_holder' in stats.columns:
+                scholarship_rate = stats.mean('Scholarship_holder', {'Yes': 1, 'No': 0, 'True': 1, 'False': 0}) * 100
                 stats_content += f'<div style="margin-bottom: 0.5rem;"><b>Scholarship Rate:</b> {scholarship_rate:.1f}%</div>'
             
             stats_content += '<div style="margin: 0.7rem 0 0.5rem 0;"><b>Risk Categories:</b></div>'
             
-            if 'Risk_Category' in df_with_risk_labels.columns:
-                risk_counts = df_with_risk_labels['Risk_Category'].value_counts()
+            if 'Risk_Category' in risk_stats.columns:
+                risk_counts = risk_stats.value_counts('Risk_Category')
                 for category, count in risk_counts.items():
-                    percentage = (count / len(df_with_risk_labels)) * 100
+                    percentage = (count / risk_stats.n_rows) * 100
                     color = COLORS["charts"]["high_risk"] if category == "High" else (COLORS["charts"]["medium_risk"] if category == "Medium" else COLORS["charts"]["low_risk"])
                     stats_content += f'<div style="margin-bottom: 0.3rem; margin-left: 1rem; display: flex; align-items: center;"><span style="display: inline-block; width: 10px; height: 10px; border-radius: 50%; background-color: {color}; margin-right: 0.5rem;"></span> {category}: {count} ({percentage:.1f}%)</div>'
             
@@ -361,14 +364,34 @@ def main():
     # Main content
     selected = st.session_state.page
     
+    # Students appended to data.csv join the labelled dataset only once their
+    # labels are appended too; say so on the pages that read it
+    if selected in ("Data Exploration", "Clustering Analysis", "Risk Prediction"):
+        unlabelled = load_page_unlabelled_rows(SIDEBAR_COLUMNS)
+        if unlabelled:
+            st.info(
+                f"{unlabelled:,} newly added students have no risk labels yet and are left out of the "
+                "risk and cluster views until their labels are appended (python -m utils.append labels ...)."
+            )
+    
+    # Charted frames get their float32 columns back as float64, see load_page_data
     if selected == "Home":
-        home.show(df, COLORS)
+        home.show(load_page_data(home.PAGE_COLUMNS, 'data', display=True), COLORS)
     elif selected == "Data Exploration":
-        data_exploration.show(df, df_with_risk_labels, COLORS)
+        data_exploration.show(
+            load_page_data(data_exploration.PAGE_COLUMNS, 'data', display=True),
+            load_page_data(data_exploration.PAGE_COLUMNS, 'labelled', display=True),
+            COLORS
+        )
     elif selected == "Clustering Analysis":
-        clustering.show(df, clustering_data, df_with_risk_labels, COLORS)
+        clustering.show(
+            load_page_data(clustering.PAGE_COLUMNS, 'data', display=True),
+            load_page_data(clustering.PAGE_COLUMNS, 'labelled', display=True),
+            COLORS,
+            load_page_aggregates(clustering.PAGE_COLUMNS, 'labelled')
+        )
     elif selected == "Risk Prediction":
-        classification.show(df_with_risk_labels, COLORS)
+        classification.show(load_page_data(classification.PAGE_COLUMNS, 'labelled'), COLORS)
     elif selected == "About":
         about.show(COLORS)
 
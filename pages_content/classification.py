@@ -1,14 +1,31 @@
+import os
+import tempfile
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from utils.classification import predict_risk_level, get_recommendations
-from utils.preprocessing import prepare_features_for_prediction
+from utils.classification import predict_risk_level, get_recommendations, score_roster_in_chunks, load_feature_pipeline
+from utils.cluster_index import assign_cluster, cluster_features
+from utils.reduced_svm import load_reduced_model, serving_checked
+
+# The prediction form and roster upload don't read the datasets
+PAGE_COLUMNS = {}
 
 def show(df_with_risk_labels, COLORS):
     # Page title
     st.title("Dropout Risk Prediction")
     st.markdown("##### Predict the risk level for a student based on academic and demographic information")
     
+    # Choose between the single student form and roster upload
+    mode = st.radio(
+        "Prediction Mode",
+        options=["Single Student", "Bulk Upload"],
+        horizontal=True
+    )
+    
+    if mode == "Bulk Upload":
+        show_bulk_upload(COLORS)
+        return
+    
     # Create two columns layout
     col1, col2 = st.columns([1, 1])
     
@@ -54,6 +71,14 @@ def show(df_with_risk_labels, COLORS):
             step=1
         )
         
+        grade_1st_sem = st.slider(
+            "Curricular Units Grade (1st semester, 0-20)",
+            min_value=0.0,
+            max_value=20.0,
+            value=12.0,
+            step=0.5
+        )
+        
         # Calculate passing ratio automatically
         passing_ratio = units_approved / units_enrolled if units_enrolled > 0 else 0
         
@@ -165,9 +190,6 @@ def show(df_with_risk_labels, COLORS):
             
             input_data['Marital_status'] = marital_status_mapping.get(marital_status, 1)
             
-            # Prepare features for prediction
-            prepared_input = prepare_features_for_prediction(input_data)
-            
             # Make prediction
             result = predict_risk_level(input_data)
             
@@ -175,6 +197,9 @@ def show(df_with_risk_labels, COLORS):
             if 'error' in result:
                 st.error(result['error'])
             else:
+                if 'model_error' in result:
+                    st.warning(f"The risk model could not score this input, showing the rule-based assessment: {result['model_error']}")
+                
                 # Display risk level with appropriate color
                 risk_level = result['risk_level']
                 risk_colors = {
@@ -217,6 +242,8 @@ def show(df_with_risk_labels, COLORS):
                     st.markdown(f"- {rec}")
                 
                 st.markdown("</div>", unsafe_allow_html=True)
+                
+                show_student_cluster(units_enrolled, units_approved, grade_1st_sem, COLORS)
         else:
             # Display placeholder with styled message
             st.markdown(f"""
@@ -284,4 +311,176 @@ def show(df_with_risk_labels, COLORS):
             fig.update_traces(marker_line_width=0)
             
             st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
-            st.markdown("</div>", unsafe_allow_html=True)
\ No newline at end of file
+            st.markdown("</div>", unsafe_allow_html=True)
+
+def show_student_cluster(units_enrolled, units_approved, grade_1st_sem, COLORS):
+    """
+    Show the cluster the student falls in and that cluster's risk mix
+    """
+    try:
+        # Same feature scaling as the labelled dataset the clusters were fit on
+        student = pd.DataFrame({
+            'Curricular_units_1st_sem_enrolled': [units_enrolled],
+            'Curricular_units_1st_sem_approved': [units_approved],
+            'Curricular_units_1st_sem_grade': [grade_1st_sem]
+        })
+        features = cluster_features(student).iloc[0].to_dict()
+        assignment = assign_cluster(features)
+    except Exception as e:
+        st.info(f"Cluster assignment is unavailable: {e}")
+        return
+    
+    st.markdown("""
+    <div class="form-section">
+        <h3>Student Cluster</h3>
+    """, unsafe_allow_html=True)
+    
+    st.markdown(f"Closest to **Cluster {assignment['cluster']}** (distance {assignment['distance']:.2f})")
+    if not assignment['within_radius']:
+        st.caption("This student is farther from the center than any student in the cluster, so the cluster may describe them poorly.")
+    
+    distribution = pd.DataFrame({
+        'Risk Category': list(assignment['risk_distribution'].keys()),
+        'Share': list(assignment['risk_distribution'].values())
+    })
+    
+    # A cluster no labelled student falls in has no risk mix to show
+    if distribution['Share'].isna().any():
+        st.warning(f"No labelled students fall in Cluster {assignment['cluster']}, so its risk mix is unknown.")
+        st.markdown("</div>", unsafe_allow_html=True)
+        return
+    
+    fig = px.bar(
+        distribution,
+        x='Risk Category',
+        y='Share',
+        text_auto='.0%',
+        color_discrete_sequence=[COLORS["primary"]]
+    )
+    fig.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(color=COLORS["text"]),
+        xaxis=dict(title=None, showgrid=False, zeroline=False),
+        yaxis=dict(title=None, showgrid=True, gridcolor='rgba(255,255,255,0.1)', zeroline=False, tickformat='.0%'),
+        showlegend=False,
+        height=250,
+        margin=dict(l=20, r=20, t=20, b=20)
+    )
+    fig.update_traces(marker_line_width=0)
+    st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
+    
+    st.markdown("</div>", unsafe_allow_html=True)
+
+def show_bulk_upload(COLORS):
+    st.subheader("Score a Student Roster")
+    st.markdown("Upload a CSV in the same format as `data.csv` (semicolon-separated). "
+                "The file is scored in chunks, so large rosters can be processed without loading them all at once.")
+    
+    uploaded = st.file_uploader("Roster CSV", type=["csv"])
+    
+    # The reduced model is offered only when it was built from the current
+    # SVM and its build confirmed that scoring reaches it
+    reduced = False
+    reduced_model = load_reduced_model()
+    if reduced_model is not None and serving_checked(reduced_model) and load_feature_pipeline(True).error is None:
+        report = reduced_model.report
+        choice = st.radio(
+            "Scoring Model",
+            options=["Full SVM", "Reduced (faster)"],
+            horizontal=True
+        )
+        reduced = choice == "Reduced (faster)"
+        st.caption(
+            f"Reduced model: {report['n_components']:,} landmarks instead of {report['n_support_vectors']:,} support vectors, "
+            f"held-out accuracy {report['reduced_accuracy']:.1%} vs {report['full_accuracy']:.1%} "
+            f"({report['accuracy_delta'] * 100:+.1f} points)"
+        )
+    
+    model_error = load_feature_pipeline(reduced).error
+    if model_error is not None:
+        st.warning(f"The risk model can't score rosters, rows get the rule-based assessment: {model_error}")
+    
+    if uploaded is not None and st.button("Score Roster", type="primary", use_container_width=True):
+        # Remove the output of a previous run before starting a new one
+        previous = st.session_state.pop('scored_roster_path', None)
+        if previous and os.path.exists(previous):
+            os.remove(previous)
+        
+        progress = st.progress(0.0, text="Scoring roster...")
+        distribution = st.empty()
+        
+        # Scored rows go straight to disk instead of accumulating in memory
+        output = tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False, encoding='utf-8-sig', newline='')
+        risk_counts = {}
+        rows_scored = 0
+        
+        try:
+            with output:
+                for rows_scored, risk_counts in score_roster_in_chunks(uploaded, output, reduced=reduced):
+                    done = min(uploaded.tell() / max(uploaded.size, 1), 1.0)
+                    progress.progress(done, text=f"Scored {rows_scored:,} students...")
+                    
+                    with distribution.container():
+                        show_risk_distribution(risk_counts, COLORS)
+        except Exception as e:
+            os.remove(output.name)
+            st.error(f"Error scoring roster: {e}")
+            return
+        
+        progress.progress(1.0, text=f"Scored {rows_scored:,} students")
+        st.session_state.scored_roster_path = output.name
+        st.session_state.scored_roster_counts = risk_counts
+        st.session_state.scored_roster_name = uploaded.name
+    
+    # Offer the scored file from the last completed run
+    scored_path = st.session_state.get('scored_roster_path')
+    if scored_path and os.path.exists(scored_path):
+        with open(scored_path, 'rb') as f:
+            st.download_button(
+                "Download Scored Roster",
+                data=f,
+                file_name=f"scored_{st.session_state.get('scored_roster_name', 'roster.csv')}",
+                mime="text/csv",
+                use_container_width=True
+            )
+
+def show_risk_distribution(risk_counts, COLORS):
+    total = sum(risk_counts.values())
+    if total == 0:
+        return
+    
+    distribution = pd.DataFrame({
+        'Risk Level': list(risk_counts.keys()),
+        'Proportion': [count / total for count in risk_counts.values()]
+    })
+    
+    # Create color map
+    color_map = {
+        'High': COLORS["charts"]["high_risk"],
+        'Medium': COLORS["charts"]["medium_risk"],
+        'Low': COLORS["charts"]["low_risk"]
+    }
+    
+    fig = px.bar(
+        distribution,
+        x='Risk Level',
+        y='Proportion',
+        color='Risk Level',
+        color_discrete_map=color_map,
+        category_orders={'Risk Level': ['Low', 'Medium', 'High']},
+        text_auto='.0%'
+    )
+    
+    fig.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(color=COLORS["text"]),
+        xaxis=dict(title=None, showgrid=False, zeroline=False),
+        yaxis=dict(title=None, showgrid=True, gridcolor='rgba(255,255,255,0.1)', zeroline=False),
+        showlegend=False,
+        margin=dict(l=20, r=20, t=20, b=20)
+    )
+    fig.update_traces(marker_line_width=0)
+    
+    st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
@@ -3,9 +3,55 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from utils.clustering import load_or_train_meanshift_model, cluster_interpretation
+from utils.cluster_engines import CLUSTER_ENGINES
+from utils.clustering import CLUSTER_TRAINING_JOB, load_cluster_model, submit_cluster_training, cluster_interpretation, CLUSTER_PROFILE_FEATURES
+from utils.jobs import get_job_runner
 
-def show(df, clustering_data, df_with_risk_labels, COLORS):
+# Columns of each dataset this page reads
+PAGE_COLUMNS = {
+    'labelled': ['Cluster', 'Risk_Category'] + CLUSTER_PROFILE_FEATURES
+}
+
+@st.fragment(run_every=1.0)
+def training_progress():
+    """
+    Progress of the running training job, polled every second
+    """
+    job = get_job_runner().active(CLUSTER_TRAINING_JOB)
+    if job is None:
+        # Finished: rerun the whole page so it picks up the new model
+        st.rerun()
+    
+    eta = f", about {job.eta:.0f}s left" if job.eta is not None else ""
+    st.progress(job.fraction, text=f"{job.name}: {job.message}{eta}")
+    if st.button("Cancel training", key="cancel_cluster_training"):
+        job.cancel()
+
+def training_status(model):
+    """
+    The clustering model's state, with background training
+    """
+    job = get_job_runner().latest(CLUSTER_TRAINING_JOB)
+    if job is not None and job.active:
+        training_progress()
+        return
+    
+    if model is None:
+        st.warning("Clustering model not available. Train it below, or offline with: python -m utils.cluster_engines --train")
+    if job is not None and job.status == 'failed':
+        st.error(f"Clustering model training failed: {job.error}")
+    elif job is not None and job.status == 'cancelled':
+        st.info("Clustering model training was cancelled.")
+    
+    with st.expander("Clustering model", expanded=model is None):
+        if model is not None:
+            st.markdown(f"{type(model).__name__} with {len(model.cluster_centers_)} clusters.")
+        engine = st.selectbox("Engine", ['auto'] + list(CLUSTER_ENGINES), key="cluster_training_engine")
+        if st.button("Train in the background", key="start_cluster_training"):
+            submit_cluster_training(None if engine == 'auto' else engine)
+            st.rerun()
+
+def show(df, df_with_risk_labels, COLORS, risk_stats=None):
     # Page title
     st.title("Clustering Analysis")
     st.markdown("##### Identifying natural groupings among students and analyzing risk patterns")
@@ -19,16 +65,19 @@ def show(df, clustering_data, df_with_risk_labels, COLORS):
     </div>
     """, unsafe_allow_html=True)
     
-    # Load or train MeanShift model
-    with st.spinner("Loading clustering model..."):
-        model = load_or_train_meanshift_model(clustering_data)
+    # Shared MeanShift model, trained offline or by a background job
+    model = load_cluster_model()
+    training_status(model)
     
     # Display cluster visualizations
     st.subheader("Risk Category Distribution")
     
     # Create risk category distribution plot
     if 'Risk_Category' in df_with_risk_labels.columns:
-        risk_counts = df_with_risk_labels['Risk_Category'].value_counts().reset_index()
+        if risk_stats is not None:
+            risk_counts = risk_stats.value_counts('Risk_Category').reset_index()
+        else:
+            risk_counts = df_with_risk_labels['Risk_Category'].value_counts().reset_index()
         risk_counts.columns = ['Risk_Category', 'Count']
         
         # Order categories
@@ -142,7 +191,7 @@ def show(df, clustering_data, df_with_risk_labels, COLORS):
     st.subheader("Cluster Interpretation")
     
     # Get cluster interpretations
-    interpretations = cluster_interpretation(df_with_risk_labels)
+    interpretations = cluster_interpretation(df_with_risk_labels, risk_stats)
     
     # Display interpretations
     if interpretations:
@@ -5,6 +5,12 @@ import plotly.express as px
 import plotly.graph_objects as go
 import plotly.figure_factory as ff
 
+# Columns of each dataset this page reads, None for all of them
+PAGE_COLUMNS = {
+    'data': None,
+    'labelled': ['Risk_Category', 'Scholarship_holder', 'Tuition_fees_up_to_date']
+}
+
 
 def show(df, df_with_risk_labels, COLORS):
     # Page title
@@ -96,7 +102,7 @@ def show(df, df_with_risk_labels, COLORS):
         
         if 'Gender' in df.columns:
             # Process gender data
-            if df['Gender'].dtype == 'bool' or (df['Gender'].dtype == 'int64' and set(df['Gender'].unique()).issubset({0, 1})):
+            if df['Gender'].dtype == 'bool' or (pd.api.types.is_integer_dtype(df['Gender']) and set(df['Gender'].unique()).issubset({0, 1})):
                 gender_mapping = {1: 'Male', 0: 'Female', True: 'Male', False: 'Female'}
                 gender_data = df['Gender'].map(gender_mapping).value_counts().reset_index()
             else:
@@ -153,7 +159,7 @@ def show(df, df_with_risk_labels, COLORS):
         
         if 'Marital_status' in df.columns:
             # Process marital status data
-            if df['Marital_status'].dtype == 'int64':
+            if pd.api.types.is_integer_dtype(df['Marital_status']) or isinstance(df['Marital_status'].dtype, pd.CategoricalDtype):
                 marital_mapping = {
                     1: 'Single', 
                     2: 'Married', 
@@ -196,9 +202,9 @@ def show(df, df_with_risk_labels, COLORS):
         if 'Age_at_enrollment' in df.columns and 'Gender' in df.columns:
             # Process gender data if needed
             gender_col = 'Gender'
-            if df[gender_col].dtype == 'bool' or (df[gender_col].dtype == 'int64' and set(df[gender_col].unique()).issubset({0, 1})):
+            if df[gender_col].dtype == 'bool' or (pd.api.types.is_integer_dtype(df[gender_col]) and set(df[gender_col].unique()).issubset({0, 1})):
                 gender_mapping = {1: 'Male', 0: 'Female', True: 'Male', False: 'Female'}
-                df_temp = df.copy()
+                df_temp = df.copy(deep=False)
                 df_temp['Gender'] = df_temp[gender_col].map(gender_mapping)
                 gender_col = 'Gender'
             else:
@@ -228,7 +234,7 @@ def show(df, df_with_risk_labels, COLORS):
             age_bins = [15, 20, 25, 30, 35, 40, 100]
             age_labels = ['16-20', '21-25', '26-30', '31-35', '36-40', '40+']
             
-            df_temp = df.copy()
+            df_temp = df.copy(deep=False)
             df_temp['Age_Group'] = pd.cut(df_temp['Age_at_enrollment'], bins=age_bins, labels=age_labels)
             
             age_counts = df_temp['Age_Group'].value_counts().sort_index().reset_index()
@@ -261,7 +267,7 @@ def show(df, df_with_risk_labels, COLORS):
         
         if 'Age_at_enrollment' in df.columns and 'Marital_status' in df.columns:
             # Process marital status data if needed
-            if df['Marital_status'].dtype == 'int64':
+            if pd.api.types.is_integer_dtype(df['Marital_status']) or isinstance(df['Marital_status'].dtype, pd.CategoricalDtype):
                 marital_mapping = {
                     1: 'Single', 
                     2: 'Married', 
@@ -270,10 +276,10 @@ def show(df, df_with_risk_labels, COLORS):
                     5: 'Facto union', 
                     6: 'Legally separated'
                 }
-                df_temp = df.copy()
+                df_temp = df.copy(deep=False)
                 df_temp['Marital_Status'] = df_temp['Marital_status'].map(marital_mapping)
             else:
-                df_temp = df.copy()
+                df_temp = df.copy(deep=False)
                 df_temp['Marital_Status'] = df_temp['Marital_status']
             
             # Create violin plot
@@ -455,7 +461,7 @@ def show(df, df_with_risk_labels, COLORS):
         st.markdown("<h4>Grade Improvement (Admission - Previous)</h4>", unsafe_allow_html=True)
         
         if 'Previous_qualification_grade' in df.columns and 'Admission_grade' in df.columns:
-            df_temp = df.copy()
+            df_temp = df.copy(deep=False)
             df_temp['Grade_Improvement'] = df_temp['Admission_grade'] - df_temp['Previous_qualification_grade']
             
             fig = px.histogram(
@@ -509,9 +515,9 @@ def show(df, df_with_risk_labels, COLORS):
         if 'Passing_ratio_1st_sem' in df.columns and 'Gender' in df.columns:
             # Process gender data if needed
             gender_col = 'Gender'
-            if df[gender_col].dtype == 'bool' or (df[gender_col].dtype == 'int64' and set(df[gender_col].unique()).issubset({0, 1})):
+            if df[gender_col].dtype == 'bool' or (pd.api.types.is_integer_dtype(df[gender_col]) and set(df[gender_col].unique()).issubset({0, 1})):
                 gender_mapping = {1: 'Male', 0: 'Female', True: 'Male', False: 'Female'}
-                df_temp = df.copy()
+                df_temp = df.copy(deep=False)
                 df_temp['Gender'] = df_temp[gender_col].map(gender_mapping)
                 gender_col = 'Gender'
             else:
@@ -541,7 +547,7 @@ def show(df, df_with_risk_labels, COLORS):
             grade_bins = [0, 100, 120, 140, 160, 180, 200]
             grade_labels = ['0-100', '101-120', '121-140', '141-160', '161-180', '181-200']
             
-            df_temp = df.copy()
+            df_temp = df.copy(deep=False)
             df_temp['Grade_Range'] = pd.cut(df_temp['Admission_grade'], bins=grade_bins, labels=grade_labels)
             
             # Create heatmap data
@@ -576,7 +582,7 @@ def show(df, df_with_risk_labels, COLORS):
             
             if 'Scholarship_holder' in df.columns:
                 # Process scholarship data
-                if df['Scholarship_holder'].dtype == 'bool' or (df['Scholarship_holder'].dtype == 'int64' and set(df['Scholarship_holder'].unique()).issubset({0, 1})):
+                if df['Scholarship_holder'].dtype == 'bool' or (pd.api.types.is_integer_dtype(df['Scholarship_holder']) and set(df['Scholarship_holder'].unique()).issubset({0, 1})):
                     scholarship_mapping = {1: 'Yes', 0: 'No', True: 'Yes', False: 'No'}
                     scholarship_data = df['Scholarship_holder'].map(scholarship_mapping).value_counts().reset_index()
                 else:
@@ -611,7 +617,7 @@ def show(df, df_with_risk_labels, COLORS):
             
             if 'Tuition_fees_up_to_date' in df.columns:
                 # Process tuition data
-                if df['Tuition_fees_up_to_date'].dtype == 'bool' or (df['Tuition_fees_up_to_date'].dtype == 'int64' and set(df['Tuition_fees_up_to_date'].unique()).issubset({0, 1})):
+                if df['Tuition_fees_up_to_date'].dtype == 'bool' or (pd.api.types.is_integer_dtype(df['Tuition_fees_up_to_date']) and set(df['Tuition_fees_up_to_date'].unique()).issubset({0, 1})):
                     tuition_mapping = {1: 'Yes', 0: 'No', True: 'Yes', False: 'No'}
                     tuition_data = df['Tuition_fees_up_to_date'].map(tuition_mapping).value_counts().reset_index()
                 else:
@@ -645,7 +651,7 @@ def show(df, df_with_risk_labels, COLORS):
         
         if 'International' in df.columns:
             # Process international data
-            if df['International'].dtype == 'bool' or (df['International'].dtype == 'int64' and set(df['International'].unique()).issubset({0, 1})):
+            if df['International'].dtype == 'bool' or (pd.api.types.is_integer_dtype(df['International']) and set(df['International'].unique()).issubset({0, 1})):
                 international_mapping = {1: 'Yes', 0: 'No', True: 'Yes', False: 'No'}
                 international_data = df['International'].map(international_mapping).value_counts().reset_index()
             else:
@@ -679,12 +685,12 @@ def show(df, df_with_risk_labels, COLORS):
         
         if 'Scholarship_holder' in df.columns and 'Passing_ratio_1st_sem' in df.columns:
             # Process scholarship data
-            if df['Scholarship_holder'].dtype == 'bool' or (df['Scholarship_holder'].dtype == 'int64' and set(df['Scholarship_holder'].unique()).issubset({0, 1})):
+            if df['Scholarship_holder'].dtype == 'bool' or (pd.api.types.is_integer_dtype(df['Scholarship_holder']) and set(df['Scholarship_holder'].unique()).issubset({0, 1})):
                 scholarship_mapping = {1: 'Yes', 0: 'No', True: 'Yes', False: 'No'}
-                df_temp = df.copy()
+                df_temp = df.copy(deep=False)
                 df_temp['Scholarship'] = df_temp['Scholarship_holder'].map(scholarship_mapping)
             else:
-                df_temp = df.copy()
+                df_temp = df.copy(deep=False)
                 df_temp['Scholarship'] = df_temp['Scholarship_holder']
             
             # Create violin plot
@@ -708,12 +714,12 @@ def show(df, df_with_risk_labels, COLORS):
         
         if 'Tuition_fees_up_to_date' in df.columns and 'Admission_grade' in df.columns:
             # Process tuition data
-            if df['Tuition_fees_up_to_date'].dtype == 'bool' or (df['Tuition_fees_up_to_date'].dtype == 'int64' and set(df['Tuition_fees_up_to_date'].unique()).issubset({0, 1})):
+            if df['Tuition_fees_up_to_date'].dtype == 'bool' or (pd.api.types.is_integer_dtype(df['Tuition_fees_up_to_date']) and set(df['Tuition_fees_up_to_date'].unique()).issubset({0, 1})):
                 tuition_mapping = {1: 'Yes', 0: 'No', True: 'Yes', False: 'No'}
-                df_temp = df.copy()
+                df_temp = df.copy(deep=False)
                 df_temp['Tuition_Up_To_Date'] = df_temp['Tuition_fees_up_to_date'].map(tuition_mapping)
             else:
-                df_temp = df.copy()
+                df_temp = df.copy(deep=False)
                 df_temp['Tuition_Up_To_Date'] = df_temp['Tuition_fees_up_to_date']
             
             # Create box plot
@@ -737,24 +743,24 @@ def show(df, df_with_risk_labels, COLORS):
         
         if all(col in df.columns for col in ['Scholarship_holder', 'Tuition_fees_up_to_date', 'International']):
             # Process data
-            df_temp = df.copy()
+            df_temp = df.copy(deep=False)
             
             # Process scholarship data
-            if df['Scholarship_holder'].dtype == 'bool' or (df['Scholarship_holder'].dtype == 'int64' and set(df['Scholarship_holder'].unique()).issubset({0, 1})):
+            if df['Scholarship_holder'].dtype == 'bool' or (pd.api.types.is_integer_dtype(df['Scholarship_holder']) and set(df['Scholarship_holder'].unique()).issubset({0, 1})):
                 scholarship_mapping = {1: 'Yes', 0: 'No', True: 'Yes', False: 'No'}
                 df_temp['Scholarship'] = df_temp['Scholarship_holder'].map(scholarship_mapping)
             else:
                 df_temp['Scholarship'] = df_temp['Scholarship_holder']
             
             # Process tuition data
-            if df['Tuition_fees_up_to_date'].dtype == 'bool' or (df['Tuition_fees_up_to_date'].dtype == 'int64' and set(df['Tuition_fees_up_to_date'].unique()).issubset({0, 1})):
+            if df['Tuition_fees_up_to_date'].dtype == 'bool' or (pd.api.types.is_integer_dtype(df['Tuition_fees_up_to_date']) and set(df['Tuition_fees_up_to_date'].unique()).issubset({0, 1})):
                 tuition_mapping = {1: 'Yes', 0: 'No', True: 'Yes', False: 'No'}
                 df_temp['Tuition'] = df_temp['Tuition_fees_up_to_date'].map(tuition_mapping)
             else:
                 df_temp['Tuition'] = df_temp['Tuition_fees_up_to_date']
             
             # Process international data
-            if df['International'].dtype == 'bool' or (df['International'].dtype == 'int64' and set(df['International'].unique()).issubset({0, 1})):
+            if df['International'].dtype == 'bool' or (pd.api.types.is_integer_dtype(df['International']) and set(df['International'].unique()).issubset({0, 1})):
                 international_mapping = {1: 'Yes', 0: 'No', True: 'Yes', False: 'No'}
                 df_temp['International_Student'] = df_temp['International'].map(international_mapping)
             else:
@@ -797,17 +803,17 @@ def show(df, df_with_risk_labels, COLORS):
         
         if all(col in df.columns for col in ['Scholarship_holder', 'Tuition_fees_up_to_date', 'Passing_ratio_1st_sem']):
             # Process data
-            df_temp = df.copy()
+            df_temp = df.copy(deep=False)
             
             # Process scholarship data
-            if df['Scholarship_holder'].dtype == 'bool' or (df['Scholarship_holder'].dtype == 'int64' and set(df['Scholarship_holder'].unique()).issubset({0, 1})):
+            if df['Scholarship_holder'].dtype == 'bool' or (pd.api.types.is_integer_dtype(df['Scholarship_holder']) and set(df['Scholarship_holder'].unique()).issubset({0, 1})):
                 scholarship_mapping = {1: 'Yes', 0: 'No', True: 'Yes', False: 'No'}
                 df_temp['Scholarship'] = df_temp['Scholarship_holder'].map(scholarship_mapping)
             else:
                 df_temp['Scholarship'] = df_temp['Scholarship_holder']
             
             # Process tuition data
-            if df['Tuition_fees_up_to_date'].dtype == 'bool' or (df['Tuition_fees_up_to_date'].dtype == 'int64' and set(df['Tuition_fees_up_to_date'].unique()).issubset({0, 1})):
+            if df['Tuition_fees_up_to_date'].dtype == 'bool' or (pd.api.types.is_integer_dtype(df['Tuition_fees_up_to_date']) and set(df['Tuition_fees_up_to_date'].unique()).issubset({0, 1})):
                 tuition_mapping = {1: 'Yes', 0: 'No', True: 'Yes', False: 'No'}
                 df_temp['Tuition'] = df_temp['Tuition_fees_up_to_date'].map(tuition_mapping)
             else:
@@ -852,17 +858,17 @@ def show(df, df_with_risk_labels, COLORS):
         
         if 'International' in df.columns and 'Scholarship_holder' in df.columns:
             # Process data
-            df_temp = df.copy()
+            df_temp = df.copy(deep=False)
             
             # Process scholarship data
-            if df['Scholarship_holder'].dtype == 'bool' or (df['Scholarship_holder'].dtype == 'int64' and set(df['Scholarship_holder'].unique()).issubset({0, 1})):
+            if df['Scholarship_holder'].dtype == 'bool' or (pd.api.types.is_integer_dtype(df['Scholarship_holder']) and set(df['Scholarship_holder'].unique()).issubset({0, 1})):
                 scholarship_mapping = {1: 'Yes', 0: 'No', True: 'Yes', False: 'No'}
                 df_temp['Scholarship'] = df_temp['Scholarship_holder'].map(scholarship_mapping)
             else:
                 df_temp['Scholarship'] = df_temp['Scholarship_holder']
             
             # Process international data
-            if df['International'].dtype == 'bool' or (df['International'].dtype == 'int64' and set(df['International'].unique()).issubset({0, 1})):
+            if df['International'].dtype == 'bool' or (pd.api.types.is_integer_dtype(df['International']) and set(df['International'].unique()).issubset({0, 1})):
                 international_mapping = {1: 'Yes', 0: 'No', True: 'Yes', False: 'No'}
                 df_temp['International_Student'] = df_temp['International'].map(international_mapping)
             else:
@@ -904,17 +910,17 @@ def show(df, df_with_risk_labels, COLORS):
         
         if all(col in df_with_risk_labels.columns for col in ['Risk_Category', 'Scholarship_holder', 'Tuition_fees_up_to_date']):
             # Process data
-            df_temp = df_with_risk_labels.copy()
+            df_temp = df_with_risk_labels.copy(deep=False)
             
             # Process scholarship data
-            if df_temp['Scholarship_holder'].dtype == 'bool' or (df_temp['Scholarship_holder'].dtype == 'int64' and set(df_temp['Scholarship_holder'].unique()).issubset({0, 1})):
+            if df_temp['Scholarship_holder'].dtype == 'bool' or (pd.api.types.is_integer_dtype(df_temp['Scholarship_holder']) and set(df_temp['Scholarship_holder'].unique()).issubset({0, 1})):
                 scholarship_mapping = {1: 'Yes', 0: 'No', True: 'Yes', False: 'No'}
                 df_temp['Scholarship'] = df_temp['Scholarship_holder'].map(scholarship_mapping)
             else:
                 df_temp['Scholarship'] = df_temp['Scholarship_holder']
             
             # Process tuition data
-            if df_temp['Tuition_fees_up_to_date'].dtype == 'bool' or (df_temp['Tuition_fees_up_to_date'].dtype == 'int64' and set(df_temp['Tuition_fees_up_to_date'].unique()).issubset({0, 1})):
+            if df_temp['Tuition_fees_up_to_date'].dtype == 'bool' or (pd.api.types.is_integer_dtype(df_temp['Tuition_fees_up_to_date']) and set(df_temp['Tuition_fees_up_to_date'].unique()).issubset({0, 1})):
                 tuition_mapping = {1: 'Yes', 0: 'No', True: 'Yes', False: 'No'}
                 df_temp['Tuition'] = df_temp['Tuition_fees_up_to_date'].map(tuition_mapping)
             else:
@@ -3,6 +3,14 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 
+# Columns of each dataset this page reads
+PAGE_COLUMNS = {
+    'data': [
+        'Status_Dropout', 'Status', 'Passing_ratio_1st_sem', 'Curricular_units_1st_sem_enrolled',
+        'Curricular_units_1st_sem_approved', 'Scholarship_holder', 'Risk_Category'
+    ]
+}
+
 def show(df, COLORS):
     # Page title
     st.title("Welcome to Student Performance Dashboard")
@@ -0,0 +1,101 @@
+import pandas as pd
+
+class RunningAggregates:
+    """
+    Counts, sums and cross-tabulations of a dataset, updated batch by batch.
+
+    Built from the loaded rows once, then updated with only the appended
+    rows, so the dashboard statistics never rescan the historical data.
+    Numeric and boolean columns keep sums and counts, everything else keeps
+    value counts. With `group_by`, the same is kept per group.
+    """
+
+    def __init__(self, group_by=None):
+        self.group_by = group_by
+        self.n_rows = 0
+        self.columns = []
+        self.sums = pd.Series(dtype='float64')
+        self.counts = pd.Series(dtype='float64')
+        self.values = {}
+        self.group_sums = None
+        self.group_counts = None
+        self.crosstabs = {}
+
+    def update(self, df):
+        """
+        Fold a batch of rows into the aggregates
+        """
+        self.n_rows += len(df)
+        self.columns = list(dict.fromkeys(self.columns + list(df.columns)))
+
+        numeric = [
+            col for col in df.columns
+            if col != self.group_by and (pd.api.types.is_numeric_dtype(df[col]) or pd.api.types.is_bool_dtype(df[col]))
+        ]
+        categorical = [col for col in df.columns if col != self.group_by and col not in numeric]
+
+        floats = df[numeric].astype('float64')
+        self.sums = self.sums.add(floats.sum(), fill_value=0)
+        self.counts = self.counts.add(floats.count(), fill_value=0)
+
+        for col in categorical:
+            # Plain labels, categories of different batches don't line up
+            counts = df[col].value_counts()
+            counts.index = counts.index.astype(object)
+            self.values[col] = counts if col not in self.values else self.values[col].add(counts, fill_value=0)
+
+        if self.group_by in df.columns:
+            grouped = floats.groupby(df[self.group_by])
+            sums, counts = grouped.sum(), grouped.count()
+            if self.group_sums is None:
+                self.group_sums, self.group_counts = sums, counts
+            else:
+                self.group_sums = self.group_sums.add(sums, fill_value=0)
+                self.group_counts = self.group_counts.add(counts, fill_value=0)
+
+            for col in categorical:
+                table = pd.crosstab(df[self.group_by], df[col])
+                table.columns = table.columns.astype(object)
+                self.crosstabs[col] = table if col not in self.crosstabs else self.crosstabs[col].add(table, fill_value=0)
+
+        return self
+
+    def mean(self, col, mapping=None):
+        """
+        Mean of a column; text columns are mapped to numbers with `mapping`
+        """
+        if col in self.sums.index:
+            return self.sums[col] / self.counts[col] if self.counts[col] else float('nan')
+
+        counts = self.values[col]
+        mapped = counts[counts.index.isin(list((mapping or {}).keys()))]
+        if mapped.sum() == 0:
+            return float('nan')
+        return sum(mapping[value] * count for value, count in mapped.items()) / mapped.sum()
+
+    def means(self, columns):
+        return self.sums[columns] / self.counts[columns]
+
+    def value_counts(self, col):
+        """
+        Like Series.value_counts() on every row seen so far
+        """
+        counts = self.values[col].astype('int64').sort_values(ascending=False, kind='stable')
+        counts.name = 'count'
+        counts.index.name = col
+        return counts
+
+    def group_means(self, columns):
+        """
+        Like df.groupby(group_by)[columns].mean()
+        """
+        return self.group_sums[columns] / self.group_counts[columns]
+
+    def crosstab(self, col):
+        """
+        Like pd.crosstab(df[group_by], df[col])
+        """
+        table = self.crosstabs[col].fillna(0).astype('int64')
+        table.index.name = self.group_by
+        table.columns.name = col
+        return table
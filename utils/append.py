@@ -0,0 +1,67 @@
+import argparse
+import glob
+import os
+import shutil
+import time
+import pandas as pd
+from utils.data_cache import append_csv_rows, dataset_version
+from utils.schema import DATASETS
+
+def append_rows(name, rows):
+    """
+    Add new student rows to a dataset and return its new version.
+
+    The rows must have every column of the dataset's CSV. Running
+    dashboards pick them up on their next rerun by reading just the new
+    rows, the historical data isn't re-read.
+    """
+    path, options, schema = DATASETS[name]
+    return dataset_version(append_csv_rows(path, rows, **options))
+
+def append_file(name, csv_path):
+    """
+    Append the rows of a CSV laid out like the dataset
+    """
+    path, options, schema = DATASETS[name]
+    return append_rows(name, pd.read_csv(csv_path, encoding='utf-8-sig', **options))
+
+def watch_inbox(name, inbox, interval=2.0, once=False, log=print):
+    """
+    Append every CSV dropped into `inbox` to a dataset.
+
+    Files are appended in name order and moved to inbox/processed, or to
+    inbox/failed when they can't be appended. Write files elsewhere and move
+    them in, so a half-written file is never picked up. Polls every `interval`
+    seconds until interrupted, or makes a single pass with `once`.
+    """
+    for folder in ('processed', 'failed'):
+        os.makedirs(os.path.join(inbox, folder), exist_ok=True)
+
+    while True:
+        for csv_path in sorted(glob.glob(os.path.join(inbox, '*.csv'))):
+            try:
+                version = append_file(name, csv_path)
+                shutil.move(csv_path, os.path.join(inbox, 'processed', os.path.basename(csv_path)))
+                log(f"{os.path.basename(csv_path)}: appended to {name}, now version {version}")
+            except Exception as e:
+                shutil.move(csv_path, os.path.join(inbox, 'failed', os.path.basename(csv_path)))
+                log(f"{os.path.basename(csv_path)}: not appended ({e})")
+
+        if once:
+            return
+        time.sleep(interval)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append new student rows to a dashboard dataset")
+    parser.add_argument('dataset', choices=sorted(DATASETS))
+    parser.add_argument('files', nargs='*', help="CSV files laid out like the dataset")
+    parser.add_argument('--watch', metavar='INBOX', help="keep appending CSV files dropped into this folder")
+    parser.add_argument('--interval', type=float, default=2.0, help="seconds between inbox checks")
+    args = parser.parse_args()
+
+    for csv_path in args.files:
+        print(f"{csv_path}: appended to {args.dataset}, now version {append_file(args.dataset, csv_path)}")
+
+    if args.watch:
+        print(f"Watching {args.watch} for new {args.dataset} rows")
+        watch_inbox(args.dataset, args.watch, args.interval)
@@ -0,0 +1,229 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Sweep results per dataset fingerprint, newest last
+SWEEPS_PATH = 'data/bandwidth_sweeps.json'
+
+# Sweeps kept in the cache file
+MAX_CACHED_SWEEPS = 20
+
+# What is swept: the neighbour quantile and the sample size of the
+# estimate, each combination repeated on REPEATS random samples
+QUANTILES = (0.1, 0.15, 0.2, 0.25, 0.3)
+SAMPLE_SIZES = (250, 500, 1000, 2000)
+REPEATS = 8
+
+# The quantile the reference model's bandwidth was estimated with
+DEFAULT_QUANTILE = 0.2
+
+# Rows the neighbour graph is built over; its sorted distances take
+# 8 bytes per pair, 72 MB at this size
+POOL_ROWS = 3000
+
+# Rows per block when sorting the distances
+GRAPH_BLOCK_ROWS = 500
+
+_sweeps_lock = threading.Lock()
+
+def data_fingerprint(values, scaler_digest=None):
+    """
+    SHA-256 of the feature values (as float32) and the scaler they are standardized with
+    """
+    values = np.ascontiguousarray(values, dtype=np.float32)
+    digest = hashlib.sha256(str(values.shape).encode())
+    digest.update(values.tobytes())
+    digest.update(str(scaler_digest).encode())
+    return digest.hexdigest()
+
+class NeighborGraph:
+    """
+    Every pool row's neighbours, sorted by distance.
+
+    estimate_bandwidth(X, quantile, n_samples) is the mean distance from
+    each row of a random sample to its int(quantile * n_samples)-th nearest
+    neighbour within the sample, itself included. With the pool's rows
+    sorted once, that neighbour is read off for any sample of the pool and
+    any quantile, without another neighbour search.
+    """
+
+    def __init__(self, distances, neighbors):
+        self.distances = distances
+        self.neighbors = neighbors
+
+    @classmethod
+    def build(cls, X):
+        X = np.asarray(X, dtype=np.float64)
+        n_rows = len(X)
+        distances = np.empty((n_rows, n_rows), dtype=np.float32)
+        neighbors = np.empty((n_rows, n_rows), dtype=np.int32)
+        norms = (X ** 2).sum(axis=1)
+
+        for start in range(0, n_rows, GRAPH_BLOCK_ROWS):
+            block = X[start:start + GRAPH_BLOCK_ROWS]
+            squared = norms[start:start + len(block), None] - 2 * block @ X.T + norms
+            # A row is its own nearest neighbour, at distance zero
+            squared[np.arange(len(block)), np.arange(start, start + len(block))] = -1
+            order = np.argsort(squared, axis=1, kind='stable')
+            neighbors[start:start + len(block)] = order
+            distances[start:start + len(block)] = np.sqrt(np.maximum(np.take_along_axis(squared, order, axis=1), 0))
+
+        return cls(distances, neighbors)
+
+    def bandwidths(self, sample, quantiles):
+        """
+        estimate_bandwidth on the pool rows `sample`, one value per quantile
+        """
+        sample = np.asarray(sample)
+        members = np.zeros(len(self.neighbors), dtype=bool)
+        members[sample] = True
+
+        # Each row's sorted neighbours that are in the sample, positions in the row
+        _, positions = np.nonzero(members[self.neighbors[sample]])
+        positions = positions.reshape(len(sample), len(sample))
+
+        values = []
+        for quantile in quantiles:
+            k = max(int(len(sample) * quantile), 1)
+            values.append(float(self.distances[sample, positions[:, k - 1]].mean()))
+        return values
+
+def sweep_bandwidth(X, quantiles=QUANTILES, sample_sizes=SAMPLE_SIZES, repeats=REPEATS,
+                    pool_rows=POOL_ROWS, workers=None, random_state=42):
+    """
+    Bandwidth estimates for every quantile and sample size.
+
+    The neighbour graph is built once over a pool of up to `pool_rows`
+    rows; the samples are drawn from the pool and evaluated on `workers`
+    threads (every core by default). Returns the rows of the sweep, each
+    with the mean, standard deviation and relative spread of the estimate
+    over `repeats` samples.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    rng = np.random.RandomState(random_state)
+    if len(X) > pool_rows:
+        X = X[rng.permutation(len(X))[:pool_rows]]
+    graph = NeighborGraph.build(X)
+
+    sample_sizes = sorted({min(size, len(X)) for size in sample_sizes})
+    tasks = [
+        (size, np.random.RandomState(random_state + repeat).permutation(len(X))[:size])
+        for size in sample_sizes for repeat in range(repeats)
+    ]
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        estimates = list(executor.map(lambda task: graph.bandwidths(task[1], quantiles), tasks))
+
+    rows = []
+    for size in sample_sizes:
+        values = np.array([estimate for (task_size, _), estimate in zip(tasks, estimates) if task_size == size])
+        for i, quantile in enumerate(quantiles):
+            mean = float(values[:, i].mean())
+            std = float(values[:, i].std())
+            rows.append({
+                'quantile': quantile,
+                'n_samples': size,
+                'mean': mean,
+                'std': std,
+                'relative_std': std / mean if mean else None
+            })
+    return rows
+
+def choose_bandwidth(rows, quantile=DEFAULT_QUANTILE):
+    """
+    The steadiest estimate at a quantile: the one from the largest sample size
+    """
+    candidates = [row for row in rows if np.isclose(row['quantile'], quantile)]
+    if not candidates:
+        raise ValueError(f"The sweep has no quantile {quantile}")
+    return max(candidates, key=lambda row: row['n_samples'])['mean']
+
+def _load_sweeps(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def cached_sweep(fingerprint, path=SWEEPS_PATH):
+    """
+    The cached sweep for a dataset fingerprint, None if it was never tuned
+    """
+    return _load_sweeps(path).get(fingerprint)
+
+def tuned_bandwidth(fingerprint, path=SWEEPS_PATH):
+    """
+    The bandwidth chosen for a dataset fingerprint, None if it was never
+    tuned. Only reads the cache, never searches neighbours.
+    """
+    sweep = cached_sweep(fingerprint, path)
+    return None if sweep is None else sweep['bandwidth']
+
+def tune_bandwidth(X, fingerprint, quantile=DEFAULT_QUANTILE, refresh=False, path=SWEEPS_PATH, **params):
+    """
+    Sweep the bandwidth for a dataset and cache it under its fingerprint.
+
+    A cached sweep with the same parameters is reused unless `refresh`;
+    picking another quantile only re-chooses from the cached rows.
+    """
+    settings = {
+        'quantiles': list(params.get('quantiles', QUANTILES)),
+        'sample_sizes': list(params.get('sample_sizes', SAMPLE_SIZES)),
+        'repeats': params.get('repeats', REPEATS),
+        'pool_rows': params.get('pool_rows', POOL_ROWS)
+    }
+
+    sweep = None if refresh else cached_sweep(fingerprint, path)
+    if sweep is None or sweep['settings'] != settings:
+        start = time.perf_counter()
+        rows = sweep_bandwidth(X, **params)
+        sweep = {'settings': settings, 'rows': rows, 'seconds': time.perf_counter() - start}
+
+    sweep['quantile'] = quantile
+    sweep['bandwidth'] = choose_bandwidth(sweep['rows'], quantile)
+
+    with _sweeps_lock:
+        sweeps = _load_sweeps(path)
+        sweeps.pop(fingerprint, None)
+        sweeps[fingerprint] = sweep
+        for old in list(sweeps)[:max(0, len(sweeps) - MAX_CACHED_SWEEPS)]:
+            del sweeps[old]
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(sweeps, f, indent=2)
+        os.replace(tmp_path, path)
+
+    return sweep
+
+if __name__ == "__main__":
+    from utils.cluster_engines import cluster_fingerprint, cluster_matrix
+    from utils.load_data import load_dataset
+
+    parser = argparse.ArgumentParser(description="Sweep the mean-shift bandwidth and cache the chosen value for retraining")
+    parser.add_argument('--quantile', type=float, default=DEFAULT_QUANTILE, help="neighbour quantile the bandwidth is chosen at")
+    parser.add_argument('--repeats', type=int, default=REPEATS, help="random samples per quantile and sample size")
+    parser.add_argument('--workers', type=int, default=None, help="threads to sweep on, every core by default")
+    parser.add_argument('--refresh', action='store_true', help="sweep again even if this dataset has a cached sweep")
+    parser.add_argument('--json', action='store_true', help="print the sweep as JSON")
+    args = parser.parse_args()
+
+    data = load_dataset('clustering')
+    sweep = tune_bandwidth(
+        cluster_matrix(data), cluster_fingerprint(data), args.quantile, args.refresh,
+        repeats=args.repeats, workers=args.workers
+    )
+
+    if args.json:
+        print(json.dumps(sweep, indent=2))
+    else:
+        for row in sweep['rows']:
+            print(f"quantile {row['quantile']:<5} n_samples {row['n_samples']:>5}  "
+                  f"bandwidth {row['mean']:.4f} +/- {row['std']:.4f} ({row['relative_std']:.1%})")
+        print(f"Chose {sweep['bandwidth']:.4f} at quantile {sweep['quantile']} "
+              f"(swept in {sweep['seconds']:.2f}s), used by the next retrain")
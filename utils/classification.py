@@ -1,29 +1,38 @@
+import logging
 import numpy as np
 import pandas as pd
 import streamlit as st
-import joblib
-import os
-from sklearn.preprocessing import StandardScaler
+from utils.feature_pipeline import FeaturePipeline
+from utils.model_registry import SCORING_ARTIFACTS, get_model_registry
+from utils.prediction_cache import get_prediction_cache
+from utils.risk_surface import load_risk_surface
+from utils.svm_kernel import load_svm_kernel
+from utils.reduced_svm import load_reduced_model
+from utils.incremental import load_served_incremental_model, normalize_risk_labels
+from utils.preprocessing import roster_to_prediction_input
+from utils.scaling import load_feature_scaling
+
+logger = logging.getLogger(__name__)
 
 def load_classification_model():
     """
     Load the classification model for risk prediction
     """
     try:
-        # Try to load the SVM model
-        model_path = 'models/svm_risk_category_model.pkl'
-        if os.path.exists(model_path):
-            model = joblib.load(model_path)
-            return model
+        # Once validated, the incrementally updated model replaces the SVM
+        incremental = load_served_incremental_model()
+        if incremental is not None:
+            return incremental
         
-        # If SVM model not found, try RandomForest as fallback
-        model_path = 'models/rf_risk_category_model.pkl'
-        if os.path.exists(model_path):
-            model = joblib.load(model_path)
-            return model
+        # Prefer the NumPy export of the SVM, as long as it was exported
+        # from the pickle that is on disk now
+        kernel = load_svm_kernel()
+        if kernel is not None:
+            return kernel
         
-        # Return None if no model is found
-        return None
+        # Resolved through the shared registry, so the SVM (or the
+        # RandomForest fallback) is only deserialized once per process
+        return get_model_registry().get('risk_classifier')
     
     except Exception as e:
         st.error(f"Error loading classification model: {e}")
@@ -34,18 +43,80 @@ def load_scaler():
     Load the scaler for preprocessing features
     """
     try:
-        scaler_path = 'models/risk_category_scaler.pkl'
-        if os.path.exists(scaler_path):
-            scaler = joblib.load(scaler_path)
+        # The incremental model keeps its own scaler
+        incremental = load_served_incremental_model()
+        if incremental is not None:
+            return incremental.scaler
+        
+        # The NumPy export bundles the scaler parameters, which keeps
+        # sklearn out of the prediction path entirely
+        kernel = load_svm_kernel()
+        if kernel is not None and kernel.scaler is not None:
+            if kernel.scaler_digest == get_model_registry().digest('risk_scaler'):
+                return kernel.scaler
+        
+        scaler = get_model_registry().get('risk_scaler')
+        if scaler is not None:
             return scaler
         
         # Return a new scaler if not found
+        from sklearn.preprocessing import StandardScaler
         return StandardScaler()
     
     except Exception as e:
         st.error(f"Error loading scaler: {e}")
+        from sklearn.preprocessing import StandardScaler
         return StandardScaler()
 
+# Key factor labels, in the order they are reported
+KEY_FACTOR_LABELS = np.array([
+    "Low passing ratio (below 0.7)",
+    "Low admission grade (below 130)",
+    "Not a scholarship holder",
+    "Tuition fees not up to date",
+    "Few approved units (below 4)",
+    "High passing ratio (above 0.8)",
+    "High admission grade (above 150)",
+    "Scholarship holder",
+    "Tuition fees up to date",
+    "Many approved units (above 5)",
+    "Average admission grade (between 130-150)",
+    "Mixed performance indicators"
+], dtype=object)
+
+def scoring_versions():
+    """
+    Versions of the scoring artifacts, changing whenever one is republished
+    """
+    registry = get_model_registry()
+    return tuple(registry.version(name) for name in SCORING_ARTIFACTS)
+
+# Compiled pipeline, keyed on the artifact versions it was built from
+_feature_pipelines = {}
+
+def load_feature_pipeline(reduced=False):
+    """
+    Get the compiled feature pipeline for the current model and scaler
+    """
+    registry = get_model_registry()
+    key = (scoring_versions(), registry.version('risk_reduced') if reduced else None)
+    
+    pipeline = _feature_pipelines.get(key)
+    if pipeline is None:
+        if reduced:
+            # Built against the SVM's own scaler, never the incremental model's
+            model, scaler = load_reduced_model(), registry.get('risk_scaler')
+        else:
+            model, scaler = load_classification_model(), load_scaler()
+        pipeline = FeaturePipeline.from_artifacts(model, scaler, registry.get('risk_features'), load_feature_scaling())
+        
+        # Keep only the pipelines for the current artifacts
+        for stale in [k for k in _feature_pipelines if k[0] != key[0]]:
+            del _feature_pipelines[stale]
+        _feature_pipelines[key] = pipeline
+    
+    return pipeline
+
 def predict_risk_level(input_data):
     """
     Predict risk level from input data
@@ -56,126 +127,369 @@ def predict_risk_level(input_data):
         return {"error": "Classification model not found. Please train a model first."}
     
     try:
-        # Prepare features
-        features_expected = [
-            'Age_at_enrollment', 'Gender', 'Marital_status',
-            'Previous_qualification_grade', 'Admission_grade',
-            'Curricular_units_1st_sem_enrolled', 'Curricular_units_1st_sem_approved',
-            'Passing_ratio_1st_sem', 'Scholarship_holder', 'Debtor',
-            'Tuition_fees_up_to_date', 'International'
-        ]
-        
-        # Calculate derived features
-        if 'Curricular_units_1st_sem_enrolled' in input_data and 'Curricular_units_1st_sem_approved' in input_data:
-            if input_data['Curricular_units_1st_sem_enrolled'] > 0:
-                input_data['Passing_ratio_1st_sem'] = input_data['Curricular_units_1st_sem_approved'] / input_data['Curricular_units_1st_sem_enrolled']
-            else:
-                input_data['Passing_ratio_1st_sem'] = 0
+        # Repeated profiles are answered from the shared cache
+        cache = get_prediction_cache()
+        cache_key = _prediction_cache_key(input_data)
+        if cache_key is not None:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return dict(cached, key_factors=list(cached['key_factors']))
         
-        # Prepare input for prediction
-        X = pd.DataFrame([input_data])
+        # One-element columns so the rules share the batch implementation
+        columns = {name: np.array([value], dtype=object) for name, value in input_data.items()}
         
-        # Handle categorical features
-        for col in X.columns:
-            if X[col].dtype == 'object':
-                if col == 'Gender':
-                    X[col] = X[col].map({'Male': 1, 'Female': 0})
-                elif col in ['Scholarship_holder', 'Tuition_fees_up_to_date', 'International', 'Debtor']:
-                    X[col] = X[col].map({'Yes': 1, 'No': 0})
+        # Answer from the precomputed risk surface when the input is on its grid
+        surface = load_risk_surface()
+        cell = surface.lookup(input_data) if surface is not None else None
         
-        # Get model features
-        if hasattr(model, 'feature_names_in_'):
-            model_features = model.feature_names_in_
+        if cell is not None:
+            prediction = np.array([cell[0]], dtype=object)
+            confidence = np.array([cell[1]])
+            key_factors = _key_risk_factor_masks(_derive_columns(columns), prediction, 1)
         else:
-            # Use all available features if model doesn't specify
-            model_features = X.columns
-        
-        # Add missing features
-        for feature in model_features:
-            if feature not in X.columns:
-                X[feature] = 0
-        
-        # Ensure correct order
-        X = X[model_features]
-        
-        # Scale features
-        scaler = load_scaler()
-        X_scaled = scaler.fit_transform(X)
+            prediction, confidence, key_factors = _score_columns(
+                model, columns, 1,
+                lambda pipeline: pipeline.transform(input_data)
+            )
         
-        # Rule-based risk assessment as fallback
-        passing_ratio = input_data.get('Passing_ratio_1st_sem', 0)
-        admission_grade = input_data.get('Admission_grade', 0)
-        scholarship = input_data.get('Scholarship_holder', 'No')
-        tuition_uptodate = input_data.get('Tuition_fees_up_to_date', 'No')
+        result = {
+            "risk_level": prediction[0],
+            "confidence": float(confidence[0]),
+            "key_factors": KEY_FACTOR_LABELS[key_factors[0]].tolist()
+        }
         
-        # Calculate risk score (0-100)
-        risk_score = 0
+        # Say so when the model couldn't score the input, and don't cache the fallback
+        model_error = load_feature_pipeline().error
+        if model_error is not None:
+            result['model_error'] = model_error
+            return result
         
-        # Passing ratio impact (0-40 points)
-        if passing_ratio < 0.5:
-            risk_score += 40  # High risk
-        elif passing_ratio < 0.7:
-            risk_score += 20  # Medium risk
-        elif passing_ratio < 0.85:
-            risk_score += 10  # Low risk
+        if cache_key is not None:
+            cache.put(cache_key, dict(result, key_factors=list(result['key_factors'])))
         
-        # Admission grade impact (0-20 points)
-        if admission_grade < 120:
-            risk_score += 20
-        elif admission_grade < 140:
-            risk_score += 10
+        # Return prediction result
+        return result
         
-        # Scholarship impact (0-15 points)
-        if scholarship == 'No':
-            risk_score += 15
+    except Exception as e:
+        return {"error": f"Error making prediction: {e}"}
+
+def _prediction_cache_key(input_data):
+    """
+    Cache key from the normalized input plus the digests of everything that scores it
+    """
+    derives_ratio = 'Curricular_units_1st_sem_enrolled' in input_data and 'Curricular_units_1st_sem_approved' in input_data
+    
+    items = []
+    for name, value in input_data.items():
+        # Recomputed from the units, so it doesn't affect the result
+        if name == 'Passing_ratio_1st_sem' and derives_ratio:
+            continue
         
-        # Tuition payment impact (0-15 points)
-        if tuition_uptodate == 'No':
-            risk_score += 15
+        # 6, 6.0 and np.int64(6) score the same
+        if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+            value = float(value)
+        items.append((name, value))
+    
+    # Digests, so republishing any scoring artifact invalidates the entry
+    registry = get_model_registry()
+    key = (
+        tuple(registry.digests(SCORING_ARTIFACTS).items()),
+        registry.version('risk_surface'),
+        tuple(sorted(items))
+    )
+    
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    
+    return key
+
+def predict_risk_levels(data, reduced=False):
+    """
+    Predict risk levels for a batch of students in one vectorized pass.
+    
+    Takes a DataFrame with the same fields as the single-student input and
+    returns a DataFrame with risk_level, confidence and key_factors columns,
+    aligned on the input index. With `reduced`, the Nyström model from
+    utils.reduced_svm is used instead of the full SVM.
+    """
+    columns = {col: data[col].to_numpy() for col in data.columns}
+    prediction, confidence, key_factors = score_columns(columns, len(data), reduced)
+    
+    return pd.DataFrame({
+        "risk_level": prediction,
+        "confidence": confidence,
+        "key_factors": [KEY_FACTOR_LABELS[row].tolist() for row in key_factors]
+    }, index=data.index)
+
+def score_columns(columns, n_rows, reduced=False):
+    """
+    Score a record batch given as a dict of column arrays.
+    
+    Returns prediction and confidence arrays and the key factor mask matrix
+    over KEY_FACTOR_LABELS.
+    """
+    if reduced:
+        model = load_reduced_model()
+        if model is None:
+            raise LookupError("Reduced model not found or out of date. Build it with: python -m utils.reduced_svm")
+    else:
+        model = load_classification_model()
+        if model is None:
+            raise LookupError("Classification model not found. Please train a model first.")
+    
+    return _score_columns(
+        model, columns, n_rows,
+        lambda pipeline: pipeline.transform_batch(columns, n_rows),
+        reduced
+    )
+
+def _derive_columns(columns):
+    """
+    Add the passing ratio derived from enrolled and approved units
+    """
+    if 'Curricular_units_1st_sem_enrolled' in columns and 'Curricular_units_1st_sem_approved' in columns:
+        enrolled = np.asarray(columns['Curricular_units_1st_sem_enrolled'], dtype=float)
+        approved = np.asarray(columns['Curricular_units_1st_sem_approved'], dtype=float)
+        has_units = enrolled > 0
+        passing_ratio = np.where(has_units, approved / np.where(has_units, enrolled, 1), 0)
+        columns = dict(columns, Passing_ratio_1st_sem=passing_ratio)
+    
+    return columns
+
+def _score_columns(model, columns, n_rows, transform, reduced=False):
+    """
+    Shared scoring core: model prediction with the rule-based overlay.
+    
+    `transform` receives the compiled feature pipeline and returns the
+    scaled feature matrix. Returns prediction and confidence arrays and the
+    key factor mask matrix.
+    """
+    # Calculate derived features
+    columns = _derive_columns(columns)
+    
+    # Rule-based risk assessment as fallback
+    risk_score, rule_based_risk = _rule_based_assessment(
+        _numeric_column(columns, 'Passing_ratio_1st_sem', 0, n_rows),
+        _numeric_column(columns, 'Admission_grade', 0, n_rows),
+        _text_column(columns, 'Scholarship_holder', 'No', n_rows),
+        _text_column(columns, 'Tuition_fees_up_to_date', 'No', n_rows)
+    )
+    rule_confidence = np.clip(100 - (np.abs(risk_score - 50) * 1.5), 60, 95)
+    
+    # Try model prediction
+    try:
+        model_prediction, model_confidence = _model_predict(model, transform, reduced)
         
-        # Determine rule-based risk level
-        rule_based_risk = "Medium"  # Default
-        if risk_score >= 50:
-            rule_based_risk = "High"
-        elif risk_score <= 25:
-            rule_based_risk = "Low"
+        # If model predicts Medium, use rule-based approach for more variation
+        prediction = np.where(model_prediction == "Medium", rule_based_risk, model_prediction)
         
-        # Try model prediction
+        # Use rule-based confidence when the model has no probability estimates
+        confidence = rule_confidence if model_confidence is None else model_confidence
+    except ValueError as e:
+        # The input doesn't fit the model's feature contract; fall back to
+        # the rules, but never silently
+        logger.warning("Risk model could not score the input, using the rule-based assessment: %s", e)
+        prediction = rule_based_risk
+        confidence = rule_confidence
+    
+    # Identify key risk factors
+    key_factors = _key_risk_factor_masks(columns, prediction, n_rows)
+    
+    return prediction, confidence.astype(float), key_factors
+
+def _model_predict(model, transform, reduced=False):
+    """
+    The model's own risk levels (Low/Medium/High) and confidences.
+    
+    Raises ValueError when the compiled pipeline can't build the model's
+    input from the given fields.
+    """
+    X_scaled = transform(load_feature_pipeline(reduced))
+    
+    # The NumPy scorers share one kernel evaluation between the two
+    if hasattr(model, 'predict_with_proba'):
+        labels, proba = model.predict_with_proba(X_scaled)
+    else:
+        labels = model.predict(X_scaled)
+        proba = model.predict_proba(X_scaled) if hasattr(model, 'predict_proba') else None
+    
+    # The labelled data spells the levels Rendah/Medium/Tinggi
+    prediction = normalize_risk_labels(labels)
+    confidence = None if proba is None else proba.max(axis=1) * 100
+    
+    return prediction, confidence
+
+def check_scoring_paths(roster, labelled):
+    """
+    Check that the full and reduced scoring paths each reach their own model.
+    
+    `roster` holds students in the data.csv layout and `labelled` the same
+    students' rows of the labelled table. Each path scores the roster the
+    way the pages do; the result is its agreement with its model applied
+    directly to the labelled features, which is 1.0 when serving is sound.
+    A path without a model is reported as None.
+    """
+    registry = get_model_registry()
+    scaler = registry.get('risk_scaler')
+    X = scaler.transform(labelled[registry.get('risk_features')])
+    
+    inputs = roster_to_prediction_input(roster)
+    columns = {col: inputs[col].to_numpy() for col in inputs.columns}
+    
+    agreement = {}
+    for path, model in [('full', registry.get('risk_classifier')), ('reduced', load_reduced_model())]:
+        if model is None:
+            agreement[path] = None
+            continue
         try:
-            model_prediction = model.predict(X_scaled)[0]
-            
-            # If model predicts Medium, use rule-based approach for more variation
-            if model_prediction == "Medium":
-                prediction = rule_based_risk
-            else:
-                prediction = model_prediction
-                
-            # If model provides probability estimates
-            if hasattr(model, 'predict_proba'):
-                probabilities = model.predict_proba(X_scaled)[0]
-                confidence = float(np.max(probabilities)) * 100
-            else:
-                # Use rule-based confidence
-                confidence = 100 - (abs(risk_score - 50) * 1.5)
-                confidence = max(60, min(95, confidence))
-        except:
-            # Fallback to rule-based prediction
-            prediction = rule_based_risk
-            confidence = 100 - (abs(risk_score - 50) * 1.5)
-            confidence = max(60, min(95, confidence))
+            served, _ = _model_predict(
+                model, lambda pipeline: pipeline.transform_batch(columns, len(inputs)), path == 'reduced'
+            )
+        except ValueError:
+            agreement[path] = 0.0
+            continue
+        agreement[path] = float((served == normalize_risk_labels(model.predict(X))).mean())
+    
+    return agreement
+
+def score_roster_in_chunks(source, output, chunksize=50000, reduced=False):
+    """
+    Stream a roster CSV in the data.csv layout through predict_risk_levels.
+    
+    Scored chunks are appended to `output` as soon as they are ready, so only
+    one chunk is held in memory at a time. Yields the number of rows scored
+    so far and the running risk level counts after every chunk.
+    """
+    risk_counts = {}
+    rows_scored = 0
+    
+    reader = pd.read_csv(source, sep=';', encoding='utf-8-sig', chunksize=chunksize)
+    for i, chunk in enumerate(reader):
+        result = predict_risk_levels(roster_to_prediction_input(chunk), reduced)
         
-        # Identify key risk factors
-        key_factors = identify_key_risk_factors(input_data, prediction)
+        scored = chunk.assign(
+            Predicted_Risk_Level=result['risk_level'],
+            Prediction_Confidence=result['confidence'].round(1),
+            Key_Factors=result['key_factors'].str.join('; ')
+        )
+        scored.to_csv(output, sep=';', index=False, header=(i == 0))
         
-        # Return prediction result
-        return {
-            "risk_level": prediction,
-            "confidence": confidence,
-            "key_factors": key_factors
-        }
+        # Update running totals
+        rows_scored += len(chunk)
+        for level, count in result['risk_level'].value_counts().items():
+            risk_counts[level] = risk_counts.get(level, 0) + int(count)
         
-    except Exception as e:
-        return {"error": f"Error making prediction: {e}"}
+        yield rows_scored, risk_counts
+
+def _numeric_column(columns, col, default, n_rows):
+    """
+    Column as a float array, or a constant array if the column is missing
+    """
+    if col in columns:
+        return np.asarray(columns[col], dtype=float)
+    return np.full(n_rows, default, dtype=float)
+
+def _text_column(columns, col, default, n_rows):
+    """
+    Column as an object array so string comparisons stay elementwise
+    """
+    if col in columns:
+        return np.asarray(columns[col], dtype=object)
+    return np.full(n_rows, default, dtype=object)
+
+def _rule_based_assessment(passing_ratio, admission_grade, scholarship, tuition_uptodate):
+    """
+    Rule-based risk score (0-100) and risk level as array expressions
+    """
+    # Passing ratio impact (0-40 points)
+    risk_score = np.select(
+        [passing_ratio < 0.5, passing_ratio < 0.7, passing_ratio < 0.85],
+        [40, 20, 10],
+        0
+    )
+    
+    # Admission grade impact (0-20 points)
+    risk_score += np.select([admission_grade < 120, admission_grade < 140], [20, 10], 0)
+    
+    # Scholarship and tuition payment impact (0-15 points each)
+    risk_score += np.where(scholarship == 'No', 15, 0)
+    risk_score += np.where(tuition_uptodate == 'No', 15, 0)
+    
+    # Determine rule-based risk level
+    rule_based_risk = np.select(
+        [risk_score >= 50, risk_score <= 25],
+        ["High", "Low"],
+        "Medium"
+    ).astype(object)
+    
+    return risk_score, rule_based_risk
+
+def _key_risk_factor_masks(columns, prediction, n_rows):
+    """
+    Boolean matrix over KEY_FACTOR_LABELS, vectorized form of identify_key_risk_factors
+    """
+    missing = np.zeros(n_rows, dtype=bool)
+    
+    is_high = prediction == 'High'
+    is_low = prediction == 'Low'
+    is_medium = ~(is_high | is_low)
+    
+    if 'Passing_ratio_1st_sem' in columns:
+        passing_ratio = np.asarray(columns['Passing_ratio_1st_sem'], dtype=float)
+        low_passing = passing_ratio < 0.7
+        high_passing = passing_ratio > 0.8
+    else:
+        low_passing = high_passing = missing
+    
+    has_admission = 'Admission_grade' in columns
+    if has_admission:
+        admission_grade = np.asarray(columns['Admission_grade'], dtype=float)
+        low_admission = admission_grade < 130
+        high_admission = admission_grade > 150
+    else:
+        low_admission = high_admission = missing
+    
+    if 'Scholarship_holder' in columns:
+        scholarship = np.asarray(columns['Scholarship_holder'], dtype=object)
+        no_scholarship = scholarship == 'No'
+        has_scholarship = scholarship == 'Yes'
+    else:
+        no_scholarship = has_scholarship = missing
+    
+    if 'Tuition_fees_up_to_date' in columns:
+        tuition_uptodate = np.asarray(columns['Tuition_fees_up_to_date'], dtype=object)
+        tuition_late = tuition_uptodate == 'No'
+        tuition_paid = tuition_uptodate == 'Yes'
+    else:
+        tuition_late = tuition_paid = missing
+    
+    if 'Curricular_units_1st_sem_approved' in columns:
+        units_approved = np.asarray(columns['Curricular_units_1st_sem_approved'], dtype=float)
+        few_units = units_approved < 4
+        many_units = units_approved > 5
+    else:
+        few_units = many_units = missing
+    
+    # Medium risk reports the passing ratio first, then falls back to the admission grade
+    medium_fallback = is_medium & ~low_passing & ~high_passing
+    medium_admission = medium_fallback & has_admission
+    
+    return np.column_stack([
+        (is_high | is_medium) & low_passing,
+        (is_high | medium_admission) & low_admission,
+        is_high & no_scholarship,
+        is_high & tuition_late,
+        is_high & few_units,
+        (is_low | is_medium) & high_passing,
+        (is_low | medium_admission) & high_admission,
+        is_low & has_scholarship,
+        is_low & tuition_paid,
+        is_low & many_units,
+        medium_admission & ~low_admission & ~high_admission,
+        medium_fallback & (not has_admission)
+    ])
 
 def identify_key_risk_factors(input_data, prediction):
     """
@@ -0,0 +1,422 @@
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+from sklearn.cluster import Birch, MeanShift, MiniBatchKMeans, estimate_bandwidth
+from sklearn.metrics import adjusted_rand_score, davies_bouldin_score, silhouette_score
+from sklearn.neighbors import KDTree
+from utils.bandwidth import data_fingerprint, tuned_bandwidth
+from utils.model_registry import get_model_registry
+
+# Features the MeanShift reference model was fit on (models/model_metadata.pkl)
+CLUSTER_FEATURES = [
+    'Curricular_units_1st_sem_approved', 'Curricular_units_1st_sem_grade',
+    'Passing_ratio_1st_sem', 'Performance_category_Excellent', 'Performance_category_Poor'
+]
+
+# Clusters found by the reference model, used when there's no model to ask
+DEFAULT_N_CLUSTERS = 5
+
+# Above this many rows, the exact MeanShift is too slow to train on request
+MEANSHIFT_MAX_ROWS = 50_000
+
+# Rows per batch for the engines that fit incrementally
+BATCH_ROWS = 10_000
+
+# Mean-shift only seeds from bandwidth-wide bins holding at least this share
+# of the rows; the stray rows in sparser bins otherwise become clusters of
+# their own (two extra clusters, of 61 and 6 rows, on the labelled data)
+MIN_BIN_SHARE = 0.001
+
+# StandardScaler for CLUSTER_FEATURES; the models cluster standardized features
+CLUSTER_SCALER_PATH = 'models/cluster_scaler.pkl'
+
+def load_cluster_scaler(data=None):
+    """
+    The persisted cluster feature scaler.
+
+    If none has been published and `data` is given, one is fitted on its
+    CLUSTER_FEATURES and published. Returns None otherwise.
+    """
+    registry = get_model_registry()
+    scaler = registry.get('cluster_scaler')
+    if scaler is None and data is not None:
+        from sklearn.preprocessing import StandardScaler
+        scaler = StandardScaler().fit(data[CLUSTER_FEATURES].astype('float64').to_numpy())
+        registry.publish('cluster_scaler', scaler)
+    return scaler
+
+def cluster_matrix(data, scaler=None):
+    """
+    The CLUSTER_FEATURES of a frame as a standardized float64 matrix.
+
+    Every engine, and the bandwidth, works in this space: the reference
+    model was fit on standardized features.
+    """
+    scaler = scaler or load_cluster_scaler(data)
+    X = data[CLUSTER_FEATURES].astype('float64').to_numpy()
+    return (X - scaler.mean_) / scaler.scale_
+
+def cluster_fingerprint(data):
+    """
+    Fingerprint of a frame's CLUSTER_FEATURES and the scaler, the key of its bandwidth sweep
+    """
+    return data_fingerprint(data[CLUSTER_FEATURES].to_numpy(np.float32), get_model_registry().digest('cluster_scaler'))
+
+def _bandwidth(X, random_state=42):
+    # Same estimate as the reference model, on a fixed-size sample
+    return estimate_bandwidth(X, quantile=0.2, n_samples=min(500, len(X)), random_state=random_state)
+
+def _min_bin_freq(n_rows):
+    return max(1, int(np.ceil(MIN_BIN_SHARE * n_rows)))
+
+def _nearest(centers, X):
+    """
+    Index of the nearest center for every row, through a KD-tree
+    """
+    labels = np.empty(len(X), dtype=np.int64)
+    tree = KDTree(centers)
+    for start in range(0, len(X), BATCH_ROWS):
+        labels[start:start + BATCH_ROWS] = tree.query(X[start:start + BATCH_ROWS], k=1)[1][:, 0]
+    return labels
+
+class CoresetMeanShift:
+    """
+    Mean-shift over a weighted coreset instead of every row.
+
+    Rows are binned on a grid a fraction of the bandwidth wide and each
+    occupied cell becomes one point, weighted by its row count. Flat-kernel
+    mean-shift then runs on those points with KD-tree radius queries,
+    seeded like MeanShift's bin seeding, and the modes are merged like
+    MeanShift's. Building the coreset is one pass over the rows; the
+    quadratic part only sees the occupied cells.
+    """
+
+    def __init__(self, bandwidth=None, cell_fraction=0.125, max_iter=300, random_state=42):
+        self.bandwidth = bandwidth
+        self.cell_fraction = cell_fraction
+        self.max_iter = max_iter
+        self.random_state = random_state
+
+    def _coreset(self, X):
+        cells = np.floor(X / (self.bandwidth_ * self.cell_fraction)).astype(np.int64)
+        _, inverse, counts = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.ravel()
+
+        # Mean of the rows in each cell, weighted by how many there are
+        points = np.column_stack([
+            np.bincount(inverse, weights=X[:, col], minlength=len(counts)) for col in range(X.shape[1])
+        ]) / counts[:, None]
+        return points, counts.astype(np.float64)
+
+    def fit(self, X, y=None, progress=None):
+        """
+        Fit on X; `progress(done, total, message)` is told how many seeds have converged
+        """
+        X = np.asarray(X, dtype=np.float64)
+        self.bandwidth_ = self.bandwidth or _bandwidth(X, self.random_state)
+        points, weights = self._coreset(X)
+        tree = KDTree(points)
+
+        # Bandwidth-wide bins with enough rows seed a search, shifted until it
+        # stops moving; the coreset points are binned, with their row counts
+        bins, inverse = np.unique(np.round(points / self.bandwidth_), axis=0, return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=weights)
+        modes = bins[counts >= _min_bin_freq(len(X))] * self.bandwidth_
+        active = np.arange(len(modes))
+        for _ in range(self.max_iter):
+            if len(active) == 0:
+                break
+            neighbours = tree.query_radius(modes[active], r=self.bandwidth_)
+            moved = []
+            for seed, idx in zip(active, neighbours):
+                if len(idx) == 0:
+                    continue
+                w = weights[idx]
+                mode = (points[idx] * w[:, None]).sum(axis=0) / w.sum()
+                if np.linalg.norm(mode - modes[seed]) > 1e-3 * self.bandwidth_:
+                    moved.append(seed)
+                modes[seed] = mode
+            active = np.array(moved, dtype=np.int64)
+            if progress is not None:
+                progress(len(modes) - len(active), len(modes), f"{len(modes) - len(active):,} of {len(modes):,} seeds converged")
+
+        # Strongest modes first, dropping any within a bandwidth of a stronger
+        # one; a seed with no point in reach has no strength and is dropped
+        strength = np.array([weights[idx].sum() for idx in tree.query_radius(modes, r=self.bandwidth_)])
+        modes = modes[strength > 0]
+        strength = strength[strength > 0]
+        order = np.argsort(-strength, kind='stable')
+        keep = np.ones(len(order), dtype=bool)
+        mode_tree = KDTree(modes[order])
+        for i, neighbours in enumerate(mode_tree.query_radius(modes[order], r=self.bandwidth_)):
+            if keep[i]:
+                keep[neighbours[neighbours > i]] = False
+
+        self.cluster_centers_ = modes[order][keep]
+        self.n_coreset_ = len(points)
+        self.labels_ = _nearest(self.cluster_centers_, X)
+        return self
+
+    def predict(self, X):
+        return _nearest(self.cluster_centers_, np.asarray(X, dtype=np.float64))
+
+def fit_meanshift(X, bandwidth=None, **params):
+    """
+    The reference: exact MeanShift with bin seeding, roughly quadratic in rows
+    """
+    return MeanShift(bandwidth=bandwidth or _bandwidth(X), bin_seeding=True, min_bin_freq=_min_bin_freq(len(X))).fit(X)
+
+def fit_minibatch_kmeans(X, n_clusters=DEFAULT_N_CLUSTERS, random_state=42, **params):
+    return MiniBatchKMeans(
+        n_clusters=n_clusters, batch_size=4096, n_init=3, random_state=random_state
+    ).fit(X)
+
+def fit_birch(X, n_clusters=DEFAULT_N_CLUSTERS, threshold=0.9, progress=None, **params):
+    """
+    Birch fed BATCH_ROWS at a time, with one global clustering at the end.
+
+    The threshold is in standard deviations (see cluster_matrix); around 0.9
+    the subclusters already are the reference clusters, while below 0.8 the
+    global clustering splits them differently.
+    """
+    model = Birch(threshold=threshold, n_clusters=None)
+    for start in range(0, len(X), BATCH_ROWS):
+        model.partial_fit(X[start:start + BATCH_ROWS])
+        if progress is not None:
+            done = min(start + BATCH_ROWS, len(X))
+            progress(done, len(X), f"{done:,} of {len(X):,} rows")
+
+    # Group the subclusters into n_clusters, then label every row
+    model.set_params(n_clusters=n_clusters)
+    model.partial_fit()
+    model.labels_ = model.predict(X)
+
+    # Centers of the final clusters, like the other engines have
+    model.cluster_centers_ = np.array([X[model.labels_ == label].mean(axis=0) for label in range(n_clusters)])
+    return model
+
+def fit_coreset_meanshift(X, bandwidth=None, random_state=42, progress=None, **params):
+    return CoresetMeanShift(bandwidth=bandwidth, random_state=random_state).fit(X, progress=progress)
+
+# Resolved and shared through the model registry like the pickled models
+get_model_registry().register('cluster_scaler', [CLUSTER_SCALER_PATH])
+
+# Engine name -> fit function; every engine returns a fitted model with
+# cluster_centers_, labels_ and predict. Engines that can, report through
+# a `progress(done, total, message)` keyword.
+CLUSTER_ENGINES = {
+    'meanshift': fit_meanshift,
+    'minibatch_kmeans': fit_minibatch_kmeans,
+    'birch': fit_birch,
+    'coreset_meanshift': fit_coreset_meanshift
+}
+
+def _relabel(model, order):
+    """
+    Renumber a fitted model's clusters: old label order[i] becomes label i
+    """
+    mapping = np.empty(len(order), dtype=np.int64)
+    mapping[order] = np.arange(len(order))
+    model.cluster_centers_ = model.cluster_centers_[order]
+    model.labels_ = mapping[model.labels_]
+
+    # Birch predicts through its subclusters, which carry the labels
+    if isinstance(model, Birch):
+        model.subcluster_labels_ = mapping[model.subcluster_labels_]
+    return model
+
+def align_clusters(model, reference_centers):
+    """
+    Number a model's clusters like the reference model's.
+
+    Each reference cluster is matched to its nearest cluster of the model
+    (one to one), so Cluster ids keep their meaning across engines; any
+    clusters left over are numbered after the reference ones.
+    """
+    centers = model.cluster_centers_
+    distances = np.linalg.norm(reference_centers[:, None, :] - centers[None, :, :], axis=2)
+    reference_ids, model_ids = linear_sum_assignment(distances)
+
+    order = list(model_ids[np.argsort(reference_ids)])
+    order += [label for label in range(len(centers)) if label not in order]
+    return _relabel(model, np.array(order))
+
+def reference_bandwidth(model):
+    """
+    The bandwidth a mean-shift model was fit with, None for other models
+    """
+    return getattr(model, 'bandwidth_', None) or getattr(model, 'bandwidth', None)
+
+def fit_clusters(engine, X, reference=None, **params):
+    """
+    Fit one engine and return (model, fit seconds).
+
+    With a `reference` model, the number of clusters and the bandwidth
+    are taken from it and the labels are aligned with its Cluster ids, see
+    align_clusters.
+    """
+    if reference is not None:
+        params.setdefault('n_clusters', len(reference.cluster_centers_))
+        if reference_bandwidth(reference) is not None:
+            params.setdefault('bandwidth', reference_bandwidth(reference))
+
+    start = time.perf_counter()
+    model = CLUSTER_ENGINES[engine](X, **params)
+    seconds = time.perf_counter() - start
+
+    if reference is not None and model is not reference:
+        model = align_clusters(model, reference.cluster_centers_)
+    return model, seconds
+
+def cluster_report(engine, model, X, seconds, reference_labels=None, sample_size=5000, random_state=42):
+    """
+    Fit time and quality of a fitted engine.
+
+    Silhouette is computed on a sample of `sample_size` rows, it is
+    quadratic too. `agreement` is the adjusted Rand index against the
+    reference labels, and `same_cluster` the share of rows given the same
+    Cluster id.
+    """
+    labels = model.labels_
+    n_clusters = len(np.unique(labels))
+    report = {
+        'engine': engine,
+        'n_rows': len(X),
+        'n_clusters': n_clusters,
+        'fit_seconds': seconds,
+        'silhouette': None,
+        'davies_bouldin': None
+    }
+
+    if 1 < n_clusters < len(X):
+        report['silhouette'] = float(silhouette_score(
+            X, labels, sample_size=min(sample_size, len(X)), random_state=random_state
+        ))
+        report['davies_bouldin'] = float(davies_bouldin_score(X, labels))
+
+    if reference_labels is not None:
+        report['agreement'] = float(adjusted_rand_score(reference_labels, labels))
+        report['same_cluster'] = float((np.asarray(reference_labels) == labels).mean())
+
+    return report
+
+def compare_engines(X, engines=None, reference=None, reference_labels=None):
+    """
+    Fit every engine on the same rows and return their reports
+    """
+    reports = []
+    for engine in engines or list(CLUSTER_ENGINES):
+        if engine == 'meanshift' and len(X) > MEANSHIFT_MAX_ROWS:
+            reports.append({'engine': engine, 'n_rows': len(X), 'skipped': f"more than {MEANSHIFT_MAX_ROWS:,} rows"})
+            continue
+        model, seconds = fit_clusters(engine, X, reference)
+        reports.append(cluster_report(engine, model, X, seconds, reference_labels))
+    return reports
+
+def train_cluster_model(data, engine=None, progress=None):
+    """
+    Fit the Cluster model on a frame and publish it to every session.
+
+    Picks the exact MeanShift up to MEANSHIFT_MAX_ROWS rows and the coreset
+    engine beyond. A model that is already published is used as the
+    reference, so Cluster ids keep their meaning. Returns the model and its
+    cluster_report.
+
+    Runs offline or as a background job (utils/jobs.py), never inline in a
+    page: `data` may be a function returning the frame, and `progress` is
+    told about each stage (loading, bandwidth, fit, publish) out of 4.
+    """
+    def report(done, message):
+        if progress is not None:
+            progress(done, 4, message)
+
+    report(0, "Loading the clustering data")
+    if callable(data):
+        data = data()
+    X = cluster_matrix(data)
+    engine = engine or ('meanshift' if len(X) <= MEANSHIFT_MAX_ROWS else 'coreset_meanshift')
+
+    registry = get_model_registry()
+    try:
+        reference = registry.get('meanshift')
+    except Exception:
+        # Unreadable model, train from scratch
+        reference = None
+
+    # A bandwidth tuned for this data (utils/bandwidth.py) comes first, then
+    # the published model's; only without either is it estimated
+    params = {}
+    if engine in ('meanshift', 'coreset_meanshift'):
+        report(1, "Choosing the bandwidth")
+        params['bandwidth'] = (
+            tuned_bandwidth(cluster_fingerprint(data))
+            or (reference_bandwidth(reference) if reference is not None else None)
+            or _bandwidth(X)
+        )
+
+    # The engine's own progress fills the fit stage
+    report(2, f"Fitting {engine} on {len(X):,} rows")
+    if progress is not None:
+        params['progress'] = lambda done, total, message=None: progress(
+            2 + (done / total if total else 0), 4, f"Fitting {engine}: {message}" if message else None
+        )
+
+    model, seconds = fit_clusters(engine, X, reference, **params)
+    if 'bandwidth' in params:
+        # Kept with the model, so the next retrain reuses it
+        model.bandwidth_ = params['bandwidth']
+
+    # Written to a temporary file and renamed, then swapped in for every session
+    report(3, "Publishing the model")
+    registry.publish('meanshift', model)
+    report(4, "Done")
+    return model, cluster_report(engine, model, X, seconds)
+
+if __name__ == "__main__":
+    import joblib
+    from utils.scaling import labelled_csv
+
+    parser = argparse.ArgumentParser(description="Fit and compare the clustering engines on the labelled dataset")
+    parser.add_argument('--engines', nargs='+', choices=list(CLUSTER_ENGINES), default=list(CLUSTER_ENGINES))
+    parser.add_argument('--rows', type=int, default=None, help="resample the dataset to this many rows to time larger populations")
+    parser.add_argument('--reference', default='models/meanshift_model.pkl', help="model whose Cluster ids the engines are aligned with")
+    parser.add_argument('--json', action='store_true', help="print the reports as JSON")
+    parser.add_argument('--train', nargs='?', const='auto', choices=['auto'] + list(CLUSTER_ENGINES),
+                        help="train and publish the dashboard's Cluster model instead of comparing engines")
+    args = parser.parse_args()
+
+    if args.train:
+        # Through the module, so a pickled CoresetMeanShift isn't tied to __main__
+        from utils import cluster_engines
+        from utils.load_data import load_dataset
+
+        # The same frame the dashboard's background training uses
+        model, report = cluster_engines.train_cluster_model(
+            load_dataset('clustering'), None if args.train == 'auto' else args.train
+        )
+        print(f"Published {report['engine']}: {report['n_clusters']} clusters on {report['n_rows']:,} rows "
+              f"in {report['fit_seconds']:.2f}s")
+        raise SystemExit
+
+    data = pd.read_csv(labelled_csv())
+    reference_labels = data['Cluster'].to_numpy()
+    if args.rows:
+        sample = np.random.default_rng(42).integers(0, len(data), args.rows)
+        data, reference_labels = data.iloc[sample], reference_labels[sample]
+
+    reference = joblib.load(args.reference)
+    reports = compare_engines(cluster_matrix(data), args.engines, reference, reference_labels)
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for report in reports:
+            if 'skipped' in report:
+                print(f"{report['engine']:<18} skipped, {report['skipped']}")
+                continue
+            silhouette = 'n/a' if report['silhouette'] is None else f"{report['silhouette']:.3f}"
+            print(f"{report['engine']:<18} {report['n_clusters']:>3} clusters  {report['fit_seconds']:8.2f}s  "
+                  f"silhouette {silhouette}  ARI {report['agreement']:.3f}  same Cluster {report['same_cluster']:.1%}")
@@ -0,0 +1,193 @@
+import threading
+import time
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+from utils.cluster_engines import CLUSTER_FEATURES, cluster_matrix, load_cluster_scaler
+from utils.incremental import RISK_LEVELS, normalize_risk_labels
+from utils.load_data import load_handle
+from utils.model_registry import get_model_registry
+from utils.scaling import load_feature_scaling
+
+# Up to this many centers a direct distance computation beats the tree
+BRUTE_FORCE_CENTERS = 64
+
+# Rows per distance block in batch assignment
+ASSIGN_CHUNK_ROWS = 65_536
+
+# Labelled dataset columns the index is built from
+INDEX_COLUMNS = tuple(CLUSTER_FEATURES + ['Risk_Category'])
+
+# Seconds between checks that the model and dataset behind the index are current
+INDEX_CHECK_SECONDS = 1.0
+
+class ClusterIndex:
+    """
+    Nearest-center lookup over a clustering model's cluster_centers_.
+
+    Holds the centers, a KD-tree over them for models with many centers
+    (the coreset engines), each cluster's radius (the farthest labelled
+    student from its center) and the cluster-conditional risk distribution
+    over the Low/Medium/High levels. Radii and risk shares come from the
+    labelled students as the indexed model clusters them, not from the
+    stored Cluster column, so a retrained model is described by its own
+    clusters. Features are standardized with the cluster scaler first,
+    like the model's training input. One student is a few NumPy
+    operations, batches are assigned in blocks.
+    """
+
+    def __init__(self, centers, radii, risk_distribution, mean, scale):
+        self.centers = np.ascontiguousarray(centers, dtype=np.float64)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.radii = np.asarray(radii, dtype=np.float64)
+        self.tree = KDTree(self.centers) if len(self.centers) > BRUTE_FORCE_CENTERS else None
+        self._center_norms = (self.centers ** 2).sum(axis=1)
+
+        # Risk shares per cluster id, NaN for clusters without labelled students
+        self.risk_categories = list(risk_distribution.columns)
+        self.risk = risk_distribution.reindex(range(len(self.centers))).to_numpy(dtype=np.float64)
+
+    @classmethod
+    def build(cls, model, scaler, labelled):
+        """
+        Index a fitted model, with radii and risk shares from the labelled
+        students as the model clusters them
+        """
+        centers = np.asarray(model.cluster_centers_, dtype=np.float64)
+        X = cluster_matrix(labelled, scaler)
+        clusters = np.asarray(model.predict(X))
+
+        radii = np.zeros(len(centers))
+        for cluster in range(len(centers)):
+            members = X[clusters == cluster]
+            if len(members):
+                radii[cluster] = np.sqrt(((members - centers[cluster]) ** 2).sum(axis=1)).max()
+
+        # The labelled data spells the levels Rendah/Medium/Tinggi
+        levels = normalize_risk_labels(labelled['Risk_Category'].astype(str))
+        crosstab = pd.crosstab(clusters, levels)
+        crosstab = crosstab.reindex(columns=[level for level in RISK_LEVELS if level in crosstab.columns])
+        risk_distribution = crosstab.div(crosstab.sum(axis=1), axis=0)
+        return cls(centers, radii, risk_distribution, scaler.mean_, scaler.scale_)
+
+    def nearest(self, X):
+        """
+        (cluster ids, distances) of the nearest center for every standardized row of X
+        """
+        X = np.asarray(X, dtype=np.float64)
+        clusters = np.empty(len(X), dtype=np.int64)
+        distances = np.empty(len(X), dtype=np.float64)
+
+        for start in range(0, len(X), ASSIGN_CHUNK_ROWS):
+            block = X[start:start + ASSIGN_CHUNK_ROWS]
+            if self.tree is not None:
+                dist, idx = self.tree.query(block, k=1)
+                clusters[start:start + len(block)] = idx[:, 0]
+                distances[start:start + len(block)] = dist[:, 0]
+                continue
+
+            # |x - c|^2 = |x|^2 - 2 x.c + |c|^2, one matrix product per block
+            squared = (block ** 2).sum(axis=1)[:, None] - 2 * block @ self.centers.T + self._center_norms
+            idx = squared.argmin(axis=1)
+            clusters[start:start + len(block)] = idx
+            distances[start:start + len(block)] = np.sqrt(np.maximum(squared[np.arange(len(block)), idx], 0))
+
+        return clusters, distances
+
+    def assign_one(self, features):
+        """
+        Cluster of one student, from a dict of CLUSTER_FEATURES
+        """
+        # A vector per call, the index is shared between sessions' threads
+        row = np.fromiter((features[col] for col in CLUSTER_FEATURES), dtype=np.float64, count=len(CLUSTER_FEATURES))
+        row = (row - self.mean) / self.scale
+
+        squared = ((self.centers - row) ** 2).sum(axis=1)
+        cluster = int(squared.argmin())
+        distance = float(np.sqrt(squared[cluster]))
+        return {
+            'cluster': cluster,
+            'distance': distance,
+            'within_radius': bool(distance <= self.radii[cluster]),
+            'risk_distribution': dict(zip(self.risk_categories, self.risk[cluster].tolist()))
+        }
+
+    def assign(self, features):
+        """
+        Clusters of a batch, from a frame (or dict of arrays) of CLUSTER_FEATURES
+        """
+        X = np.column_stack([np.asarray(features[col], dtype=np.float64) for col in CLUSTER_FEATURES])
+        clusters, distances = self.nearest((X - self.mean) / self.scale)
+
+        result = {
+            'Cluster': clusters,
+            'Cluster_distance': distances,
+            'Within_cluster_radius': distances <= self.radii[clusters]
+        }
+        risk = self.risk[clusters]
+        for i, category in enumerate(self.risk_categories):
+            result[f'Cluster_risk_{category}'] = risk[:, i]
+
+        index = features.index if isinstance(features, pd.DataFrame) else None
+        return pd.DataFrame(result, index=index)
+
+_index_cache = {}
+_index_lock = threading.Lock()
+
+def load_cluster_index():
+    """
+    The index for the published Cluster model, None if there is no model.
+
+    Rebuilt only when the model, its scaler or the labelled dataset
+    changes, which is checked at most every INDEX_CHECK_SECONDS so single
+    assignments stay in microseconds.
+    """
+    cached = _index_cache.get('index')
+    if cached is not None and time.monotonic() - cached[2] < INDEX_CHECK_SECONDS:
+        return cached[1]
+
+    with _index_lock:
+        registry = get_model_registry()
+        handle = load_handle('labelled', INDEX_COLUMNS)
+        key = (registry.version('meanshift'), registry.version('cluster_scaler'), handle.version)
+
+        cached = _index_cache.get('index')
+        if cached is not None and cached[0] == key:
+            _index_cache['index'] = (key, cached[1], time.monotonic())
+            return cached[1]
+
+        model = registry.get('meanshift')
+        scaler = load_cluster_scaler()
+        if model is None or scaler is None or 'Risk_Category' not in handle.frame.columns:
+            _index_cache.pop('index', None)
+            return None
+
+        index = ClusterIndex.build(model, scaler, handle.frame)
+        _index_cache['index'] = (key, index, time.monotonic())
+        return index
+
+def cluster_features(raw):
+    """
+    CLUSTER_FEATURES for students in the data.csv layout, scaled like the
+    labelled dataset; only the enrolled, approved and grade columns are read
+    """
+    return load_feature_scaling().transform(raw, CLUSTER_FEATURES)
+
+def assign_cluster(features):
+    """
+    Assign students to the nearest cluster of the published model.
+
+    `features` holds the CLUSTER_FEATURES on the labelled dataset's scale
+    (see cluster_features): a dict for one student, which returns a dict
+    with the cluster, its distance to the center, whether it is within the
+    cluster's radius and the cluster's risk distribution; or a DataFrame
+    for a batch, which returns a frame of the same values per row.
+    """
+    index = load_cluster_index()
+    if index is None:
+        raise LookupError("No clustering model has been published")
+
+    if isinstance(features, dict) and not isinstance(next(iter(features.values())), (list, np.ndarray, pd.Series)):
+        return index.assign_one(features)
+    return index.assign(features)
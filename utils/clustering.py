@@ -5,58 +5,73 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import joblib
 import os
-from sklearn.cluster import MeanShift, estimate_bandwidth
-from sklearn.preprocessing import StandardScaler
+from utils.aggregates import RunningAggregates
+from utils.cluster_engines import train_cluster_model
+from utils.jobs import get_job_runner
+from utils.load_data import load_dataset
+from utils.model_registry import get_model_registry
 
-def load_or_train_meanshift_model(data):
+# Features compared across clusters in the interpretations
+CLUSTER_PROFILE_FEATURES = [
+    'Age_at_enrollment', 'Previous_qualification_grade', 'Admission_grade',
+    'Curricular_units_1st_sem_approved', 'Passing_ratio_1st_sem',
+    'Scholarship_holder', 'Tuition_fees_up_to_date'
+]
+
+# Model versions that failed to load, so a broken file isn't unpickled on every rerun
+_unreadable_versions = {}
+
+def load_cluster_model():
+    """
+    The published Cluster model, or None if there isn't a usable one.
+
+    Resolved once per process by the model registry, which only stats the
+    file on later calls and reloads it when it changes. Never trains: the
+    model is built offline with python -m utils.cluster_engines --train,
+    or in the background with submit_cluster_training.
     """
-    Load existing MeanShift model or train a new one if model doesn't exist
+    registry = get_model_registry()
+    version = registry.version('meanshift')
+    if version is None or _unreadable_versions.get('meanshift') == version:
+        return None
+    
+    try:
+        return registry.get('meanshift')
+    except Exception:
+        _unreadable_versions['meanshift'] = version
+        return None
+
+# Job runner key of the Cluster model training, one run at a time
+CLUSTER_TRAINING_JOB = 'cluster_model'
+
+def submit_cluster_training(engine=None):
     """
-    model_path = 'models/meanshift_model.pkl'
-    
-    # Check if model exists
-    if os.path.exists(model_path):
-        try:
-            model = joblib.load(model_path)
-            return model
-        except:
-            # If error loading model, train a new one
-            pass
-    
-    # Train new model
-    # Prepare data
-    X = data.copy()
-    # Remove non-numeric columns if any
-    X = X.select_dtypes(include=['float64', 'int64'])
-    
-    # Scale data
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
-    
-    # Estimate bandwidth
-    bandwidth = estimate_bandwidth(X_scaled, quantile=0.2, n_samples=500)
-    
-    # Train MeanShift model
-    model = MeanShift(bandwidth=bandwidth, bin_seeding=True)
-    model.fit(X_scaled)
-    
-    # Save model
-    if not os.path.exists('models'):
-        os.makedirs('models')
-    joblib.dump(model, model_path)
-    
-    return model
+    Train and publish the Cluster model in a background job.
 
-def cluster_interpretation(df_with_risk_labels):
+    Returns the job, or the one already running for another session.
+    The new model is swapped in for every session when it finishes.
+    """
+    return get_job_runner().submit(
+        CLUSTER_TRAINING_JOB, train_cluster_model, lambda: load_dataset('clustering'), engine,
+        name="Clustering model training"
+    )
+
+def cluster_interpretation(df_with_risk_labels, aggregates=None):
     """
     Provide interpretation of clusters based on risk levels and characteristics
+
+    Pass the dataset's running aggregates to reuse its cluster statistics
+    instead of recomputing them from the rows.
     """
     if 'Cluster' not in df_with_risk_labels.columns or 'Risk_Category' not in df_with_risk_labels.columns:
         # Return empty dictionary if required columns are missing
         return {}
     
+    if aggregates is None:
+        aggregates = RunningAggregates(group_by='Cluster').update(df_with_risk_labels)
+    
     # Get risk level counts per cluster
-    risk_by_cluster = pd.crosstab(df_with_risk_labels['Cluster'], df_with_risk_labels['Risk_Category'])
+    risk_by_cluster = aggregates.crosstab('Risk_Category')
     
     # Calculate percentage
     risk_pct = risk_by_cluster.div(risk_by_cluster.sum(axis=1), axis=0) * 100
@@ -64,25 +79,18 @@ def cluster_interpretation(df_with_risk_labels):
     # Determine dominant risk level for each cluster
     dominant_risk = risk_pct.idxmax(axis=1)
     
-    # Get cluster statistics
-    important_features = [
-        'Age_at_enrollment', 'Previous_qualification_grade', 'Admission_grade',
-        'Curricular_units_1st_sem_approved', 'Passing_ratio_1st_sem',
-        'Scholarship_holder', 'Tuition_fees_up_to_date'
-    ]
-    
     # Filter available features
-    available_features = [f for f in important_features if f in df_with_risk_labels.columns]
+    available_features = [f for f in CLUSTER_PROFILE_FEATURES if f in df_with_risk_labels.columns]
     
     if not available_features:
         # Return empty dictionary if no important features are available
         return {}
     
     # Calculate cluster statistics
-    cluster_stats = df_with_risk_labels.groupby('Cluster')[available_features].mean()
+    cluster_stats = aggregates.group_means(available_features)
     
     # Get overall averages
-    overall_avg = df_with_risk_labels[available_features].mean()
+    overall_avg = aggregates.means(available_features)
     
     # Calculate relative differences
     rel_diff = (cluster_stats.div(overall_avg) - 1) * 100
@@ -0,0 +1,254 @@
+import glob
+import hashlib
+import io
+import json
+import os
+import time
+import pandas as pd
+
+def cache_path(csv_path):
+    """
+    Parquet file kept next to a CSV
+    """
+    return os.path.splitext(csv_path)[0] + '.parquet'
+
+def fingerprint_path(csv_path):
+    return cache_path(csv_path) + '.json'
+
+def segment_path(csv_path, index):
+    """
+    Parquet file holding the rows added by one append
+    """
+    return os.path.splitext(csv_path)[0] + f'.append-{index:04d}.parquet'
+
+def content_hash(path, start=0, stop=None):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = None if stop is None else stop - start
+        while remaining is None or remaining > 0:
+            block = f.read(1 << 20 if remaining is None else min(1 << 20, remaining))
+            if not block:
+                break
+            sha.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return sha.hexdigest()
+
+def _content_matches(csv_path, fingerprint):
+    segments = fingerprint.get('segments') or []
+    if not segments:
+        return fingerprint.get('sha256') == content_hash(csv_path)
+
+    # Appended files are hashed as the original bytes plus one range per append
+    if fingerprint.get('sha256') != content_hash(csv_path, 0, fingerprint['base_size']):
+        return False
+    return all(
+        segment['sha256'] == content_hash(csv_path, segment['offset'], segment['offset'] + segment['size'])
+        for segment in segments
+    )
+
+def source_unchanged(csv_path, fingerprint):
+    """
+    Check a CSV against a stored size/mtime/SHA-256 fingerprint.
+
+    The file is only hashed when the mtime moved but the size didn't; if the
+    content is the same, the fingerprint's mtime is updated in place.
+    """
+    stat = os.stat(csv_path)
+    if fingerprint.get('size') != stat.st_size:
+        return False
+    if fingerprint.get('mtime_ns') == stat.st_mtime_ns:
+        return True
+
+    if _content_matches(csv_path, fingerprint):
+        fingerprint['mtime_ns'] = stat.st_mtime_ns
+        return True
+    return False
+
+def read_fingerprint(csv_path):
+    """
+    The stored cache fingerprint of a CSV, None if there isn't a readable one
+    """
+    try:
+        with open(fingerprint_path(csv_path), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_fingerprint(csv_path, fingerprint):
+    tmp_path = fingerprint_path(csv_path) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(fingerprint, f)
+    os.replace(tmp_path, fingerprint_path(csv_path))
+
+def dataset_version(fingerprint):
+    """
+    Version number of a cached dataset, bumped by every rebuild and append
+    """
+    return fingerprint.get('version', 0) if fingerprint else 0
+
+def _project(df, columns):
+    if columns is None:
+        return df
+    return df[[col for col in columns if col in df.columns]]
+
+def _read_parquet(path, columns, all_columns):
+    if columns is None:
+        return pd.read_parquet(path)
+
+    columns = [col for col in columns if col in all_columns]
+    if not columns:
+        # Read one column for the row count, then drop it
+        return pd.read_parquet(path, columns=all_columns[:1]).iloc[:, :0]
+    return pd.read_parquet(path, columns=columns)
+
+def read_cached_rows(csv_path, fingerprint, columns=None, skip_segments=None):
+    """
+    Rows held by a valid cache: the base table and the appended segments.
+
+    With `skip_segments`, only the segments after the first `skip_segments`
+    appends are read, which is how a loaded dataset picks up new rows.
+    """
+    frames = []
+    segments = fingerprint['segments']
+    if skip_segments is None:
+        frames.append(_read_parquet(cache_path(csv_path), columns, fingerprint['columns']))
+    else:
+        segments = segments[skip_segments:]
+    for segment in segments:
+        frames.append(_read_parquet(segment_path(csv_path, segment['index']), columns, fingerprint['columns']))
+
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
+
+def read_csv_versioned(csv_path, columns=None, **read_csv_kwargs):
+    """
+    read_csv_cached, also returning the fingerprint the rows were read under
+    """
+    stat = os.stat(csv_path)
+    options = json.dumps(read_csv_kwargs, sort_keys=True)
+    cached = read_fingerprint(csv_path)
+
+    if cached is not None and cached.get('options') == options and 'segments' in cached \
+            and os.path.exists(cache_path(csv_path)):
+        mtime_ns = cached.get('mtime_ns')
+        unchanged = source_unchanged(csv_path, cached)
+
+        # Touched but unchanged, remember the new mtime to skip hashing next time
+        if unchanged and cached['mtime_ns'] != mtime_ns:
+            try:
+                _write_fingerprint(csv_path, cached)
+            except OSError:
+                pass
+
+        if unchanged:
+            try:
+                return read_cached_rows(csv_path, cached, columns), cached
+            except Exception:
+                # Unreadable cache, rebuild it below
+                pass
+
+    df = pd.read_csv(csv_path, **read_csv_kwargs)
+    fingerprint = {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': content_hash(csv_path),
+        'base_size': stat.st_size,
+        'segments': [],
+        'options': options,
+        'columns': list(df.columns),
+        'version': dataset_version(cached) + 1
+    }
+
+    try:
+        # Write the table first, then the fingerprint that vouches for it
+        tmp_path = cache_path(csv_path) + '.tmp'
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, cache_path(csv_path))
+        _write_fingerprint(csv_path, fingerprint)
+
+        # The rebuilt table already holds any previously appended rows
+        for path in glob.glob(os.path.splitext(csv_path)[0] + '.append-*.parquet'):
+            os.remove(path)
+    except Exception:
+        # Read-only data directory or no Parquet engine, serve the parsed CSV
+        pass
+
+    return _project(df, columns), fingerprint
+
+def read_csv_cached(csv_path, columns=None, **read_csv_kwargs):
+    """
+    Read a CSV through a typed Parquet cache stored beside it.
+
+    The cache is keyed on the CSV's size, mtime and SHA-256 plus the
+    read_csv arguments. Size and mtime are checked on every read; the file
+    is only hashed when they change, so a touched but unchanged CSV keeps
+    its cache. Any cache problem falls back to parsing the CSV.
+
+    With `columns`, only those columns are read from the cache (names the
+    CSV doesn't have are skipped). The cache itself always holds every column.
+    """
+    return read_csv_versioned(csv_path, columns, **read_csv_kwargs)[0]
+
+def append_csv_rows(csv_path, rows, **read_csv_kwargs):
+    """
+    Append rows to a CSV and its Parquet cache without re-reading either.
+
+    The rows are written to the end of the CSV and stored as a new cache
+    segment, and the dataset version is bumped. Only one process should
+    append to a CSV at a time. Returns the new fingerprint.
+    """
+    # Make sure the cache describes the CSV as it is before the append
+    fingerprint = read_csv_versioned(csv_path, [], **read_csv_kwargs)[1]
+    if read_fingerprint(csv_path) != fingerprint:
+        raise OSError(f"No Parquet cache could be written for {csv_path}")
+
+    columns = fingerprint['columns']
+    missing = [col for col in columns if col not in rows.columns]
+    if missing:
+        raise ValueError(f"New rows are missing columns: {missing}")
+
+    text = rows[columns].to_csv(sep=read_csv_kwargs.get('sep', ','), header=False, index=False, lineterminator='\n')
+
+    # Parsed back from the CSV text, so the rows get the dtypes a full read gives them
+    options = {key: value for key, value in read_csv_kwargs.items() if key not in ('header', 'names', 'encoding')}
+    parsed = pd.read_csv(io.StringIO(text), header=None, names=columns, **options)
+
+    with open(csv_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                text = '\n' + text
+    data = text.encode('utf-8')
+
+    index = len(fingerprint['segments']) + 1
+    tmp_path = segment_path(csv_path, index) + '.tmp'
+    parsed.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, segment_path(csv_path, index))
+
+    # The fingerprint is written before the CSV grows, with the mtime the
+    # CSV is given afterwards. A reader in between sees a size mismatch and
+    # re-parses the CSV as it is, so no row is ever cached twice.
+    mtime_ns = time.time_ns()
+    offset = fingerprint['size']
+    fingerprint = dict(fingerprint)
+    fingerprint['segments'] = fingerprint['segments'] + [{
+        'index': index,
+        'offset': offset,
+        'size': len(data),
+        'rows': len(parsed),
+        'sha256': hashlib.sha256(data).hexdigest()
+    }]
+    fingerprint['size'] = offset + len(data)
+    fingerprint['mtime_ns'] = mtime_ns
+    fingerprint['version'] = dataset_version(fingerprint) + 1
+    _write_fingerprint(csv_path, fingerprint)
+
+    with open(csv_path, 'ab') as f:
+        f.write(data)
+    os.utime(csv_path, ns=(mtime_ns, mtime_ns))
+
+    return fingerprint
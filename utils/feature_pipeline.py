@@ -0,0 +1,196 @@
+import threading
+import numpy as np
+
+# Fields collected by the risk prediction form, in form order
+PREDICTION_INPUT_FIELDS = [
+    'Age_at_enrollment', 'Gender', 'Marital_status',
+    'Previous_qualification_grade', 'Admission_grade',
+    'Curricular_units_1st_sem_enrolled', 'Curricular_units_1st_sem_approved',
+    'Passing_ratio_1st_sem', 'Scholarship_holder', 'Debtor',
+    'Tuition_fees_up_to_date', 'International'
+]
+
+# Ratios per enrolled unit derived from the unit counts, and the count each divides
+RATIO_FEATURES = {
+    'Passing_ratio_1st_sem': 'Curricular_units_1st_sem_approved',
+    'Participation_ratio_1st_sem': 'Curricular_units_1st_sem_evaluations'
+}
+
+# Encodings applied to text-valued form fields before scoring
+CATEGORICAL_MAPPINGS = {
+    'Gender': {'Male': 1, 'Female': 0},
+    'Scholarship_holder': {'Yes': 1, 'No': 0},
+    'Tuition_fees_up_to_date': {'Yes': 1, 'No': 0},
+    'International': {'Yes': 1, 'No': 0},
+    'Debtor': {'Yes': 1, 'No': 0}
+}
+
+class FeaturePipeline:
+    """
+    Compiled mapping from prediction input to the model's scaled feature vector.
+
+    Built once per model/scaler pair. Single records are written into a
+    preallocated float32 buffer, batches into one float32 matrix, without
+    going through pandas. Features the input doesn't provide, or provides
+    as unknown categories, are imputed at the scaler mean.
+    """
+
+    def __init__(self, feature_names, mean=None, scale=None, error=None, ratio_fill=None):
+        self.feature_names = list(feature_names)
+        self.n_features = len(self.feature_names)
+        self._index = {name: i for i, name in enumerate(self.feature_names)}
+        self._mean = None if mean is None else np.asarray(mean, dtype=np.float32)
+        self._scale = None if scale is None else np.asarray(scale, dtype=np.float32)
+        self._fill = np.zeros(self.n_features, dtype=np.float32) if self._mean is None else self._mean
+        self._ratio_fill = dict(ratio_fill or {})
+        self.error = error
+        self._local = threading.local()
+
+    @classmethod
+    def from_artifacts(cls, model, scaler, features=None, feature_scaling=None):
+        """
+        Build the pipeline from a fitted model, its scaler and feature contract.
+
+        Models fitted on a named frame (the incremental model) take those
+        columns in their original units. Models fitted on bare arrays (the
+        SVM and the reduced model) take `features`, columns of the labelled
+        table, whose min-max step from `feature_scaling` is folded into the
+        scaler's mean and scale.
+        """
+        if model is not None and hasattr(model, 'feature_names_in_'):
+            feature_names = list(model.feature_names_in_)
+            feature_scaling = None
+        elif features is not None:
+            feature_names = list(features)
+            if feature_scaling is None:
+                return cls(feature_names, error="The model's features are min-max scaled, but no feature scaling was found")
+        else:
+            return cls(PREDICTION_INPUT_FIELDS, error="The model has no feature names and no feature list was found")
+
+        # Mirror the checks StandardScaler.transform would make
+        if scaler is None or not hasattr(scaler, 'n_features_in_'):
+            return cls(feature_names, error="Scaler is not fitted")
+
+        if scaler.n_features_in_ != len(feature_names):
+            return cls(feature_names, error=(
+                f"Scaler expects {scaler.n_features_in_} features, "
+                f"model input has {len(feature_names)}"
+            ))
+
+        if hasattr(scaler, 'feature_names_in_') and list(scaler.feature_names_in_) != feature_names:
+            return cls(feature_names, error="Feature names don't match those the scaler was fitted with")
+
+        mean = getattr(scaler, 'mean_', None)
+        scale = getattr(scaler, 'scale_', None)
+        mean = np.zeros(len(feature_names)) if mean is None else np.asarray(mean, dtype=np.float64)
+        scale = np.ones(len(feature_names)) if scale is None else np.asarray(scale, dtype=np.float64)
+        if feature_scaling is None:
+            return cls(feature_names, mean=mean, scale=scale)
+
+        # ((x - min) / range - mean) / scale == (x - (min + mean * range)) / (range * scale)
+        minimum = np.array([feature_scaling.minimum.get(name, 0.0) for name in feature_names])
+        width = np.array([feature_scaling.range.get(name, 1.0) for name in feature_names])
+        return cls(feature_names, mean=minimum + mean * width, scale=width * scale, ratio_fill=feature_scaling.fill)
+
+    def _buffer(self):
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = np.zeros((1, self.n_features), dtype=np.float32)
+            self._local.buffer = buffer
+        return buffer
+
+    def _encode(self, name, value):
+        if isinstance(value, str):
+            if name not in CATEGORICAL_MAPPINGS:
+                raise ValueError(f"Non-numeric value {value!r} for feature {name}")
+            return CATEGORICAL_MAPPINGS[name].get(value, np.nan)
+        return np.nan if value is None else value
+
+    def _scale_inplace(self, X):
+        if self.error is not None:
+            raise ValueError(self.error)
+        if self._mean is not None:
+            X -= self._mean
+            # Unknown categories are imputed at the mean, like missing features
+            X[np.isnan(X)] = 0
+        if self._scale is not None:
+            X /= self._scale
+        return X
+
+    def _ratio(self, name, units, enrolled):
+        # Undefined with nothing enrolled; filled like the labelled table
+        return units / enrolled if enrolled > 0 else self._ratio_fill.get(name, 0)
+
+    def transform(self, record):
+        """
+        Map one input dict to a (1, n_features) float32 array.
+
+        The returned array is a per-thread buffer that is overwritten by the
+        next call, so copy it if it needs to outlive the prediction.
+        """
+        X = self._buffer()
+        row = X[0]
+        row[:] = self._fill
+
+        for name, value in record.items():
+            i = self._index.get(name)
+            if i is not None:
+                row[i] = self._encode(name, value)
+
+        # Calculate derived features
+        if 'Curricular_units_1st_sem_enrolled' in record:
+            enrolled = record['Curricular_units_1st_sem_enrolled']
+            for name, units in RATIO_FEATURES.items():
+                i = self._index.get(name)
+                if i is not None and units in record:
+                    row[i] = self._ratio(name, record[units], enrolled)
+
+        i = self._index.get('Grade_difference')
+        if i is not None and 'Admission_grade' in record and 'Previous_qualification_grade' in record:
+            row[i] = record['Admission_grade'] - record['Previous_qualification_grade']
+
+        return self._scale_inplace(X)
+
+    def transform_batch(self, columns, n_rows):
+        """
+        Map a record batch (DataFrame or dict of column arrays) to a float32 matrix
+        """
+        X = np.tile(self._fill, (n_rows, 1))
+
+        for name, i in self._index.items():
+            if name not in columns:
+                continue
+
+            values = np.asarray(columns[name])
+            if values.dtype == object:
+                if name in CATEGORICAL_MAPPINGS:
+                    values = map_categorical(values, CATEGORICAL_MAPPINGS[name])
+                else:
+                    values = values.astype(float)
+            X[:, i] = values
+
+        # Calculate derived features
+        if 'Curricular_units_1st_sem_enrolled' in columns:
+            enrolled = np.asarray(columns['Curricular_units_1st_sem_enrolled'], dtype=float)
+            has_units = enrolled > 0
+            for name, units in RATIO_FEATURES.items():
+                i = self._index.get(name)
+                if i is not None and units in columns:
+                    values = np.asarray(columns[units], dtype=float)
+                    X[:, i] = np.where(has_units, values / np.where(has_units, enrolled, 1), self._ratio_fill.get(name, 0))
+
+        i = self._index.get('Grade_difference')
+        if i is not None and 'Admission_grade' in columns and 'Previous_qualification_grade' in columns:
+            X[:, i] = (np.asarray(columns['Admission_grade'], dtype=float)
+                       - np.asarray(columns['Previous_qualification_grade'], dtype=float))
+
+        return self._scale_inplace(X)
+
+def map_categorical(values, mapping):
+    """
+    Map an object array through a dict, unknown values become NaN
+    """
+    mapped = np.full(len(values), np.nan)
+    for label, code in mapping.items():
+        mapped[values == label] = code
+    return mapped
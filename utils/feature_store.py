@@ -0,0 +1,312 @@
+import argparse
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from utils.data_cache import content_hash, source_unchanged
+from utils.model_registry import get_model_registry
+from utils.scaling import LABELS_DATA, RAW_DATA, labelled_frame, load_feature_scaling
+
+# One-hot column groups stored as packed bitsets instead of floats
+ONE_HOT_PREFIXES = ('Age_category_', 'Performance_category_', 'Application_priority_', 'Status_')
+
+# Rows per build chunk, a multiple of 8 so chunks pack into whole bytes
+BUILD_CHUNK_ROWS = 65536
+
+# Store of the labelled table, the risk classifier's training input
+LABELLED_STORE = 'data/labelled.store'
+
+def store_path(csv_path):
+    """
+    Store directory kept next to a CSV
+    """
+    return os.path.splitext(csv_path)[0] + '.store'
+
+class FeatureStore:
+    """
+    Memory-mapped, read-only columnar copy of a feature table.
+
+    Numeric columns live in one float32 matrix, one-hot columns in packed
+    bitsets (one bit per row) and text columns as uint8 codes, described by
+    columns.json. The files are opened with mmap, so only the pages that are
+    touched are read and the OS page cache is shared between processes.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, 'columns.json'), 'r') as f:
+            self.dictionary = json.load(f)
+
+        self.path = path
+        self.n_rows = self.dictionary['n_rows']
+        self.columns = self.dictionary['columns']
+        self.floats = np.load(os.path.join(path, 'floats.npy'), mmap_mode='r')
+        self.bits = np.load(os.path.join(path, 'bits.npy'), mmap_mode='r')
+        self.codes = np.load(os.path.join(path, 'codes.npy'), mmap_mode='r')
+
+        self._float_index = {name: i for i, name in enumerate(self.dictionary['float_columns'])}
+        self._bool_index = {name: i for i, name in enumerate(self.dictionary['bool_columns'])}
+        self._text_index = {name: i for i, name in enumerate(self.dictionary['text_columns'])}
+
+    def column(self, name, start=0, stop=None):
+        """
+        One column (or a row range of it) as float32, bool or object values
+        """
+        stop = self.n_rows if stop is None else min(stop, self.n_rows)
+
+        if name in self._float_index:
+            return self.floats[start:stop, self._float_index[name]]
+
+        if name in self._bool_index:
+            # Unpack only the bytes covering the requested rows
+            packed = self.bits[self._bool_index[name], start // 8:(stop + 7) // 8]
+            offset = start % 8
+            return np.unpackbits(packed, count=offset + stop - start)[offset:].astype(bool)
+
+        if name in self._text_index:
+            labels = np.array(self.dictionary['labels'][name], dtype=object)
+            return labels[self.codes[start:stop, self._text_index[name]]]
+
+        raise KeyError(name)
+
+    def matrix(self, columns, start=0, stop=None):
+        """
+        A float32 matrix of numeric and one-hot columns for a row range
+        """
+        stop = self.n_rows if stop is None else min(stop, self.n_rows)
+
+        # Contiguous numeric columns come out of the memmap in one slice
+        if all(name in self._float_index for name in columns):
+            return np.asarray(self.floats[start:stop, [self._float_index[name] for name in columns]])
+
+        X = np.empty((stop - start, len(columns)), dtype=np.float32)
+        for i, name in enumerate(columns):
+            X[:, i] = self.column(name, start, stop)
+        return X
+
+    def iter_batches(self, columns, batch_size=100000):
+        """
+        Yield (start, matrix) row batches, for work over stores larger than RAM
+        """
+        for start in range(0, self.n_rows, batch_size):
+            yield start, self.matrix(columns, start, start + batch_size)
+
+    def to_frame(self, columns=None, start=0, stop=None):
+        """
+        Materialize a row range as a DataFrame with the CSV's column order
+        """
+        columns = self.columns if columns is None else columns
+        return pd.DataFrame({name: self.column(name, start, stop) for name in columns})
+
+def _count_rows(csv_path):
+    # Newlines after the header, plus a last line without a trailing newline
+    lines = 0
+    last = b'\n'
+    with open(csv_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            lines += block.count(b'\n')
+            last = block[-1:]
+    if last != b'\n':
+        lines += 1
+    return lines - 1
+
+def write_feature_store(chunks, n_rows, path, metadata=None):
+    """
+    Write a feature store from an iterable of DataFrame chunks.
+
+    Every chunk but the last must hold a multiple of 8 rows, so the packed
+    bitsets of consecutive chunks line up on byte boundaries. `metadata` is
+    merged into columns.json. The finished store replaces any existing one
+    at `path` in a single rename.
+    """
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    floats = bits = codes = None
+    labels = {}
+    rows_written = 0
+
+    for chunk in chunks:
+        if floats is None:
+            # Column kinds come from the first chunk
+            columns = list(chunk.columns)
+            bool_columns = [col for col in columns if col.startswith(ONE_HOT_PREFIXES)]
+            text_columns = [col for col in columns if col not in bool_columns and chunk[col].dtype == object]
+            float_columns = [col for col in columns if col not in bool_columns and col not in text_columns]
+            labels = {col: [] for col in text_columns}
+
+            floats = np.lib.format.open_memmap(
+                os.path.join(tmp_path, 'floats.npy'), mode='w+', dtype=np.float32,
+                shape=(n_rows, len(float_columns))
+            )
+            bits = np.lib.format.open_memmap(
+                os.path.join(tmp_path, 'bits.npy'), mode='w+', dtype=np.uint8,
+                shape=(len(bool_columns), (n_rows + 7) // 8)
+            )
+            codes = np.lib.format.open_memmap(
+                os.path.join(tmp_path, 'codes.npy'), mode='w+', dtype=np.uint8,
+                shape=(n_rows, len(text_columns))
+            )
+
+        start, stop = rows_written, rows_written + len(chunk)
+        if stop > n_rows:
+            raise ValueError(f"More rows than the {n_rows} expected, quoted newlines aren't supported")
+        if start % 8:
+            raise ValueError("Only the last chunk may hold a row count that isn't a multiple of 8")
+
+        floats[start:stop] = chunk[float_columns].to_numpy(dtype=np.float32)
+
+        if bool_columns:
+            # Whole chunks start on a byte boundary, so they pack independently
+            flags = chunk[bool_columns].astype(str).isin(['True', 'true', '1', '1.0']).to_numpy()
+            bits[:, start // 8:(stop + 7) // 8] = np.packbits(flags.T, axis=1)
+
+        for i, col in enumerate(text_columns):
+            values = chunk[col].astype(str).to_numpy()
+            for label in pd.unique(values):
+                if label not in labels[col]:
+                    labels[col].append(label)
+            if len(labels[col]) > 255:
+                raise ValueError(f"Too many distinct values in {col} for a uint8 code")
+            codes[start:stop, i] = pd.Categorical(values, categories=labels[col]).codes
+
+        rows_written = stop
+
+    if floats is None or rows_written != n_rows:
+        raise ValueError(f"Wrote {rows_written} rows, expected {n_rows}")
+
+    for array in (floats, bits, codes):
+        array.flush()
+    del floats, bits, codes
+
+    dictionary = dict(metadata or {})
+    dictionary.update({
+        'n_rows': n_rows,
+        'columns': columns,
+        'float_columns': float_columns,
+        'bool_columns': bool_columns,
+        'text_columns': text_columns,
+        'labels': labels
+    })
+    with open(os.path.join(tmp_path, 'columns.json'), 'w') as f:
+        json.dump(dictionary, f, indent=2)
+
+    # Swap the finished store in; open memmaps of the old one stay valid
+    old_path = f"{path}.old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+    return path
+
+def _file_fingerprint(csv_path):
+    stat = os.stat(csv_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': content_hash(csv_path)}
+
+def build_feature_store(csv_path, path=None, chunksize=BUILD_CHUNK_ROWS):
+    """
+    Stream a CSV into a feature store without loading it whole
+    """
+    path = path or store_path(csv_path)
+    chunksize -= chunksize % 8
+    fingerprint = _file_fingerprint(csv_path)
+
+    chunks = pd.read_csv(csv_path, chunksize=chunksize)
+    return write_feature_store(chunks, _count_rows(csv_path), path, {'source': csv_path, 'fingerprint': fingerprint})
+
+def build_labelled_store(path=LABELLED_STORE, chunksize=BUILD_CHUNK_ROWS):
+    """
+    Stream the labelled table into a feature store, straight from its sources.
+
+    data.csv and the label sidecar are read chunk by chunk in step and
+    turned into labelled rows with the persisted feature scaling, so the
+    table is never materialized in pandas or written out as a CSV.
+    """
+    chunksize -= chunksize % 8
+    scaling = load_feature_scaling()
+    if scaling is None:
+        raise LookupError("The feature scaling is missing")
+
+    metadata = {
+        'sources': {RAW_DATA: _file_fingerprint(RAW_DATA), LABELS_DATA: _file_fingerprint(LABELS_DATA)},
+        'scaling_digest': get_model_registry().digest('feature_scaling')
+    }
+
+    def chunks():
+        raw_chunks = pd.read_csv(RAW_DATA, sep=';', encoding='utf-8-sig', chunksize=chunksize)
+        label_chunks = pd.read_csv(LABELS_DATA, chunksize=chunksize)
+        for raw, labels in zip(raw_chunks, label_chunks):
+            yield labelled_frame(raw, labels, scaling)
+
+    n_rows = min(_count_rows(RAW_DATA), _count_rows(LABELS_DATA))
+    return write_feature_store(chunks(), n_rows, path, metadata)
+
+def _labelled_store_current(store):
+    sources = store.dictionary['sources']
+    return (
+        store.dictionary['scaling_digest'] == get_model_registry().digest('feature_scaling')
+        and all(source_unchanged(csv_path, sources[csv_path]) for csv_path in (RAW_DATA, LABELS_DATA))
+    )
+
+def load_feature_store(csv_path=None, path=None):
+    """
+    Open the store for a CSV, building or rebuilding it if the CSV changed.
+
+    Without a CSV, opens the store of the labelled table (see
+    build_labelled_store), rebuilt when data.csv, the label sidecar or the
+    feature scaling change. Training reads its input through it; the pages,
+    clustering and batch scoring read pandas frames.
+    """
+    if csv_path is None:
+        path = path or LABELLED_STORE
+        try:
+            store = FeatureStore(path)
+            if _labelled_store_current(store):
+                return store
+        except (OSError, ValueError, KeyError):
+            # Missing or incomplete store, build it below
+            pass
+        return FeatureStore(build_labelled_store(path))
+
+    path = path or store_path(csv_path)
+
+    try:
+        store = FeatureStore(path)
+        # A store of preprocessed values (utils/ingest.py) isn't the CSV's raw layout
+        if 'preprocessing' in store.dictionary:
+            raise ValueError(f"{path} holds preprocessed values")
+        fingerprint = store.dictionary['fingerprint']
+        mtime_ns = fingerprint['mtime_ns']
+
+        if source_unchanged(csv_path, fingerprint):
+            # Touched but unchanged, remember the new mtime to skip hashing next time
+            if fingerprint['mtime_ns'] != mtime_ns:
+                try:
+                    with open(os.path.join(path, 'columns.json'), 'w') as f:
+                        json.dump(store.dictionary, f, indent=2)
+                except OSError:
+                    pass
+            return store
+    except (OSError, ValueError, KeyError):
+        # Missing or incomplete store, build it below
+        pass
+
+    return FeatureStore(build_feature_store(csv_path, path))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the memory-mapped feature store for a feature CSV")
+    parser.add_argument('csv', nargs='?', default=None, help="the labelled table, built from data.csv and its labels, by default")
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    if args.csv is None:
+        store = FeatureStore(build_labelled_store(args.output or LABELLED_STORE))
+    else:
+        store = FeatureStore(build_feature_store(args.csv, args.output))
+    print(f"Wrote {store.path}: {store.n_rows:,} rows, "
+          f"{len(store.dictionary['float_columns'])} float32, "
+          f"{len(store.dictionary['bool_columns'])} bitset and "
+          f"{len(store.dictionary['text_columns'])} coded columns")
@@ -0,0 +1,264 @@
+import argparse
+import copy
+import numpy as np
+import pandas as pd
+from utils.feature_pipeline import FeaturePipeline, PREDICTION_INPUT_FIELDS
+from utils.model_registry import get_model_registry
+from utils.preprocessing import roster_to_prediction_input
+from utils.scaling import LABELS_DATA, RAW_DATA, labelled_frame, load_feature_scaling
+
+INCREMENTAL_PATH = 'models/sgd_risk_category_model.pkl'
+
+# Risk levels the dashboard shows
+RISK_LEVELS = ['Low', 'Medium', 'High']
+
+# Label spellings found in the labelled data, mapped to the dashboard's
+RISK_LABELS = {
+    'Low': 'Low', 'Medium': 'Medium', 'High': 'High',
+    'Rendah': 'Low', 'Tinggi': 'High',
+    '0': 'Low', '1': 'Medium', '2': 'High'
+}
+
+# Share of the historical rows held out of seeding to validate every version
+HOLDOUT_SHARE = 0.2
+
+# Passes over the historical rows when seeding the first version
+SEED_EPOCHS = 20
+
+# A version is only served while its holdout accuracy is at most this far
+# below the SVM's on the same rows
+MAX_ACCURACY_DROP = 0.01
+
+class IncrementalRiskModel:
+    """
+    Linear risk classifier that learns from new labelled rows with partial_fit.
+
+    Uses the same inputs as predict_risk_level, so the compiled feature
+    pipeline feeds it directly. The bundled scaler is fitted once, when the
+    model is seeded from the historical labelled table, and frozen after:
+    later batches only update the classifier, so earlier updates keep the
+    standardized space they were learned in.
+    """
+
+    def __init__(self, random_state=42):
+        from sklearn.linear_model import SGDClassifier
+        from sklearn.preprocessing import StandardScaler
+
+        self.feature_names_in_ = np.array(PREDICTION_INPUT_FIELDS, dtype=object)
+        self.classes_ = np.array(RISK_LEVELS, dtype=object)
+        self.scaler = StandardScaler()
+        self.classifier = SGDClassifier(loss='log_loss', alpha=1e-4, random_state=random_state)
+        self.random_state = random_state
+        self.n_rows_seen = 0
+        self.n_updates = 0
+        # Set by validate_incremental_model; the model is only served once it passed
+        self.validation = None
+
+    def _learnable(self, columns, n_rows, labels):
+        # Unscaled features in the pipeline's layout
+        X = FeaturePipeline(self.feature_names_in_).transform_batch(columns, n_rows)
+
+        # Rows with unknown categories or labels can't be learned from
+        labels = np.asarray(labels, dtype=object)
+        keep = ~np.isnan(X).any(axis=1) & np.isin(labels, self.classes_)
+        return X[keep], labels[keep]
+
+    def seed(self, columns, n_rows, labels, epochs=SEED_EPOCHS):
+        """
+        Fit the scaler and train the classifier from scratch on historical rows
+        """
+        X, labels = self._learnable(columns, n_rows, labels)
+        if len(X) == 0:
+            raise ValueError("No historical rows could be learned from")
+
+        self.scaler.fit(X)
+        X_scaled = self.scaler.transform(X)
+        rng = np.random.default_rng(self.random_state)
+        for _ in range(epochs):
+            order = rng.permutation(len(X))
+            self.classifier.partial_fit(X_scaled[order], labels[order], classes=self.classes_)
+
+        self.n_rows_seen += len(X)
+        self.n_updates += 1
+        return len(X)
+
+    def partial_fit(self, columns, n_rows, labels):
+        """
+        Fold one batch of prediction inputs and risk levels into the classifier
+        """
+        if not hasattr(self.scaler, 'mean_'):
+            raise ValueError("The incremental model has to be seeded before it can be updated")
+
+        X, labels = self._learnable(columns, n_rows, labels)
+        if len(X) == 0:
+            return 0
+
+        self.classifier.partial_fit(self.scaler.transform(X), labels, classes=self.classes_)
+        self.n_rows_seen += len(X)
+        self.n_updates += 1
+
+        return len(X)
+
+    def predict(self, X):
+        return self.classifier.predict(X)
+
+    def predict_proba(self, X):
+        return self.classifier.predict_proba(X)
+
+def normalize_risk_labels(labels):
+    """
+    Map Risk_Category / Risk_Level values to Low, Medium and High
+    """
+    # A dict lookup per label; fast enough for single predictions too
+    return np.array([RISK_LABELS.get(str(label)) for label in labels], dtype=object)
+
+def load_incremental_model():
+    """
+    Return the incrementally trained model, or None if it hasn't been created
+    """
+    try:
+        return get_model_registry().get('risk_incremental')
+    except Exception:
+        # An unreadable model just means the SVM keeps serving
+        return None
+
+def load_served_incremental_model():
+    """
+    Return the incremental model if it passed validation, None while the SVM serves
+    """
+    model = load_incremental_model()
+    validation = getattr(model, 'validation', None)
+    if validation is None or not validation['passed']:
+        return None
+    return model
+
+def _historical_split():
+    """
+    data.csv with its risk labels, and a fixed mask of the holdout rows
+    """
+    raw = pd.read_csv(RAW_DATA, sep=';', encoding='utf-8-sig')
+    labels = pd.read_csv(LABELS_DATA)
+    n_rows = min(len(raw), len(labels))
+    raw, labels = raw.iloc[:n_rows], labels.iloc[:n_rows]
+
+    holdout = np.zeros(n_rows, dtype=bool)
+    holdout[np.random.default_rng(42).permutation(n_rows)[:int(n_rows * HOLDOUT_SHARE)]] = True
+    return raw, labels, holdout
+
+def _columns(roster):
+    inputs = roster_to_prediction_input(roster)
+    return {col: inputs[col].to_numpy() for col in inputs.columns}, len(inputs)
+
+def seed_incremental_model():
+    """
+    A first version trained on the historical rows outside the holdout
+    """
+    raw, labels, holdout = _historical_split()
+    columns, n_rows = _columns(raw[~holdout])
+    model = IncrementalRiskModel()
+    model.seed(columns, n_rows, normalize_risk_labels(labels['Risk_Category'][~holdout]))
+    return model
+
+def validate_incremental_model(model):
+    """
+    Compare the model with the SVM on the historical holdout rows.
+
+    Stores and returns both accuracies; the model passes while its accuracy
+    is at most MAX_ACCURACY_DROP below the SVM's. The SVM saw these rows in
+    training, so the comparison favours it.
+    """
+    raw, labels, holdout = _historical_split()
+    raw, labels = raw[holdout], labels[holdout]
+    expected = normalize_risk_labels(labels['Risk_Category'])
+
+    columns, n_rows = _columns(raw)
+    X = FeaturePipeline.from_artifacts(model, model.scaler).transform_batch(columns, n_rows)
+    accuracy = float((model.predict(X) == expected).mean())
+
+    # The SVM on the same students' rows of the labelled table
+    registry = get_model_registry()
+    svm = registry.get('risk_classifier')
+    features = registry.get('risk_features')
+    svm_accuracy = None
+    if svm is not None:
+        table = labelled_frame(raw, labels, load_feature_scaling(), features)
+        predicted = normalize_risk_labels(svm.predict(registry.get('risk_scaler').transform(table[features])))
+        svm_accuracy = float((predicted == expected).mean())
+
+    model.validation = {
+        'n_rows': int(len(expected)),
+        'accuracy': accuracy,
+        'svm_accuracy': svm_accuracy,
+        'passed': svm_accuracy is None or accuracy >= svm_accuracy - MAX_ACCURACY_DROP
+    }
+    return model.validation
+
+def update_incremental_model(source, label_column='Risk_Level', chunksize=10000, sep=';', progress=None):
+    """
+    Fold a labelled roster into the incremental model and publish the result.
+
+    The first version is seeded from the historical labelled table (see
+    seed_incremental_model) before the roster is folded in. The roster is
+    read `chunksize` rows at a time, so time and memory per step stay
+    bounded whatever its size. Updates are applied to a copy, which is
+    validated against the SVM before it is published; a version that fails
+    is kept for later updates, but the SVM keeps serving.
+    """
+    current = load_incremental_model()
+    model = copy.deepcopy(current) if current is not None else seed_incremental_model()
+
+    rows_read = 0
+    rows_learned = 0
+
+    reader = pd.read_csv(source, sep=sep, encoding='utf-8-sig', chunksize=chunksize)
+    for chunk in reader:
+        if label_column not in chunk.columns:
+            raise ValueError(f"Roster has no {label_column} column")
+
+        inputs = roster_to_prediction_input(chunk)
+        columns = {col: inputs[col].to_numpy() for col in inputs.columns}
+        rows_learned += model.partial_fit(columns, len(chunk), normalize_risk_labels(chunk[label_column]))
+        rows_read += len(chunk)
+
+        if progress is not None:
+            progress(rows_read, rows_learned)
+
+    if rows_learned == 0:
+        raise ValueError("No labelled rows could be learned from")
+
+    validation = validate_incremental_model(model)
+    version = get_model_registry().publish('risk_incremental', model)
+
+    return {
+        'rows_read': rows_read,
+        'rows_learned': rows_learned,
+        'rows_seen_total': model.n_rows_seen,
+        'validation': validation,
+        'version': version
+    }
+
+# Resolved and shared through the model registry like the pickled models
+get_model_registry().register('risk_incremental', [INCREMENTAL_PATH])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fold labelled student records into the incremental risk model")
+    parser.add_argument('roster', help="CSV in the data.csv layout with a risk label column")
+    parser.add_argument('--label', default='Risk_Level', help="column holding Low/Medium/High (or Rendah/Medium/Tinggi)")
+    parser.add_argument('--chunksize', type=int, default=10000)
+    parser.add_argument('--sep', default=';')
+    args = parser.parse_args()
+
+    def report(rows_read, rows_learned):
+        print(f"\r{rows_read:,} rows read, {rows_learned:,} learned", end='', flush=True)
+
+    # Run through the importable module so the pickle references
+    # utils.incremental.IncrementalRiskModel rather than __main__
+    from utils.incremental import update_incremental_model as update
+
+    summary = update(args.roster, args.label, args.chunksize, args.sep, progress=report)
+    print(f"\nPublished {INCREMENTAL_PATH} ({summary['rows_seen_total']:,} rows seen in total)")
+
+    validation = summary['validation']
+    svm_accuracy = 'n/a' if validation['svm_accuracy'] is None else f"{validation['svm_accuracy']:.2%}"
+    print(f"Holdout accuracy {validation['accuracy']:.2%} on {validation['n_rows']:,} rows, SVM {svm_accuracy}: "
+          f"{'served' if validation['passed'] else 'not served, the SVM keeps serving'}")
@@ -0,0 +1,195 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from utils.data_cache import content_hash
+from utils.feature_store import BUILD_CHUNK_ROWS, FeatureStore, write_feature_store
+
+# Values preprocess_data treats as booleans
+BOOL_VALUES = {'True': True, 'False': False, True: True, False: False}
+
+def ingest_store_path(csv_path):
+    """
+    Store directory for a preprocessed export, apart from the raw CSV's store
+    """
+    return os.path.splitext(csv_path)[0] + '.ingest.store'
+
+def _read_chunks(csv_path, chunksize, sep, dtype=None):
+    return pd.read_csv(csv_path, sep=sep, encoding='utf-8-sig', chunksize=chunksize, dtype=dtype)
+
+def _chunk_kind(series):
+    """
+    'bool', 'number' or 'text' for one chunk of a column, None if it's all missing
+    """
+    values = series.dropna()
+    if len(values) == 0:
+        return None
+    if series.dtype == bool:
+        return 'bool'
+    if pd.api.types.is_numeric_dtype(series):
+        return 'number'
+    if set(values.unique()).issubset(BOOL_VALUES):
+        return 'bool'
+    return 'text'
+
+def _resolve_kind(kinds):
+    # A column only counts as numeric or boolean if every chunk agrees,
+    # like a column that pd.read_csv would parse as one dtype
+    if kinds in ({'bool'}, {'number'}):
+        return kinds.pop()
+    if not kinds:
+        return 'number'
+    return 'text'
+
+def _median_from_counts(counts):
+    """
+    Exact median of the values described by a value -> count Series
+    """
+    counts = counts.sort_index()
+    n = int(counts.sum())
+    if n == 0:
+        return np.nan
+
+    # Values at ranks (n - 1) // 2 and n // 2, averaged like Series.median
+    cumulative = counts.cumsum().to_numpy()
+    values = counts.index.to_numpy(dtype=np.float64)
+    low = values[np.searchsorted(cumulative, (n - 1) // 2, side='right')]
+    high = values[np.searchsorted(cumulative, n // 2, side='right')]
+    return float((low + high) / 2)
+
+def _mode_from_counts(counts):
+    """
+    Most frequent value, the smallest one on ties like Series.mode()[0]
+    """
+    if len(counts) == 0:
+        return np.nan
+    top = sorted(counts[counts == counts.max()].index)[0]
+    return top.item() if isinstance(top, np.generic) else top
+
+def scan_export(csv_path, chunksize=BUILD_CHUNK_ROWS, sep=';'):
+    """
+    First pass over an export: column kinds, row count and fill values.
+
+    Keeps one value -> count table per column, merged chunk by chunk, so the
+    medians and modes are exact while memory grows with the number of
+    distinct values rather than rows.
+    """
+    kinds = {}
+    counts = {}
+    missing = {}
+    n_rows = 0
+
+    for chunk in _read_chunks(csv_path, chunksize, sep):
+        for col in chunk.columns:
+            kind = _chunk_kind(chunk[col])
+            kinds.setdefault(col, set())
+            if kind is not None:
+                kinds[col].add(kind)
+
+            values = chunk[col]
+            if kind == 'bool':
+                values = values.map(BOOL_VALUES)
+            elif kind == 'text':
+                values = values.dropna().astype(str)
+
+            chunk_counts = values.value_counts()
+            counts[col] = chunk_counts if col not in counts else counts[col].add(chunk_counts, fill_value=0)
+            missing[col] = missing.get(col, 0) + int(chunk[col].isna().sum())
+
+        n_rows += len(chunk)
+
+    columns = {}
+    for col, col_kinds in kinds.items():
+        kind = _resolve_kind(set(col_kinds))
+        column = {'kind': kind, 'missing': missing[col]}
+
+        # Booleans and text are filled with the mode, numbers with the median
+        if missing[col]:
+            col_counts = counts[col]
+            if kind == 'number':
+                column['fill'] = _median_from_counts(col_counts)
+            else:
+                column['fill'] = _mode_from_counts(col_counts)
+
+        columns[col] = column
+
+    return {'n_rows': n_rows, 'columns': columns}
+
+def preprocess_chunk(chunk, scan):
+    """
+    preprocess_data for one chunk, with fill values from the whole export
+    """
+    data = {}
+    for col in chunk.columns:
+        column = scan['columns'][col]
+        values = chunk[col]
+
+        if column['kind'] == 'bool':
+            values = values.map(BOOL_VALUES).astype('boolean')
+        if 'fill' in column and values.isna().any():
+            values = values.fillna(column['fill'])
+        if column['kind'] == 'bool':
+            # Booleans become integers for numerical analysis
+            values = values.astype(int)
+
+        data[col] = values
+
+    return pd.DataFrame(data, index=chunk.index)
+
+def ingest_export(csv_path, path=None, chunksize=BUILD_CHUNK_ROWS, sep=';', progress=None):
+    """
+    Preprocess an export in the data.csv layout straight into a feature store.
+
+    Two passes over the file, `chunksize` rows at a time: the first finds the
+    column kinds and the medians and modes used for imputation, the second
+    applies preprocess_data's conversions chunk by chunk and writes each
+    chunk to the memory-mapped store. The raw frame is never held whole.
+
+    The store holds preprocessed values, so it is written next to the CSV
+    as <name>.ingest.store rather than where load_feature_store keeps the
+    raw copy of the same file.
+    """
+    path = path or ingest_store_path(csv_path)
+    chunksize -= chunksize % 8
+    stat = os.stat(csv_path)
+
+    scan = scan_export(csv_path, chunksize, sep)
+
+    # Text columns are read as strings, so a chunk of digits stays text
+    text_columns = {col: str for col, column in scan['columns'].items() if column['kind'] == 'text'}
+
+    def chunks():
+        rows_done = 0
+        for chunk in _read_chunks(csv_path, chunksize, sep, dtype=text_columns or None):
+            yield preprocess_chunk(chunk, scan)
+            rows_done += len(chunk)
+            if progress is not None:
+                progress(rows_done, scan['n_rows'])
+
+    metadata = {
+        'source': csv_path,
+        # The source file; 'preprocessing' marks the values as converted
+        'fingerprint': {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': content_hash(csv_path)},
+        'preprocessing': {
+            col: {key: column[key] for key in ('kind', 'missing', 'fill') if key in column}
+            for col, column in scan['columns'].items()
+        }
+    }
+    return FeatureStore(write_feature_store(chunks(), scan['n_rows'], path, metadata))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preprocess a large export in the data.csv layout into a feature store")
+    parser.add_argument('csv')
+    parser.add_argument('--output', default=None, help="store directory, <csv>.ingest.store by default")
+    parser.add_argument('--chunksize', type=int, default=BUILD_CHUNK_ROWS)
+    parser.add_argument('--sep', default=';')
+    args = parser.parse_args()
+
+    def report(rows_done, n_rows):
+        print(f"\r{rows_done:,} / {n_rows:,} rows", end='', flush=True)
+
+    store = ingest_export(args.csv, args.output, args.chunksize, args.sep, progress=report)
+    filled = {col: column['missing'] for col, column in store.dictionary['preprocessing'].items() if column['missing']}
+    print(f"\nWrote {store.path}: {store.n_rows:,} rows, {len(store.columns)} columns")
+    if filled:
+        print("Imputed: " + ", ".join(f"{col} ({count:,})" for col, count in filled.items()))
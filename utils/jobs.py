@@ -0,0 +1,165 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Jobs run at once; the rest wait in the queue
+MAX_RUNNING_JOBS = 1
+
+# Finished jobs kept in the job table for the pages to show
+MAX_FINISHED_JOBS = 20
+
+class JobCancelled(Exception):
+    """
+    Raised inside a job when it has been asked to stop
+    """
+
+class Job:
+    """
+    One background task and its progress.
+
+    The task is called with `progress=job.report` and reports (done, total,
+    message) as it goes; a cancelled job raises JobCancelled from its next
+    report, so tasks stop at their next checkpoint.
+    """
+
+    def __init__(self, job_id, key, name):
+        self.id = job_id
+        self.key = key
+        self.name = name
+        self.status = 'queued'
+        self.done = 0
+        self.total = 1
+        self.message = 'Waiting for a free worker'
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.future = None
+        self._cancel = threading.Event()
+
+    @property
+    def active(self):
+        return self.status in ('queued', 'running')
+
+    @property
+    def fraction(self):
+        return min(max(self.done / self.total, 0.0), 1.0) if self.total else 0.0
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def eta(self):
+        """
+        Seconds left at the rate so far, None until there is a rate
+        """
+        if self.status != 'running' or self.fraction <= 0:
+            return None
+        return self.elapsed * (1 - self.fraction) / self.fraction
+
+    def report(self, done, total, message=None):
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.done, self.total = done, total
+        if message is not None:
+            self.message = message
+
+    def cancel(self):
+        """
+        Ask the job to stop; a queued job never starts
+        """
+        self._cancel.set()
+        if self.future is not None and self.future.cancel():
+            self.status = 'cancelled'
+            self.finished = time.time()
+
+class JobRunner:
+    """
+    Process-wide thread pool with a job table.
+
+    At most `max_workers` jobs run at once. Jobs are keyed: submitting a
+    key that already has a queued or running job returns that job, so
+    sessions asking for the same work share one run. Threads rather than
+    processes, so jobs report progress and publish their results to the
+    model registry of the process that serves the pages.
+    """
+
+    def __init__(self, max_workers=MAX_RUNNING_JOBS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _run(self, job, fn, args, kwargs):
+        if job._cancel.is_set():
+            job.status = 'cancelled'
+            return
+        job.status = 'running'
+        job.started = time.time()
+        job.message = 'Starting'
+        try:
+            job.result = fn(*args, progress=job.report, **kwargs)
+            job.status = 'done'
+        except JobCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished = time.time()
+
+    def submit(self, key, fn, *args, name=None, **kwargs):
+        """
+        Run fn(*args, progress=..., **kwargs) in the background, see Job
+        """
+        with self._lock:
+            job = self.active(key)
+            if job is not None:
+                return job
+
+            job = Job(next(self._ids), key, name or key)
+            self._jobs[job.id] = job
+            job.future = self._executor.submit(self._run, job, fn, args, kwargs)
+            self._prune()
+            return job
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if not job.active]
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def active(self, key):
+        """
+        The queued or running job for a key, None if there isn't one
+        """
+        for job in list(self._jobs.values()):
+            if job.key == key and job.active:
+                return job
+        return None
+
+    def latest(self, key):
+        """
+        The most recently submitted job for a key
+        """
+        jobs = [job for job in list(self._jobs.values()) if job.key == key]
+        return jobs[-1] if jobs else None
+
+    def jobs(self):
+        return list(self._jobs.values())
+
+# Shared by every session in this process
+_job_runner = JobRunner()
+
+def get_job_runner():
+    """
+    Return the process-wide job runner
+    """
+    return _job_runner
@@ -1,41 +1,267 @@
+import copy
+import threading
 import pandas as pd
 import os
 import numpy as np
 import streamlit as st
+from utils.aggregates import RunningAggregates
+from utils.data_cache import dataset_version, read_cached_rows, read_csv_versioned, read_fingerprint, source_unchanged
+from utils.scaling import RAW_COLUMNS, SCALING_PATH, labelled_frame, load_feature_scaling
+from utils.schema import DATASETS, DATASET_VIEWS, DERIVED_DATASETS, LABELLED_SCHEMA, compact_frame, display_frame
 
-@st.cache_data
-def load_all_data():
+def freeze_frame(df, columns=None):
+    """
+    The frame (or its `columns`) over read-only NumPy column buffers.
+
+    Writes to the shared frame then fail loudly instead of leaking into
+    other sessions. The frame is rebuilt from each column's array without
+    copying, so a projection to fewer columns shares the original buffers.
+    Categorical and Arrow-backed columns are passed through as they are.
+    """
+    arrays = {}
+    for col in (df.columns if columns is None else columns):
+        values = df[col].array
+        if isinstance(values, pd.arrays.NumpyExtensionArray):
+            values = df[col].to_numpy()
+            values.flags.writeable = False
+        arrays[col] = values
+    return pd.DataFrame(arrays, index=df.index, copy=False)
+
+def _append_rows(frame, rows):
+    """
+    New rows added to a loaded frame, keeping categorical columns categorical
+    """
+    for col in frame.columns:
+        if isinstance(frame[col].dtype, pd.CategoricalDtype) and col in rows.columns:
+            categories = frame[col].cat.categories.union(pd.Index(rows[col].dropna().unique()), sort=False)
+            dtype = pd.CategoricalDtype(categories)
+            frame = frame.assign(**{col: frame[col].astype(dtype)})
+            rows = rows.assign(**{col: rows[col].astype(dtype)})
+    return pd.concat([frame, rows], ignore_index=True)
+
+def fingerprint_extends(old, new):
+    """
+    Whether `new` is `old` plus at least one appended segment
+    """
+    held = old['segments']
+    return (
+        new is not None
+        and new.get('sha256') == old.get('sha256')
+        and new.get('base_size') == old.get('base_size')
+        and len(new.get('segments', [])) > len(held)
+        and new['segments'][:len(held)] == held
+    )
+
+class DatasetHandle:
+    """
+    One dataset projection, loaded on first use and kept current.
+
+    Every load() checks the cache fingerprint, a stat and a small JSON read.
+    Rows added with append_csv_rows are read from their cache segments and
+    folded into the frame and the aggregates; any other change to the CSV
+    reloads it. Views in DATASET_VIEWS are projections of their base
+    dataset's frame rather than a second copy, and DERIVED_DATASETS are
+    computed from their sources, only for new rows when rows are appended.
+    """
+
+    def __init__(self, name, columns=None):
+        self.name = name
+        self.columns = columns
+        self.frame = None
+        self.aggregates = None
+        self.fingerprint = None
+        self.sources = None
+        self.lock = threading.Lock()
+        self._display = None
+        # Rows of the raw source a derived dataset leaves out for lack of labels
+        self.unlabelled_rows = 0
+
+    @property
+    def version(self):
+        return dataset_version(self.fingerprint)
+
+    def display_frame(self):
+        """
+        The frame with float32 columns widened for charts, see schema.display_frame.
+
+        Computed once per loaded frame and shared read-only like the frame.
+        """
+        with self.lock:
+            if self._display is None or self._display[0] is not self.frame:
+                self._display = (self.frame, freeze_frame(display_frame(self.frame)))
+            return self._display[1]
+
+    def _load_view(self):
+        base_name, excluded = DATASET_VIEWS[self.name]
+        columns = None if self.columns is None else tuple(col for col in self.columns if col not in excluded)
+        base = dataset_handle(base_name, columns).load()
+
+        with self.lock:
+            # The projection shares the base frame's buffers, nothing is copied
+            if self.frame is None or self.fingerprint is not base.fingerprint:
+                self.frame = freeze_frame(base.frame, [col for col in base.frame.columns if col not in excluded])
+                self.aggregates = base.aggregates
+                self.fingerprint = base.fingerprint
+                self.unlabelled_rows = base.unlabelled_rows
+
+        return self
+
+    def _load_derived(self):
+        raw_name, labels_name = DERIVED_DATASETS[self.name]
+        raw = dataset_handle(raw_name, tuple(RAW_COLUMNS)).load()
+        labels = dataset_handle(labels_name, None).load()
+        scaling = load_feature_scaling()
+        if scaling is None:
+            raise LookupError(f"{SCALING_PATH} is missing")
+
+        with self.lock:
+            sources = (raw.fingerprint, labels.fingerprint, scaling)
+            if self.frame is not None and all(new is old for new, old in zip(sources, self.sources)):
+                return self
+
+            # Rows already derived stay valid while the sources only grew
+            grown = self.frame is not None and scaling is self.sources[2] and all(
+                new is old or fingerprint_extends(old, new) for new, old in zip(sources[:2], self.sources[:2])
+            )
+            start = len(self.frame) if grown else 0
+            stop = min(len(raw.frame), len(labels.frame))
+
+            rows = labelled_frame(raw.frame.iloc[start:stop], labels.frame.iloc[start:stop], scaling, self.columns)
+            rows = compact_frame(rows, LABELLED_SCHEMA)
+            if grown:
+                self.frame = freeze_frame(_append_rows(self.frame, rows))
+                self.aggregates = copy.deepcopy(self.aggregates).update(rows)
+            else:
+                self.frame = freeze_frame(rows.reset_index(drop=True))
+                self.aggregates = RunningAggregates(group_by='Cluster').update(self.frame)
+
+            self.sources = sources
+            self.fingerprint = {'version': raw.version + labels.version}
+            # Rows appended to the raw dataset only join once their labels are appended
+            self.unlabelled_rows = max(0, len(raw.frame) - len(labels.frame))
+
+        return self
+
+    def load(self):
+        if self.name in DATASET_VIEWS:
+            return self._load_view()
+        if self.name in DERIVED_DATASETS:
+            return self._load_derived()
+
+        path, options, schema = DATASETS[self.name]
+        columns = None if self.columns is None else list(self.columns)
+
+        with self.lock:
+            if self.frame is not None:
+                stored = read_fingerprint(path)
+                if fingerprint_extends(self.fingerprint, stored) and source_unchanged(path, stored):
+                    # Only the appended rows are read
+                    skip = len(self.fingerprint['segments'])
+                    rows = compact_frame(read_cached_rows(path, stored, columns, skip), schema)
+                    self.frame = freeze_frame(_append_rows(self.frame, rows))
+                    self.aggregates = copy.deepcopy(self.aggregates).update(rows)
+                    self.fingerprint = stored
+                    return self
+
+                if source_unchanged(path, self.fingerprint):
+                    return self
+
+            df, self.fingerprint = read_csv_versioned(path, columns, **options)
+            self.frame = freeze_frame(compact_frame(df, schema))
+            self.aggregates = RunningAggregates(group_by='Cluster').update(self.frame)
+
+        return self
+
+    @classmethod
+    def empty(cls, name, columns=None):
+        handle = cls(name, columns)
+        handle.frame = pd.DataFrame()
+        handle.aggregates = RunningAggregates()
+        return handle
+
+@st.cache_resource
+def dataset_handle(name, columns=None):
     """
-    Load all required datasets for the dashboard
+    The shared handle for a dataset projection, one per process
+    """
+    return DatasetHandle(name, columns)
+
+def load_handle(name, columns=None):
+    """
+    A dataset handle, loaded and brought up to date.
+
+    `columns` is a tuple of the columns to read, None for all of them; only
+    those are read from the Parquet cache. The frames are shared read-only
+    like load_all_data's.
     """
     try:
-        # Main dataset with risk labels
-        df_with_risk_labels = pd.read_csv('data/data_with_risk_labels.csv')
-        
-        # Convert boolean string values to actual booleans
-        for col in df_with_risk_labels.columns:
-            if df_with_risk_labels[col].dtype == 'object':
-                if set(df_with_risk_labels[col].dropna().unique()).issubset({'True', 'False'}):
-                    df_with_risk_labels[col] = df_with_risk_labels[col].map({'True': True, 'False': False})
-        
-        # Original dataset (before clustering)
-        try:
-            df = pd.read_csv('data/data.csv', sep=';')
-        except:
-            # If the original data.csv is not available, use the risk labels dataset
-            df = df_with_risk_labels
-        
-        # Clustering data
-        try:
-            clustering_data = pd.read_csv('data/clustering_data.csv')
-        except:
-            # If clustering data is not available, use a subset of the risk labels dataset
-            clustering_data = df_with_risk_labels.copy()
-        
-        return df, df_with_risk_labels, clustering_data
-        
+        return dataset_handle(name, columns).load()
     except Exception as e:
+        if name != 'labelled':
+            # If data.csv is not available, use the risk labels dataset
+            return load_handle('labelled', columns)
         st.error(f"Error loading data: {e}")
-        # Return empty DataFrames as fallback
-        empty_df = pd.DataFrame()
-        return empty_df, empty_df, empty_df
\ No newline at end of file
+        return DatasetHandle.empty(name, columns)
+
+def load_dataset(name, columns=None):
+    """
+    Load one dataset the first time it's asked for, see load_handle
+    """
+    return load_handle(name, columns).frame
+
+def _page_handle(page_columns, name):
+    if name not in page_columns:
+        return DatasetHandle.empty(name)
+    columns = page_columns[name]
+    return load_handle(name, None if columns is None else tuple(columns))
+
+def load_page_data(page_columns, name, display=False):
+    """
+    The dataset `name` projected to the columns a page declares.
+
+    `page_columns` maps dataset names to column lists (None for every
+    column). Datasets the page doesn't declare come back empty, unread.
+    With `display`, float32 columns come back as float64 at their stored
+    decimal values, for pages that chart them.
+    """
+    handle = _page_handle(page_columns, name)
+    return handle.display_frame() if display else handle.frame
+
+def load_page_unlabelled_rows(page_columns):
+    """
+    Rows the page's labelled datasets leave out because their labels haven't been appended yet
+    """
+    labelled = [
+        name for name in page_columns
+        if name in DERIVED_DATASETS or (name in DATASET_VIEWS and DATASET_VIEWS[name][0] in DERIVED_DATASETS)
+    ]
+    return max((_page_handle(page_columns, name).unlabelled_rows for name in labelled), default=0)
+
+def load_page_aggregates(page_columns, name):
+    """
+    Running aggregates over the columns a page declares, see load_page_data.
+
+    When the SQL backend has been built (python -m utils.sql_backend), the
+    aggregates are queried from the database instead and the page's columns
+    are never loaded into pandas.
+    """
+    from utils.sql_backend import get_sql_backend
+
+    backend = get_sql_backend()
+    if backend is not None and name in page_columns:
+        try:
+            return backend.aggregates(name, page_columns[name])
+        except Exception:
+            # Unreadable database, aggregate in pandas instead
+            pass
+    return _page_handle(page_columns, name).aggregates
+
+def load_all_data():
+    """
+    Load all required datasets for the dashboard.
+    
+    The frames are loaded once per process and shared by every session
+    without copying, so they are read-only. Take a derivative with
+    df.copy(deep=False) before adding or changing columns.
+    """
+    return load_dataset('data'), load_dataset('labelled'), load_dataset('clustering')
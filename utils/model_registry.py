@@ -0,0 +1,215 @@
+import hashlib
+import os
+import threading
+import joblib
+
+# Candidate paths for each named artifact, in order of preference
+MODEL_ARTIFACTS = {
+    'risk_classifier': [
+        'models/svm_risk_category_model.pkl',
+        'models/rf_risk_category_model.pkl'
+    ],
+    'risk_scaler': ['models/risk_category_scaler.pkl'],
+    'risk_features': ['models/risk_category_features.pkl'],
+    'meanshift': ['models/meanshift_model.pkl'],
+    'cluster_info': ['models/cluster_info.pkl']
+}
+
+# Artifacts that take part in scoring a risk prediction; anything derived
+# from predictions is keyed on all of them
+SCORING_ARTIFACTS = [
+    'risk_classifier', 'risk_scaler', 'risk_features', 'feature_scaling', 'risk_kernel', 'risk_incremental'
+]
+
+class ModelRegistry:
+    """
+    Process-wide store of deserialized model artifacts.
+
+    Every artifact is loaded from disk once and shared by all Streamlit
+    sessions in the process. Each entry carries a version number that is
+    bumped whenever the file on disk changes or a new object is published,
+    so callers can key caches on it.
+    """
+
+    def __init__(self, artifacts=None):
+        self._artifacts = dict(artifacts or MODEL_ARTIFACTS)
+        self._loaders = {}
+        self._entries = {}
+        self._versions = {}
+        self._observed = {}
+        self._digests = {}
+        self._published = 0
+        self._lock = threading.RLock()
+
+    def register(self, name, paths, loader=None):
+        """
+        Add an artifact, optionally with a loader other than joblib.load
+        """
+        with self._lock:
+            self._artifacts[name] = list(paths)
+            if loader is not None:
+                self._loaders[name] = loader
+            self._entries.pop(name, None)
+
+    def _resolve_path(self, name):
+        for path in self._artifacts.get(name, []):
+            if os.path.exists(path):
+                return path
+        return None
+
+    @staticmethod
+    def _fingerprint(path):
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _stat(self, name):
+        path = self._resolve_path(name)
+        if path is None:
+            return None, None
+        try:
+            return path, self._fingerprint(path)
+        except OSError:
+            return None, None
+
+    def _version_for(self, name, key):
+        # Versions only move when the underlying file (or published object) changes
+        with self._lock:
+            if self._observed.get(name) != key:
+                self._observed[name] = key
+                self._versions[name] = self._versions.get(name, 0) + 1
+            return self._versions[name]
+
+    def _is_current(self, entry):
+        try:
+            return entry['path'] is None or self._fingerprint(entry['path']) == entry['fingerprint']
+        except OSError:
+            return False
+
+    def _store(self, name, obj, path, fingerprint):
+        version = self._version_for(name, (path, fingerprint))
+        entry = {
+            'obj': obj,
+            'path': path,
+            'fingerprint': fingerprint,
+            'version': version
+        }
+        self._entries[name] = entry
+        return entry
+
+    def _entry(self, name):
+        # Fast path: dict reads are atomic, only the stat call is paid
+        entry = self._entries.get(name)
+        if entry is not None and self._is_current(entry):
+            return entry
+
+        with self._lock:
+            # Another session may have loaded it while we waited
+            entry = self._entries.get(name)
+            if entry is not None and self._is_current(entry):
+                return entry
+
+            path = self._resolve_path(name)
+            if path is None:
+                self._entries.pop(name, None)
+                return None
+
+            fingerprint = self._fingerprint(path)
+            loader = self._loaders.get(name, joblib.load)
+            return self._store(name, loader(path), path, fingerprint)
+
+    def get(self, name):
+        """
+        Return the shared object for an artifact, or None if it doesn't exist
+        """
+        entry = self._entry(name)
+        return entry['obj'] if entry is not None else None
+
+    def version(self, name):
+        """
+        Return the version number of an artifact, or None if missing.
+
+        Only stats the file, so asking for a version never deserializes it.
+        """
+        entry = self._entries.get(name)
+        if entry is not None and entry['path'] is None:
+            return entry['version']
+
+        path, fingerprint = self._stat(name)
+        if path is None:
+            return None
+        return self._version_for(name, (path, fingerprint))
+
+    def digest(self, name):
+        """
+        Return the SHA-256 of the artifact file, computed once per file change.
+
+        Unlike the version number this is stable across processes and
+        deploys, so it can be persisted alongside derived artifacts. The file
+        is hashed, never deserialized.
+        """
+        path, fingerprint = self._stat(name)
+        if path is None:
+            return None
+
+        cached = self._digests.get(name)
+        if cached is not None and cached[:2] == (path, fingerprint):
+            return cached[2]
+
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+
+        self._digests[name] = (path, fingerprint, sha.hexdigest())
+        return sha.hexdigest()
+
+    def digests(self, names):
+        """
+        Return {name: digest} for several artifacts
+        """
+        return {name: self.digest(name) for name in names}
+
+    def publish(self, name, obj, path=None):
+        """
+        Persist a new object for an artifact and swap it in atomically
+        """
+        if path is None:
+            candidates = self._artifacts.get(name)
+            path = candidates[0] if candidates else None
+
+        with self._lock:
+            if path is None:
+                # In-memory objects get a fresh token so their version still moves
+                self._published += 1
+                fingerprint = ('published', self._published)
+            else:
+                directory = os.path.dirname(path)
+                if directory and not os.path.exists(directory):
+                    os.makedirs(directory)
+
+                # Write next to the target, then rename so readers never see a partial file
+                tmp_path = f"{path}.tmp"
+                joblib.dump(obj, tmp_path)
+                os.replace(tmp_path, path)
+                fingerprint = self._fingerprint(path)
+
+            return self._store(name, obj, path, fingerprint)['version']
+
+    def invalidate(self, name=None):
+        """
+        Drop cached objects so they are reloaded on next access
+        """
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+# Shared by every session in this process
+_registry = ModelRegistry()
+
+def get_model_registry():
+    """
+    Return the process-wide model registry
+    """
+    return _registry
@@ -1,6 +1,5 @@
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import StandardScaler
 
 def preprocess_data(df):
     """
@@ -33,35 +32,34 @@ def preprocess_data(df):
     
     return data
 
-def prepare_features_for_prediction(user_input):
+def roster_to_prediction_input(roster):
     """
-    Prepares user input features for model prediction
+    Converts rows in the data.csv layout into the prediction input format
     """
-    # Convert input to DataFrame
-    input_df = pd.DataFrame([user_input])
-    
-    # Calculate additional features
-    if 'Curricular_units_1st_sem_enrolled' in input_df.columns and 'Curricular_units_1st_sem_approved' in input_df.columns:
-        input_df['Passing_ratio_1st_sem'] = input_df['Curricular_units_1st_sem_approved'] / input_df['Curricular_units_1st_sem_enrolled']
-    
-    if 'Previous_qualification_grade' in input_df.columns and 'Admission_grade' in input_df.columns:
-        input_df['Grade_difference'] = input_df['Admission_grade'] - input_df['Previous_qualification_grade']
-    
-    # Expected features that might be needed by the model
-    expected_features = [
+    # Fields used by the risk prediction form
+    prediction_fields = [
         'Age_at_enrollment', 'Gender', 'Marital_status',
         'Previous_qualification_grade', 'Admission_grade',
         'Curricular_units_1st_sem_enrolled', 'Curricular_units_1st_sem_approved',
-        'Passing_ratio_1st_sem', 'Scholarship_holder', 'Debtor',
-        'Tuition_fees_up_to_date', 'International',
-        'Educational_special_needs', 'Application_order', 'Application_mode',
-        'Curricular_units_1st_sem_grade', 'Mothers_qualification',
-        'Fathers_qualification', 'Grade_difference'
+        'Scholarship_holder', 'Debtor', 'Tuition_fees_up_to_date', 'International'
     ]
     
-    # Add missing features with default values
-    for feature in expected_features:
-        if feature not in input_df.columns:
-            input_df[feature] = 0
+    # Model inputs the form doesn't ask for, kept when the roster has them
+    model_fields = [
+        'Curricular_units_1st_sem_evaluations', 'Mothers_qualification', 'Fathers_qualification',
+        'Mothers_occupation', 'Application_order', 'Application_mode'
+    ]
+    
+    input_df = roster[[col for col in prediction_fields + model_fields if col in roster.columns]].copy()
+    
+    # The export encodes these as 1/0, the form uses text labels
+    if 'Gender' in input_df.columns and input_df['Gender'].dtype != 'object':
+        codes = input_df['Gender'].to_numpy()
+        input_df['Gender'] = np.where(codes == 1, 'Male', np.where(codes == 0, 'Female', None))
+    
+    for col in ['Scholarship_holder', 'Debtor', 'Tuition_fees_up_to_date', 'International']:
+        if col in input_df.columns and input_df[col].dtype != 'object':
+            codes = input_df[col].to_numpy()
+            input_df[col] = np.where(codes == 1, 'Yes', np.where(codes == 0, 'No', None))
     
-    return input_df
\ No newline at end of file
+    return input_df
@@ -0,0 +1,215 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+from utils.model_registry import get_model_registry
+from utils.scaling import labelled_csv
+
+REDUCED_PATH = 'models/svm_risk_category_reduced.npz'
+
+class ReducedSVMScorer:
+    """
+    Nyström approximation of the RBF SVM with a multinomial linear head.
+
+    Scoring cost grows with the number of landmarks instead of the number of
+    support vectors, so it stays flat when the full model is retrained on a
+    larger history. Built by build_reduced_model, which also records how far
+    its accuracy is from the full SVM.
+    """
+
+    def __init__(self, arrays, block_size=4096):
+        self.classes_ = arrays['classes']
+        self.gamma = float(arrays['gamma'])
+        self.landmarks = arrays['landmarks']
+        self.normalization = arrays['normalization']
+        self.coef = arrays['coef']
+        self.intercept = arrays['intercept']
+        self.n_features_in_ = self.landmarks.shape[1]
+        self.source_digest = str(arrays['source_digest'])
+        self.scaler_digest = str(arrays['scaler_digest'])
+        self.report = json.loads(str(arrays['report']))
+        self.block_size = block_size
+
+        # Fold the normalization into the head, one product per block
+        self.head = self.normalization.T @ self.coef.T
+        self.landmark_sq_norms = np.einsum('ij,ij->i', self.landmarks, self.landmarks)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls({key: arrays[key] for key in arrays.files})
+
+    def decision_function(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[-1]} features, but the reduced model expects {self.n_features_in_}")
+
+        out = np.empty((len(X), len(self.classes_)))
+        for start in range(0, len(X), self.block_size):
+            block = X[start:start + self.block_size]
+            sq_dist = np.einsum('ij,ij->i', block, block)[:, None] - 2 * block @ self.landmarks.T + self.landmark_sq_norms
+            out[start:start + len(block)] = np.exp(-self.gamma * np.maximum(sq_dist, 0)) @ self.head + self.intercept
+        return out
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.decision_function(X), axis=1)]
+
+    def predict_proba(self, X):
+        # Softmax, shifted by the row maximum so exp can't overflow
+        logits = self.decision_function(X)
+        logits -= logits.max(axis=1, keepdims=True)
+        proba = np.exp(logits)
+        return proba / proba.sum(axis=1, keepdims=True)
+
+    def predict_with_proba(self, X):
+        """
+        predict and predict_proba from one evaluation of the landmarks
+        """
+        proba = self.predict_proba(X)
+        return self.classes_[np.argmax(proba, axis=1)], proba
+
+def load_reduced_model():
+    """
+    Return the reduced model if it was built from the current SVM and scaler
+    """
+    registry = get_model_registry()
+    try:
+        model = registry.get('risk_reduced')
+    except Exception:
+        # A missing or unreadable model just means the full SVM is used
+        return None
+
+    if model is None:
+        return None
+
+    # Accuracy reported against an older SVM would be meaningless
+    if model.source_digest != registry.digest('risk_classifier') or model.scaler_digest != registry.digest('risk_scaler'):
+        return None
+
+    return model
+
+def build_reduced_model(n_components=200, data_path=None,
+                        output=REDUCED_PATH, test_size=0.2, random_state=42):
+    """
+    Fit the reduced model on the labelled training data and compare it to the full SVM.
+
+    The landmarks and head are fit on a stratified training split. Both
+    models are scored on the held-out rows; the full SVM was fit on every
+    row, so the delta it is compared against is, if anything, pessimistic.
+    Once written, data.csv is scored through both serving paths and the
+    report records whether each reached its own model (serving_agreement).
+    """
+    import pandas as pd
+    from sklearn.kernel_approximation import Nystroem
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.model_selection import train_test_split
+
+    registry = get_model_registry()
+    model = registry.get('risk_classifier')
+    scaler = registry.get('risk_scaler')
+    features = registry.get('risk_features')
+    if model is None or scaler is None or features is None:
+        raise LookupError("The full SVM, its scaler and feature list are needed to build the reduced model")
+    if getattr(model, 'kernel', None) != 'rbf':
+        raise ValueError("Support-vector reduction only applies to an RBF SVM")
+
+    data = pd.read_csv(data_path or labelled_csv())
+    X = scaler.transform(data[features])
+    y = data['Risk_Category'].to_numpy()
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, stratify=y, random_state=random_state
+    )
+
+    # Landmarks drawn from the training rows, same kernel width as the SVM
+    nystroem = Nystroem(kernel='rbf', gamma=model._gamma, n_components=n_components, random_state=random_state)
+    features_train = nystroem.fit_transform(X_train)
+    head = LogisticRegression(C=10, max_iter=2000).fit(features_train, y_train)
+
+    arrays = {
+        'classes': np.asarray(head.classes_).astype(str),
+        'gamma': np.array(model._gamma),
+        'landmarks': nystroem.components_,
+        'normalization': nystroem.normalization_,
+        'coef': head.coef_,
+        'intercept': head.intercept_,
+        'source_digest': np.array(registry.digest('risk_classifier')),
+        'scaler_digest': np.array(registry.digest('risk_scaler'))
+    }
+
+    # Compare both models on the held-out rows
+    reduced = ReducedSVMScorer(dict(arrays, report=np.array('{}')))
+
+    start = time.perf_counter()
+    full_prediction = model.predict(X_test)
+    model.predict_proba(X_test)
+    full_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reduced_prediction = reduced.predict(X_test)
+    reduced.predict_proba(X_test)
+    reduced_seconds = time.perf_counter() - start
+
+    full_accuracy = float((full_prediction == y_test).mean())
+    reduced_accuracy = float((reduced_prediction.astype(object) == y_test).mean())
+
+    report = {
+        'n_support_vectors': int(len(model.support_vectors_)),
+        'n_components': int(n_components),
+        'holdout_rows': int(len(y_test)),
+        'full_accuracy': full_accuracy,
+        'reduced_accuracy': reduced_accuracy,
+        'accuracy_delta': reduced_accuracy - full_accuracy,
+        'agreement': float((reduced.predict(X).astype(object) == model.predict(X)).mean()),
+        'full_ms_per_1000': full_seconds / len(y_test) * 1e6,
+        'reduced_ms_per_1000': reduced_seconds / len(y_test) * 1e6
+    }
+    arrays['report'] = np.array(json.dumps(report))
+    _save_arrays(arrays, output)
+
+    # Imported here, classification resolves the reduced model through this module
+    if data_path is None and output == REDUCED_PATH:
+        from utils.classification import check_scoring_paths
+        from utils.scaling import RAW_DATA
+
+        raw = pd.read_csv(RAW_DATA, sep=';', encoding='utf-8-sig')
+        report['serving_agreement'] = check_scoring_paths(raw.iloc[:len(data)], data)
+        arrays['report'] = np.array(json.dumps(report))
+        _save_arrays(arrays, output)
+
+    return report
+
+def _save_arrays(arrays, output):
+    # np.savez adds .npz to names without it, so keep the suffix on the temp file
+    tmp_path = f"{output}.tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, output)
+
+def serving_checked(model):
+    """
+    True when the build confirmed both scoring paths reach their own model
+    """
+    agreement = model.report.get('serving_agreement') or {}
+    return agreement.get('full') == 1.0 and agreement.get('reduced') == 1.0
+
+# Resolved and shared through the model registry like the pickled models
+get_model_registry().register('risk_reduced', [REDUCED_PATH], loader=ReducedSVMScorer.load)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the reduced (Nyström) risk model for batch scoring")
+    parser.add_argument('--components', type=int, default=200, help="number of Nyström landmarks")
+    parser.add_argument('--data', default=None, help="the labelled dataset export by default")
+    parser.add_argument('--output', default=REDUCED_PATH)
+    args = parser.parse_args()
+
+    report = build_reduced_model(args.components, args.data, args.output)
+    print(f"Wrote {args.output}")
+    print(f"Support vectors: {report['n_support_vectors']:,} -> landmarks: {report['n_components']:,}")
+    print(f"Held-out accuracy: full {report['full_accuracy']:.4f}, reduced {report['reduced_accuracy']:.4f} "
+          f"(delta {report['accuracy_delta']:+.4f})")
+    print(f"Agreement with the full SVM: {report['agreement']:.4f}")
+    print(f"Time per 1,000 rows: full {report['full_ms_per_1000']:.1f} ms, reduced {report['reduced_ms_per_1000']:.1f} ms")
+    if 'serving_agreement' in report:
+        agreement = report['serving_agreement']
+        print(f"Served predictions matching their own model: full {agreement['full']}, reduced {agreement['reduced']}")
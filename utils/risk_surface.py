@@ -0,0 +1,273 @@
+import argparse
+import json
+import os
+import numpy as np
+from utils.model_registry import SCORING_ARTIFACTS, get_model_registry
+
+SURFACE_PATH = 'models/risk_surface.npy'
+
+# Enrolled and approved units share one axis, approved can't exceed enrolled
+UNITS_AXIS = 'Curricular_units_1st_sem'
+
+# Each cell packs the risk label index into the low bits and the
+# confidence, in tenths of a percent, into the bits above
+LABEL_BITS = 3
+EMPTY_CELL = np.iinfo(np.uint16).max
+
+def default_grid(grade_step=20.0, age_step=4):
+    """
+    Grid over the prediction form inputs.
+
+    With a grade step of 1 and an age step of 1 this is every value the form
+    can produce. Every cell is scored by the SVM, at roughly 35 us a cell on
+    one core, so the defaults keep the surface to about 18 million cells
+    (36 MB, about ten minutes to build).
+    """
+    grades = [float(g) for g in np.arange(0, 200 + grade_step / 2, grade_step)]
+
+    return {
+        'Previous_qualification_grade': grades,
+        'Admission_grade': list(grades),
+        UNITS_AXIS: [(enrolled, approved) for enrolled in range(1, 11) for approved in range(enrolled + 1)],
+        'Age_at_enrollment': list(range(16, 61, age_step)),
+        'Gender': ['Male', 'Female'],
+        'Marital_status': [1, 2, 3, 4, 5, 6],
+        'Scholarship_holder': ['Yes', 'No'],
+        'Debtor': ['Yes', 'No'],
+        'Tuition_fees_up_to_date': ['Yes', 'No'],
+        'International': ['Yes', 'No']
+    }
+
+class RiskSurface:
+    """
+    Memory-mapped lookup table of precomputed predictions over a discrete grid
+    """
+
+    def __init__(self, cells, grid, labels, digests=None):
+        self.cells = cells
+        self.grid = grid
+        self.labels = list(labels)
+        self.digests = dict(digests or {})
+
+        self._axes = list(grid)
+        self._index = {axis: {value: i for i, value in enumerate(values)} for axis, values in grid.items()}
+
+        # Row-major strides for the flat cell index
+        self._strides = []
+        stride = 1
+        for axis in reversed(self._axes):
+            self._strides.insert(0, stride)
+            stride *= len(grid[axis])
+
+        # Inputs the grid determines, anything else forces live inference
+        self._fields = set(self._axes) - {UNITS_AXIS}
+        if UNITS_AXIS in grid:
+            self._fields |= {
+                'Curricular_units_1st_sem_enrolled',
+                'Curricular_units_1st_sem_approved',
+                'Passing_ratio_1st_sem'
+            }
+
+    @classmethod
+    def load(cls, path):
+        """
+        Open a surface written by build_risk_surface
+        """
+        with open(metadata_path(path), 'r') as f:
+            metadata = json.load(f)
+
+        grid = metadata['grid']
+        if UNITS_AXIS in grid:
+            grid[UNITS_AXIS] = [tuple(pair) for pair in grid[UNITS_AXIS]]
+
+        cells = np.load(path, mmap_mode='r')
+        if len(cells) != int(np.prod([len(values) for values in grid.values()])):
+            raise ValueError(f"{path} doesn't match the grid in {metadata_path(path)}")
+
+        return cls(cells, grid, metadata['labels'], metadata.get('digests'))
+
+    def lookup(self, input_data):
+        """
+        Return (risk_level, confidence) for an on-grid input, or None
+        """
+        if not self._fields.issuperset(input_data):
+            return None
+
+        flat = 0
+        for axis, stride in zip(self._axes, self._strides):
+            if axis == UNITS_AXIS:
+                key = (
+                    input_data.get('Curricular_units_1st_sem_enrolled'),
+                    input_data.get('Curricular_units_1st_sem_approved')
+                )
+            else:
+                key = input_data.get(axis)
+
+            i = self._index[axis].get(key)
+            if i is None:
+                return None
+            flat += i * stride
+
+        cell = int(self.cells[flat])
+        if cell == EMPTY_CELL:
+            return None
+
+        return self.labels[cell & ((1 << LABEL_BITS) - 1)], (cell >> LABEL_BITS) / 10
+
+def metadata_path(path):
+    return os.path.splitext(path)[0] + '.json'
+
+def load_risk_surface():
+    """
+    Return the surface if it was built from the current scoring artifacts
+    """
+    registry = get_model_registry()
+    try:
+        surface = registry.get('risk_surface')
+    except Exception:
+        # A missing or half-written surface just means live inference
+        return None
+
+    if surface is None:
+        return None
+
+    # A surface from an older model, scaler, feature list or scaling (or
+    # from before the incremental model took over) would serve stale predictions
+    if surface.digests != registry.digests(SCORING_ARTIFACTS):
+        return None
+
+    return surface
+
+def build_risk_surface(grid=None, path=SURFACE_PATH, chunk_size=250000, progress=None):
+    """
+    Evaluate the model and rule overlay over every grid cell and persist the result
+    """
+    # Imported here, classification resolves the surface through this module
+    from utils.classification import load_feature_pipeline, score_columns
+
+    # A model that can't score the grid would fill it with the rule-based fallback
+    error = load_feature_pipeline().error
+    if error is not None:
+        raise ValueError(f"The risk model can't score the form inputs: {error}")
+
+    grid = grid or default_grid()
+    axes = list(grid)
+    shape = tuple(len(grid[axis]) for axis in axes)
+    n_cells = int(np.prod(shape))
+
+    # Axis values as arrays so a chunk of coordinates maps to values in one step
+    axis_values = {}
+    for axis in axes:
+        if axis == UNITS_AXIS:
+            pairs = np.array(grid[axis])
+            axis_values['Curricular_units_1st_sem_enrolled'] = pairs[:, 0]
+            axis_values['Curricular_units_1st_sem_approved'] = pairs[:, 1]
+        else:
+            axis_values[axis] = np.array(grid[axis], dtype=object)
+
+    tmp_path = f"{path}.tmp.npy"
+    cells = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint16, shape=(n_cells,))
+    labels = []
+
+    for start in range(0, n_cells, chunk_size):
+        stop = min(start + chunk_size, n_cells)
+        coords = dict(zip(axes, np.unravel_index(np.arange(start, stop), shape)))
+
+        columns = {}
+        for axis in axes:
+            if axis == UNITS_AXIS:
+                columns['Curricular_units_1st_sem_enrolled'] = axis_values['Curricular_units_1st_sem_enrolled'][coords[axis]]
+                columns['Curricular_units_1st_sem_approved'] = axis_values['Curricular_units_1st_sem_approved'][coords[axis]]
+            else:
+                columns[axis] = axis_values[axis][coords[axis]]
+
+        prediction, confidence, _ = score_columns(columns, stop - start)
+
+        # Map labels to indices, growing the label table as new ones appear
+        chunk_labels, inverse = np.unique(prediction.astype(str), return_inverse=True)
+        for label in chunk_labels:
+            if label not in labels:
+                labels.append(label)
+        if len(labels) >= (1 << LABEL_BITS):
+            raise ValueError(f"Too many distinct risk labels for the surface: {labels}")
+
+        codes = np.array([labels.index(label) for label in chunk_labels], dtype=np.uint16)[inverse]
+        tenths = np.round(confidence * 10).astype(np.uint16)
+        cells[start:stop] = codes | (tenths << LABEL_BITS)
+
+        if progress is not None:
+            progress(stop, n_cells)
+
+    cells.flush()
+    del cells
+
+    registry = get_model_registry()
+    metadata = {
+        'grid': grid,
+        'labels': labels,
+        'digests': registry.digests(SCORING_ARTIFACTS)
+    }
+
+    # Metadata first, then the table, so a complete table always has matching metadata
+    with open(metadata_path(path), 'w') as f:
+        json.dump(metadata, f)
+    os.replace(tmp_path, path)
+
+    return n_cells
+
+def verify_risk_surface(surface, n_samples=10000, random_state=42):
+    """
+    Compare random surface cells with live inference on the same inputs.
+
+    Returns the share of cells with the same risk level and the largest
+    confidence difference, which the tenth-of-a-percent packing bounds to 0.05.
+    """
+    from utils.classification import score_columns
+
+    rng = np.random.default_rng(random_state)
+    flat = rng.integers(0, len(surface.cells), n_samples)
+    coords = np.unravel_index(flat, tuple(len(surface.grid[axis]) for axis in surface._axes))
+
+    columns = {}
+    inputs = [{} for _ in range(n_samples)]
+    for axis, idx in zip(surface._axes, coords):
+        values = surface.grid[axis]
+        if axis == UNITS_AXIS:
+            pairs = [values[i] for i in idx]
+            names_values = [
+                ('Curricular_units_1st_sem_enrolled', np.array([pair[0] for pair in pairs])),
+                ('Curricular_units_1st_sem_approved', np.array([pair[1] for pair in pairs]))
+            ]
+        else:
+            names_values = [(axis, np.array([values[i] for i in idx], dtype=object))]
+        for name, column in names_values:
+            columns[name] = column
+            for record, value in zip(inputs, column):
+                record[name] = value.item() if hasattr(value, 'item') else value
+
+    prediction, confidence, _ = score_columns(columns, n_samples)
+    stored = [surface.lookup(record) for record in inputs]
+
+    same = np.mean([cell is not None and cell[0] == level for cell, level in zip(stored, prediction)])
+    difference = max((abs(cell[1] - value) for cell, value in zip(stored, confidence) if cell is not None), default=0.0)
+    return {'n_samples': n_samples, 'same_risk_level': float(same), 'max_confidence_difference': float(difference)}
+
+# Resolved and shared through the model registry like the pickled models
+get_model_registry().register('risk_surface', [SURFACE_PATH], loader=RiskSurface.load)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute the risk prediction surface")
+    parser.add_argument('--grade-step', type=float, default=20.0, help="step for the grade axes (form step is 1)")
+    parser.add_argument('--age-step', type=int, default=4, help="step for the age axis (form step is 1)")
+    parser.add_argument('--output', default=SURFACE_PATH)
+    args = parser.parse_args()
+
+    def report(done, total):
+        print(f"\r{done:,}/{total:,} cells", end='', flush=True)
+
+    n_cells = build_risk_surface(default_grid(args.grade_step, args.age_step), args.output, progress=report)
+    print(f"\nWrote {n_cells:,} cells to {args.output}")
+
+    check = verify_risk_surface(RiskSurface.load(args.output))
+    print(f"{check['same_risk_level']:.2%} of {check['n_samples']:,} sampled cells match live inference, "
+          f"confidence within {check['max_confidence_difference']:.3f} points")
@@ -0,0 +1,228 @@
+import argparse
+import json
+import os
+import numpy as np
+import pandas as pd
+from utils.model_registry import get_model_registry
+from utils.schema import LABEL_COLUMNS, ONE_HOT_COLUMNS, SCALED_FEATURES
+
+SCALING_PATH = 'models/feature_scaling.json'
+
+# The labelled table is data.csv turned into model features by these
+# rules, plus the label sidecar
+RAW_DATA = 'data/data.csv'
+LABELS_DATA = 'data/risk_labels.csv'
+LABELLED_EXPORT = 'data/data_with_risk_labels.csv'
+
+# Scaled features taken straight from data.csv
+DIRECT_FEATURES = [col for col in SCALED_FEATURES if col not in (
+    'Passing_ratio_1st_sem', 'Grade_difference', 'Participation_ratio_1st_sem'
+)]
+
+# data.csv columns the features are computed from
+RAW_COLUMNS = DIRECT_FEATURES + ['Curricular_units_1st_sem_evaluations', 'Status']
+
+# Right-closed age bins, so 20 falls in '<20'
+AGE_BINS = [-np.inf, 20, 25, 30, 40, np.inf]
+AGE_LABELS = ['<20', '20-25', '26-30', '31-40', '>40']
+
+# Left-closed passing ratio bins; students with no enrolled units are 'Poor'
+PERFORMANCE_BINS = [-np.inf, 0.25, 0.5, 0.75, 0.9, np.inf]
+PERFORMANCE_LABELS = ['Poor', 'Below Average', 'Average', 'Good', 'Excellent']
+
+# Applications ranked up to this choice count as high priority
+HIGH_PRIORITY_ORDER = 3
+
+def _ratio(raw, units):
+    # Per enrolled unit; undefined when nothing was enrolled
+    enrolled = raw['Curricular_units_1st_sem_enrolled'].astype('float64').replace(0, np.nan)
+    return raw[units] / enrolled
+
+def unscaled_features(raw, fill, columns=SCALED_FEATURES):
+    """
+    SCALED_FEATURES in their original units, all 22 by default.
+
+    Only the data.csv columns the requested features need are read.
+    """
+    features = {}
+    for col in columns:
+        if col == 'Passing_ratio_1st_sem':
+            values = _ratio(raw, 'Curricular_units_1st_sem_approved').fillna(fill[col])
+        elif col == 'Participation_ratio_1st_sem':
+            values = _ratio(raw, 'Curricular_units_1st_sem_evaluations').fillna(fill[col])
+        elif col == 'Grade_difference':
+            values = raw['Admission_grade'].astype('float64') - raw['Previous_qualification_grade'].astype('float64')
+        else:
+            values = raw[col].astype('float64')
+        features[col] = values
+    return pd.DataFrame(features, index=raw.index)
+
+def one_hot_features(raw, columns=ONE_HOT_COLUMNS):
+    """
+    ONE_HOT_COLUMNS derived from data.csv, all 15 by default.
+
+    Only the groups (age, performance, priority, status) that the requested
+    columns belong to are computed.
+    """
+    groups = {col.rsplit('_', 1)[0] for col in columns}
+    features = {}
+
+    if 'Age_category' in groups:
+        age = pd.cut(raw['Age_at_enrollment'], AGE_BINS, labels=AGE_LABELS).to_numpy()
+        for label in AGE_LABELS:
+            features[f'Age_category_{label}'] = age == label
+
+    if 'Performance_category' in groups:
+        passing = _ratio(raw, 'Curricular_units_1st_sem_approved')
+        performance = pd.cut(passing, PERFORMANCE_BINS, right=False, labels=PERFORMANCE_LABELS).to_numpy()
+        for label in PERFORMANCE_LABELS:
+            features[f'Performance_category_{label}'] = performance == label
+        features['Performance_category_Poor'] |= pd.isna(performance)
+
+    if 'Application_priority' in groups:
+        high_priority = (raw['Application_order'] <= HIGH_PRIORITY_ORDER).to_numpy()
+        features['Application_priority_High'] = high_priority
+        features['Application_priority_Low'] = ~high_priority
+
+    if 'Status' in groups:
+        status = raw['Status'].to_numpy()
+        for label in ['Dropout', 'Enrolled', 'Graduate']:
+            features[f'Status_{label}'] = status == label
+
+    return pd.DataFrame(features, index=raw.index)[list(columns)]
+
+class FeatureScaling:
+    """
+    Persisted min-max scaling that turns data.csv rows into model features.
+
+    Holds the per-feature minimum and maximum and the fill values for the
+    undefined ratios, fitted once on data.csv. transform produces the
+    feature columns of the labelled table and inverse_transform recovers
+    original units from scaled values.
+    """
+
+    def __init__(self, minimum, maximum, fill):
+        self.minimum = pd.Series(minimum, dtype='float64')[SCALED_FEATURES]
+        self.maximum = pd.Series(maximum, dtype='float64')[SCALED_FEATURES]
+        self.fill = dict(fill)
+        self.range = (self.maximum - self.minimum).replace(0, 1.0)
+
+    @classmethod
+    def fit(cls, raw):
+        fill = {
+            'Passing_ratio_1st_sem': float(_ratio(raw, 'Curricular_units_1st_sem_approved').median()),
+            'Participation_ratio_1st_sem': float(_ratio(raw, 'Curricular_units_1st_sem_evaluations').median())
+        }
+        features = unscaled_features(raw, fill)
+        return cls(features.min().to_dict(), features.max().to_dict(), fill)
+
+    @classmethod
+    def load(cls, path=SCALING_PATH):
+        with open(path, 'r') as f:
+            params = json.load(f)
+        return cls(params['minimum'], params['maximum'], params['fill'])
+
+    def save(self, path=SCALING_PATH):
+        params = {
+            'minimum': self.minimum.to_dict(),
+            'maximum': self.maximum.to_dict(),
+            'fill': self.fill
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(params, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def transform(self, raw, columns=None):
+        """
+        Feature columns of the labelled table for rows of data.csv.
+
+        With `columns`, only the requested features are computed, from
+        just the data.csv columns they need.
+        """
+        wanted = SCALED_FEATURES + ONE_HOT_COLUMNS if columns is None else list(columns)
+        parts = []
+
+        scaled = [col for col in SCALED_FEATURES if col in wanted]
+        if scaled:
+            features = unscaled_features(raw, self.fill, scaled)
+            parts.append((features - self.minimum[scaled]) / self.range[scaled])
+
+        one_hot = [col for col in ONE_HOT_COLUMNS if col in wanted]
+        if one_hot:
+            parts.append(one_hot_features(raw, one_hot))
+
+        if not parts:
+            return pd.DataFrame(index=raw.index)
+        frame = pd.concat(parts, axis=1)
+        return frame[[col for col in wanted if col in frame.columns]]
+
+    def inverse_transform(self, scaled):
+        """
+        Original units for the scaled feature columns of a frame
+        """
+        columns = [col for col in SCALED_FEATURES if col in scaled.columns]
+        return scaled[columns].astype('float64') * self.range[columns] + self.minimum[columns]
+
+def load_feature_scaling():
+    """
+    The persisted feature scaling, shared through the model registry
+    """
+    return get_model_registry().get('feature_scaling')
+
+def labelled_frame(raw, labels, scaling, columns=None):
+    """
+    The labelled table: scaled features of `raw` next to its label sidecar
+    """
+    n_rows = min(len(raw), len(labels))
+    features = scaling.transform(raw.iloc[:n_rows], columns)
+    label_columns = [col for col in LABEL_COLUMNS if columns is None or col in columns]
+    frame = pd.concat([features, labels.iloc[:n_rows][label_columns].set_axis(features.index)], axis=1)
+    return frame if columns is None else frame[[col for col in columns if col in frame.columns]]
+
+def _sources_stamp():
+    stats = [os.stat(path) for path in (RAW_DATA, LABELS_DATA, SCALING_PATH)]
+    return [[stat.st_size, stat.st_mtime_ns] for stat in stats]
+
+def labelled_csv(path=LABELLED_EXPORT):
+    """
+    Path of a CSV export of the labelled table, for the offline tools.
+
+    The export is regenerated whenever data.csv, the label sidecar or the
+    scaling parameters change; the dashboard itself never reads it.
+    """
+    stamp_path = path + '.json'
+    stamp = _sources_stamp()
+    try:
+        with open(stamp_path, 'r') as f:
+            if json.load(f) == stamp and os.path.exists(path):
+                return path
+    except (OSError, ValueError):
+        pass
+
+    raw = pd.read_csv(RAW_DATA, sep=';', encoding='utf-8-sig')
+    labels = pd.read_csv(LABELS_DATA)
+    frame = labelled_frame(raw, labels, FeatureScaling.load())
+
+    tmp_path = path + '.tmp'
+    frame.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    with open(stamp_path, 'w') as f:
+        json.dump(stamp, f)
+
+    return path
+
+# Resolved and shared through the model registry like the pickled models
+get_model_registry().register('feature_scaling', [SCALING_PATH], loader=FeatureScaling.load)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit the feature scaling on data.csv, or export the labelled table")
+    parser.add_argument('--fit', action='store_true', help=f"refit {SCALING_PATH} from {RAW_DATA}")
+    parser.add_argument('--export', action='store_true', help=f"write {LABELLED_EXPORT} for the offline tools")
+    args = parser.parse_args()
+
+    if args.fit:
+        FeatureScaling.fit(pd.read_csv(RAW_DATA, sep=';', encoding='utf-8-sig')).save()
+        print(f"Wrote {SCALING_PATH}")
+    if args.export:
+        print(f"Wrote {labelled_csv()}")
@@ -0,0 +1,192 @@
+import argparse
+import numpy as np
+import pandas as pd
+
+# Bit-packed booleans, one bit per value instead of one byte
+PACKED_BOOL = 'bool[pyarrow]'
+
+# Raw export (data/data.csv)
+DATA_SCHEMA = {
+    'Marital_status': 'category',
+    'Application_mode': 'category',
+    'Application_order': 'int8',
+    'Course': 'category',
+    # 0/1 flags stay integer codes, the pages map them with {1: ..., 0: ...}
+    'Daytime_evening_attendance': 'int8',
+    'Previous_qualification': 'category',
+    'Previous_qualification_grade': 'float32',
+    'Nacionality': 'category',
+    'Mothers_qualification': 'category',
+    'Fathers_qualification': 'category',
+    'Mothers_occupation': 'category',
+    'Fathers_occupation': 'category',
+    'Admission_grade': 'float32',
+    'Displaced': 'int8',
+    'Educational_special_needs': 'int8',
+    'Debtor': 'int8',
+    'Tuition_fees_up_to_date': 'int8',
+    'Gender': 'int8',
+    'Scholarship_holder': 'int8',
+    'Age_at_enrollment': 'int8',
+    'International': 'int8',
+    'Curricular_units_1st_sem_credited': 'int8',
+    'Curricular_units_1st_sem_enrolled': 'int8',
+    'Curricular_units_1st_sem_evaluations': 'int8',
+    'Curricular_units_1st_sem_approved': 'int8',
+    'Curricular_units_1st_sem_grade': 'float32',
+    'Curricular_units_1st_sem_without_evaluations': 'int8',
+    'Curricular_units_2nd_sem_credited': 'int8',
+    'Curricular_units_2nd_sem_enrolled': 'int8',
+    'Curricular_units_2nd_sem_evaluations': 'int8',
+    'Curricular_units_2nd_sem_approved': 'int8',
+    'Curricular_units_2nd_sem_grade': 'float32',
+    'Curricular_units_2nd_sem_without_evaluations': 'int8',
+    'Unemployment_rate': 'float32',
+    'Inflation_rate': 'float32',
+    'GDP': 'float32',
+    'Status': 'category'
+}
+
+# Normalized features of the labelled dataset (see utils/scaling.py)
+SCALED_FEATURES = [
+    'Age_at_enrollment', 'Gender', 'Marital_status', 'Scholarship_holder', 'Debtor',
+    'Tuition_fees_up_to_date', 'International', 'Educational_special_needs',
+    'Previous_qualification_grade', 'Admission_grade', 'Application_order', 'Application_mode',
+    'Curricular_units_1st_sem_enrolled', 'Curricular_units_1st_sem_approved',
+    'Curricular_units_1st_sem_grade', 'Mothers_qualification', 'Fathers_qualification',
+    'Mothers_occupation', 'Fathers_occupation', 'Passing_ratio_1st_sem', 'Grade_difference',
+    'Participation_ratio_1st_sem'
+]
+
+ONE_HOT_COLUMNS = [
+    'Age_category_<20', 'Age_category_20-25', 'Age_category_26-30', 'Age_category_31-40',
+    'Age_category_>40', 'Performance_category_Average', 'Performance_category_Below Average',
+    'Performance_category_Excellent', 'Performance_category_Good', 'Performance_category_Poor',
+    'Application_priority_High', 'Application_priority_Low', 'Status_Dropout',
+    'Status_Enrolled', 'Status_Graduate'
+]
+
+LABELLED_SCHEMA = dict(
+    {col: 'float32' for col in SCALED_FEATURES},
+    **{col: PACKED_BOOL for col in ONE_HOT_COLUMNS},
+    Cluster='int8',
+    Risk_Level='int8',
+    Risk_Category='category'
+)
+
+# Columns the label sidecar (risk_labels.csv) adds to the features
+LABEL_COLUMNS = ['Cluster', 'Risk_Category', 'Risk_Level']
+
+# Dataset name -> (CSV, read_csv options, dtype schema)
+DATASETS = {
+    'data': ('data/data.csv', {'sep': ';'}, DATA_SCHEMA),
+    # Labels for the rows of data.csv, in the same order
+    'labels': ('data/risk_labels.csv', {}, LABELLED_SCHEMA)
+}
+
+# Datasets computed from others (see utils/scaling.py): the labelled table
+# is data.csv scaled with the persisted parameters, next to its labels
+DERIVED_DATASETS = {
+    'labelled': ('data', 'labels')
+}
+
+# Views served from another dataset: name -> (dataset, columns left out).
+# The clustering features are the labelled table without its labels.
+DATASET_VIEWS = {
+    'clustering': ('labelled', LABEL_COLUMNS)
+}
+
+def _castable(series, dtype):
+    """
+    Whether the values survive the cast, so a schema never corrupts data
+    """
+    if dtype in ('bool', PACKED_BOOL):
+        values = series.dropna()
+        if series.dtype == object:
+            return len(values) == len(series) and set(values.unique()).issubset({'True', 'False', True, False})
+        return len(values) == len(series) and set(values.unique()).issubset({0, 1})
+
+    if dtype.startswith('int'):
+        if not pd.api.types.is_numeric_dtype(series) or series.isna().any():
+            return False
+        values = series.to_numpy()
+        info = np.iinfo(dtype)
+        return bool((values == np.round(values)).all() and values.min() >= info.min and values.max() <= info.max)
+
+    if dtype.startswith('float'):
+        return pd.api.types.is_numeric_dtype(series)
+
+    return True
+
+def compact_frame(df, schema):
+    """
+    Cast the columns of a DataFrame to the dtypes declared in a schema.
+
+    Columns missing from the schema, and columns whose values don't fit the
+    declared dtype, keep the dtype they were read with.
+    """
+    dtypes = {}
+    for col, dtype in schema.items():
+        if col not in df.columns or str(df[col].dtype) == dtype:
+            continue
+        if _castable(df[col], dtype):
+            dtypes[col] = dtype
+
+    # 'True'/'False' strings have to become real booleans before the cast
+    strings = [col for col in dtypes if dtypes[col] in ('bool', PACKED_BOOL) and df[col].dtype == object]
+    if strings:
+        df = df.assign(**{col: df[col].map({'True': True, 'False': False, True: True, False: False}) for col in strings})
+
+    return df.astype(dtypes) if dtypes else df
+
+# Significant digits a float32 holds reliably
+FLOAT32_DIGITS = 7
+
+def _widen(values):
+    """
+    float32 values as float64, rounded to FLOAT32_DIGITS significant digits
+    """
+    values = values.astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        exponent = np.floor(np.log10(np.abs(values)))
+    exponent[~np.isfinite(exponent)] = 0
+    scale = 10.0 ** (FLOAT32_DIGITS - 1 - exponent)
+    return np.round(values * scale) / scale
+
+def display_frame(df):
+    """
+    Widen float32 columns to float64 for charts and tables.
+
+    A plain cast shows a stored 5.3 as 5.300000190734863; rounding to the
+    digits a float32 holds keeps it 5.3. The other columns are passed
+    through without copying. Callers widen once per loaded frame (see
+    DatasetHandle.display_frame), not on every rerun.
+    """
+    narrow = {col for col in df.columns if df[col].dtype == np.float32}
+    if not narrow:
+        return df
+    columns = {col: _widen(df[col].to_numpy()) if col in narrow else df[col] for col in df.columns}
+    return pd.DataFrame(columns, index=df.index, copy=False)
+
+def memory_report(before, after):
+    """
+    Bytes used before and after compaction
+    """
+    before_bytes = int(before.memory_usage(deep=True).sum())
+    after_bytes = int(after.memory_usage(deep=True).sum())
+    return {
+        'before_bytes': before_bytes,
+        'after_bytes': after_bytes,
+        'saved_bytes': before_bytes - after_bytes,
+        'ratio': before_bytes / after_bytes if after_bytes else 0.0
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the memory saved by dtype compaction")
+    parser.parse_args()
+
+    for path, options, schema in DATASETS.values():
+        before = pd.read_csv(path, **options)
+        report = memory_report(before, compact_frame(before, schema))
+        print(f"{path}: {report['before_bytes']:,} -> {report['after_bytes']:,} bytes, "
+              f"{report['saved_bytes']:,} saved ({report['ratio']:.1f}x)")
@@ -0,0 +1,285 @@
+import argparse
+import contextlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import pandas as pd
+from utils.load_data import DatasetHandle, load_handle
+from utils.scaling import SCALING_PATH
+from utils.schema import DATASET_VIEWS, DERIVED_DATASETS
+
+# Database files the dashboard looks for, in order of preference. The
+# backend is optional: without one of these, aggregates come from pandas.
+SQL_PATHS = ['data/dashboard.duckdb', 'data/dashboard.db']
+
+# Columns the pages filter and group on
+INDEXED_COLUMNS = [
+    'Risk_Category', 'Cluster', 'Course', 'Status',
+    'Status_Dropout', 'Status_Enrolled', 'Status_Graduate'
+]
+
+# Datasets held as tables; DATASET_VIEWS become SQL views of them
+SQL_DATASETS = ['data', 'labelled']
+
+# Sessions served at once, each from its own connection
+POOL_SIZE = 4
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def _sql_frame(df):
+    """
+    A frame with plain column types both engines store natively
+    """
+    columns = {}
+    for col in df.columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(values.cat.categories.dtype)
+        elif pd.api.types.is_bool_dtype(values):
+            values = values.astype('int8')
+        columns[col] = values
+    return pd.DataFrame(columns, index=df.index)
+
+def _dataset_key(name):
+    """
+    What a table was built from; the table is rebuilt when it changes
+    """
+    if name in DERIVED_DATASETS:
+        stat = os.stat(SCALING_PATH)
+        return [_dataset_key(source) for source in DERIVED_DATASETS[name]] + [stat.st_size, stat.st_mtime_ns]
+
+    # A zero-column projection brings the fingerprint up to date without reading rows
+    fingerprint = load_handle(name, ()).fingerprint or {}
+    return [fingerprint.get('sha256'), fingerprint.get('size'), fingerprint.get('version')]
+
+class ConnectionPool:
+    """
+    Up to `size` connections shared by the sessions of the process.
+
+    A session takes a connection for one query and gives it back, so a
+    handful of connections serve any number of sessions; extra callers
+    wait for a free one.
+    """
+
+    def __init__(self, connect, size=POOL_SIZE):
+        self._connect = connect
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextlib.contextmanager
+    def connection(self):
+        with self._slots:
+            try:
+                con = self._idle.get_nowait()
+            except queue.Empty:
+                con = self._connect()
+            try:
+                yield con
+            finally:
+                self._idle.put(con)
+
+class SqlBackend:
+    """
+    The datasets in an embedded database file, SQLite or DuckDB.
+
+    Each dataset is a table indexed on INDEXED_COLUMNS, rebuilt from the
+    loaded frames whenever the CSV behind it changes. Aggregations are run
+    as SQL, see SqlAggregates, so the pages that only need statistics never
+    hold the full frames.
+    """
+
+    def __init__(self, path, pool_size=POOL_SIZE):
+        self.path = path
+        self.engine = 'duckdb' if path.endswith('.duckdb') else 'sqlite'
+        self.lock = threading.Lock()
+        self.tables = {}
+
+        if self.engine == 'duckdb':
+            import duckdb
+            database = duckdb.connect(path)
+            self.pool = ConnectionPool(database.cursor, pool_size)
+        else:
+            self.pool = ConnectionPool(self._connect_sqlite, pool_size)
+
+        with self.pool.connection() as con:
+            con.execute(
+                'CREATE TABLE IF NOT EXISTS dataset_tables '
+                '(name TEXT PRIMARY KEY, source_key TEXT, n_rows INTEGER, columns TEXT, numeric TEXT)'
+            )
+            if self.engine == 'sqlite':
+                con.commit()
+
+    def _connect_sqlite(self):
+        con = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        # Readers don't block the writer rebuilding a table
+        con.execute('PRAGMA journal_mode=WAL')
+        return con
+
+    def query(self, sql, params=()):
+        with self.pool.connection() as con:
+            return con.execute(sql, params).fetchall()
+
+    def _write_table(self, name, df, source_key):
+        table = _quote(name)
+        df = _sql_frame(df)
+        numeric = [col for col in df.columns if pd.api.types.is_numeric_dtype(df[col])]
+        row = (name, source_key, len(df), json.dumps(list(df.columns)), json.dumps(numeric))
+
+        with self.pool.connection() as con:
+            if self.engine == 'duckdb':
+                con.register('new_rows', df)
+                con.execute(f'CREATE OR REPLACE TABLE {table} AS SELECT * FROM new_rows')
+                con.unregister('new_rows')
+            else:
+                df.to_sql(name, con, if_exists='replace', index=False)
+
+            for col in INDEXED_COLUMNS:
+                if col in df.columns:
+                    con.execute(f'CREATE INDEX IF NOT EXISTS {_quote(f"idx_{name}_{col}")} ON {table} ({_quote(col)})')
+
+            for view, (base, excluded) in DATASET_VIEWS.items():
+                if base == name:
+                    selected = ', '.join(_quote(col) for col in df.columns if col not in excluded)
+                    con.execute(f'DROP VIEW IF EXISTS {_quote(view)}')
+                    con.execute(f'CREATE VIEW {_quote(view)} AS SELECT {selected} FROM {table}')
+
+            con.execute('DELETE FROM dataset_tables WHERE name = ?', (name,))
+            con.execute('INSERT INTO dataset_tables VALUES (?, ?, ?, ?, ?)', row)
+            if self.engine == 'sqlite':
+                con.commit()
+
+        return {'n_rows': len(df), 'columns': list(df.columns), 'numeric': numeric, 'source_key': source_key}
+
+    def sync(self, name):
+        """
+        Table information for a dataset, rebuilding the table if its data changed
+        """
+        name = DATASET_VIEWS[name][0] if name in DATASET_VIEWS else name
+        source_key = json.dumps(_dataset_key(name))
+
+        with self.lock:
+            info = self.tables.get(name)
+            if info is None:
+                stored = self.query(
+                    'SELECT source_key, n_rows, columns, numeric FROM dataset_tables WHERE name = ?', (name,)
+                )
+                if stored:
+                    key, n_rows, columns, numeric = stored[0]
+                    info = {'n_rows': n_rows, 'columns': json.loads(columns),
+                            'numeric': json.loads(numeric), 'source_key': key}
+
+            if info is None or info['source_key'] != source_key:
+                # A handle of its own, so the full frame is freed once written
+                info = self._write_table(name, DatasetHandle(name).load().frame, source_key)
+
+            self.tables[name] = info
+            return name, info
+
+    def aggregates(self, name, columns=None, group_by='Cluster'):
+        table, info = self.sync(name)
+        return SqlAggregates(self, table, info, columns, group_by)
+
+class SqlAggregates:
+    """
+    RunningAggregates answered by SQL against one table.
+
+    Same methods and results, so the pages use either interchangeably;
+    every statistic is a GROUP BY in the database instead of pandas.
+    """
+
+    def __init__(self, backend, table, info, columns=None, group_by='Cluster'):
+        self.backend = backend
+        self.table = _quote(table)
+        self.n_rows = info['n_rows']
+        self.columns = [col for col in info['columns'] if columns is None or col in columns]
+        self.numeric = set(info['numeric'])
+        self.group_by = group_by if group_by in info['columns'] else None
+
+    def mean(self, col, mapping=None):
+        """
+        Mean of a column; text columns are mapped to numbers with `mapping`
+        """
+        if col in self.numeric:
+            value = self.backend.query(f'SELECT AVG({_quote(col)}) FROM {self.table}')[0][0]
+            return float('nan') if value is None else float(value)
+
+        counts = self.value_counts(col)
+        mapped = counts[counts.index.isin(list((mapping or {}).keys()))]
+        if mapped.sum() == 0:
+            return float('nan')
+        return sum(mapping[value] * count for value, count in mapped.items()) / mapped.sum()
+
+    def means(self, columns):
+        averages = ', '.join(f'AVG({_quote(col)})' for col in columns)
+        row = self.backend.query(f'SELECT {averages} FROM {self.table}')[0]
+        return pd.Series([float('nan') if value is None else float(value) for value in row], index=columns)
+
+    def value_counts(self, col):
+        """
+        Like Series.value_counts() on the whole table
+        """
+        rows = self.backend.query(
+            f'SELECT {_quote(col)}, COUNT(*) FROM {self.table} WHERE {_quote(col)} IS NOT NULL '
+            f'GROUP BY {_quote(col)} ORDER BY COUNT(*) DESC'
+        )
+        counts = pd.Series([count for _, count in rows], index=[value for value, _ in rows], dtype='int64')
+        counts.name = 'count'
+        counts.index.name = col
+        return counts
+
+    def group_means(self, columns):
+        """
+        Like df.groupby(group_by)[columns].mean()
+        """
+        averages = ', '.join(f'AVG({_quote(col)})' for col in columns)
+        group = _quote(self.group_by)
+        rows = self.backend.query(
+            f'SELECT {group}, {averages} FROM {self.table} WHERE {group} IS NOT NULL GROUP BY {group} ORDER BY {group}'
+        )
+        means = pd.DataFrame([row[1:] for row in rows], index=[row[0] for row in rows], columns=columns, dtype='float64')
+        means.index.name = self.group_by
+        return means
+
+    def crosstab(self, col):
+        """
+        Like pd.crosstab(df[group_by], df[col])
+        """
+        group = _quote(self.group_by)
+        rows = self.backend.query(
+            f'SELECT {group}, {_quote(col)}, COUNT(*) FROM {self.table} '
+            f'WHERE {group} IS NOT NULL AND {_quote(col)} IS NOT NULL GROUP BY {group}, {_quote(col)}'
+        )
+        table = pd.DataFrame(rows, columns=[self.group_by, col, 'count']).pivot(
+            index=self.group_by, columns=col, values='count'
+        )
+        return table.fillna(0).astype('int64')
+
+_sql_backend = None
+_sql_backend_lock = threading.Lock()
+
+def get_sql_backend():
+    """
+    The process-wide SQL backend, None when no database file has been built
+    """
+    global _sql_backend
+    with _sql_backend_lock:
+        if _sql_backend is None:
+            for path in SQL_PATHS:
+                if os.path.exists(path):
+                    _sql_backend = SqlBackend(path)
+                    break
+        return _sql_backend
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the embedded database the dashboard aggregates from")
+    parser.add_argument('--engine', choices=['sqlite', 'duckdb'], default='sqlite')
+    args = parser.parse_args()
+
+    path = SQL_PATHS[0] if args.engine == 'duckdb' else SQL_PATHS[1]
+    backend = SqlBackend(path)
+    for name in SQL_DATASETS:
+        table, info = backend.sync(name)
+        print(f"{path}: {table}, {info['n_rows']:,} rows, {len(info['columns'])} columns")
@@ -0,0 +1,318 @@
+import argparse
+import hashlib
+import os
+import numpy as np
+from utils.model_registry import get_model_registry
+
+KERNEL_PATH = 'models/svm_risk_category_model.npz'
+
+# libsvm clips pairwise probabilities to this range before coupling them
+MIN_PROBABILITY = 1e-7
+
+# Batches up to this size are coupled with plain Python floats
+SMALL_BATCH = 8
+
+class ScalerParams:
+    """
+    Fitted StandardScaler parameters without the sklearn object
+    """
+
+    def __init__(self, mean, scale, feature_names=None):
+        self.mean_ = mean
+        self.scale_ = scale
+        self.n_features_in_ = len(scale)
+        if feature_names is not None:
+            self.feature_names_in_ = feature_names
+
+class SVMKernelScorer:
+    """
+    Pure NumPy evaluation of an exported sklearn SVC.
+
+    Reproduces SVC.predict (one-vs-one voting) and SVC.predict_proba
+    (Platt scaling plus libsvm's pairwise coupling) from the arrays written
+    by export_svm_kernel, without sklearn's per-call validation overhead.
+    """
+
+    def __init__(self, arrays, block_size=4096):
+        self.classes_ = arrays['classes']
+        self.kernel = str(arrays['kernel'])
+        self.gamma = float(arrays['gamma'])
+        self.coef0 = float(arrays['coef0'])
+        self.degree = int(arrays['degree'])
+        self.support_vectors = arrays['support_vectors']
+        self.intercept = arrays['intercept']
+        self.prob_a = arrays['prob_a']
+        self.prob_b = arrays['prob_b']
+        self.n_features_in_ = self.support_vectors.shape[1]
+        self.source_digest = str(arrays['source_digest'])
+        self.block_size = block_size
+
+        if 'feature_names' in arrays:
+            self.feature_names_in_ = arrays['feature_names']
+
+        self.scaler = None
+        self.scaler_digest = None
+        if 'scaler_scale' in arrays:
+            self.scaler = ScalerParams(
+                arrays['scaler_mean'],
+                arrays['scaler_scale'],
+                arrays['scaler_feature_names'] if 'scaler_feature_names' in arrays else None
+            )
+            self.scaler_digest = str(arrays['scaler_digest'])
+
+        # Class pairs in libsvm order: (0, 1), (0, 2), ..., (1, 2), ...
+        n_classes = len(self.classes_)
+        self.pairs = [(i, j) for i in range(n_classes) for j in range(i + 1, n_classes)]
+
+        # Fold the dual coefficients into one (n_SV, n_pairs) matrix so all
+        # pairwise decision values come out of a single matrix product
+        dual_coef = arrays['dual_coef']
+        bounds = np.concatenate([[0], np.cumsum(arrays['n_support'])])
+        self.pair_coef = np.zeros((len(self.support_vectors), len(self.pairs)))
+        for p, (i, j) in enumerate(self.pairs):
+            self.pair_coef[bounds[i]:bounds[i + 1], p] = dual_coef[j - 1, bounds[i]:bounds[i + 1]]
+            self.pair_coef[bounds[j]:bounds[j + 1], p] = dual_coef[i, bounds[j]:bounds[j + 1]]
+
+        self.sv_sq_norms = np.einsum('ij,ij->i', self.support_vectors, self.support_vectors)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls({key: arrays[key] for key in arrays.files})
+
+    def _kernel(self, X):
+        dot = X @ self.support_vectors.T
+
+        if self.kernel == 'rbf':
+            sq_dist = np.einsum('ij,ij->i', X, X)[:, None] - 2 * dot + self.sv_sq_norms
+            return np.exp(-self.gamma * np.maximum(sq_dist, 0))
+        if self.kernel == 'linear':
+            return dot
+        if self.kernel == 'poly':
+            return (self.gamma * dot + self.coef0) ** self.degree
+        if self.kernel == 'sigmoid':
+            return np.tanh(self.gamma * dot + self.coef0)
+
+        raise ValueError(f"Unsupported kernel: {self.kernel}")
+
+    def decision_values(self, X):
+        """
+        Raw one-vs-one decision values, shape (n_samples, n_pairs)
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[-1]} features, but the SVM expects {self.n_features_in_}")
+
+        # Work in row blocks so the kernel matrix stays bounded
+        out = np.empty((len(X), len(self.pairs)))
+        for start in range(0, len(X), self.block_size):
+            block = X[start:start + self.block_size]
+            out[start:start + len(block)] = self._kernel(block) @ self.pair_coef + self.intercept
+        return out
+
+    def predict(self, X):
+        return self._vote(self.decision_values(X))
+
+    def predict_proba(self, X):
+        return self._couple(self.decision_values(X))
+
+    def predict_with_proba(self, X):
+        """
+        predict and predict_proba from one evaluation of the kernel
+        """
+        dec = self.decision_values(X)
+        return self._vote(dec), self._couple(dec)
+
+    def _vote(self, dec):
+        # Positive decision votes for the first class of the pair
+        votes = np.zeros((len(dec), len(self.classes_)), dtype=np.int64)
+        rows = np.arange(len(dec))
+        for p, (i, j) in enumerate(self.pairs):
+            winner = np.where(dec[:, p] > 0, i, j)
+            np.add.at(votes, (rows, winner), 1)
+
+        return self.classes_[np.argmax(votes, axis=1)]
+
+    def _couple(self, dec):
+        n_classes = len(self.classes_)
+
+        # Platt scaling of each pairwise decision value, 1 / (1 + exp(f))
+        # evaluated without overflow for large |f|
+        f = dec * self.prob_a + self.prob_b
+        e = np.exp(-np.abs(f))
+        pairwise = np.where(f >= 0, e / (1 + e), 1 / (1 + e))
+        pairwise = np.clip(pairwise, MIN_PROBABILITY, 1 - MIN_PROBABILITY)
+
+        r = np.zeros((len(dec), n_classes, n_classes))
+        for p, (i, j) in enumerate(self.pairs):
+            r[:, i, j] = pairwise[:, p]
+            r[:, j, i] = 1 - pairwise[:, p]
+
+        if n_classes == 2:
+            return np.column_stack([r[:, 0, 1], r[:, 1, 0]])
+
+        # Per-call NumPy overhead dominates for a handful of rows
+        if len(r) <= SMALL_BATCH:
+            return np.array([_couple_pairwise_row(row.tolist()) for row in r])
+
+        return _couple_pairwise(r)
+
+def _couple_pairwise(r):
+    """
+    libsvm's multiclass_probability (Wu, Lin and Weng, method 2), vectorized over rows
+    """
+    n_rows, k, _ = r.shape
+
+    # Q[t, t] = sum_{j != t} r[j, t]^2, Q[t, j] = -r[j, t] * r[t, j]
+    r_t = np.transpose(r, (0, 2, 1))
+    Q = -r_t * r
+    idx = np.arange(k)
+    Q[:, idx, idx] = (r_t ** 2).sum(axis=2) - r_t[:, idx, idx] ** 2
+
+    p = np.full((n_rows, k), 1 / k)
+    eps = 0.005 / k
+
+    for _ in range(max(100, k)):
+        Qp = np.einsum('ntj,nj->nt', Q, p)
+        pQp = (p * Qp).sum(axis=1)
+
+        # Converged rows are left alone, as libsvm stops per sample
+        active = np.abs(Qp - pQp[:, None]).max(axis=1) >= eps
+        if not active.any():
+            break
+
+        if active.all():
+            Q_a, p_a = Q, p
+        else:
+            rows = np.flatnonzero(active)
+            Q_a, p_a, Qp, pQp = Q[rows], p[rows], Qp[rows], pQp[rows]
+
+        for t in range(k):
+            Q_tt = Q_a[:, t, t]
+            diff = (pQp - Qp[:, t]) / Q_tt
+            p_a[:, t] += diff
+            scale = 1 + diff
+            pQp = (pQp + diff * (diff * Q_tt + 2 * Qp[:, t])) / scale ** 2
+            Qp = (Qp + diff[:, None] * Q_a[:, t, :]) / scale[:, None]
+            p_a /= scale[:, None]
+
+        if p_a is not p:
+            p[rows] = p_a
+
+    return p
+
+def _couple_pairwise_row(r):
+    """
+    Direct transcription of libsvm's multiclass_probability for one sample
+    """
+    k = len(r)
+    Q = [[-r[j][t] * r[t][j] for j in range(k)] for t in range(k)]
+    for t in range(k):
+        Q[t][t] = sum(r[j][t] ** 2 for j in range(k) if j != t)
+
+    p = [1 / k] * k
+    eps = 0.005 / k
+
+    for _ in range(max(100, k)):
+        Qp = [sum(Q[t][j] * p[j] for j in range(k)) for t in range(k)]
+        pQp = sum(p[t] * Qp[t] for t in range(k))
+
+        if max(abs(Qp[t] - pQp) for t in range(k)) < eps:
+            break
+
+        for t in range(k):
+            diff = (-Qp[t] + pQp) / Q[t][t]
+            p[t] += diff
+            pQp = (pQp + diff * (diff * Q[t][t] + 2 * Qp[t])) / (1 + diff) / (1 + diff)
+            for j in range(k):
+                Qp[j] = (Qp[j] + diff * Q[t][j]) / (1 + diff)
+                p[j] /= 1 + diff
+
+    return p
+
+def _file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def load_svm_kernel():
+    """
+    Return the NumPy scorer if it was exported from the current SVM pickle
+    """
+    registry = get_model_registry()
+    try:
+        kernel = registry.get('risk_kernel')
+    except Exception:
+        # A missing or unreadable export just means the pickle is used
+        return None
+
+    if kernel is None or kernel.source_digest != registry.digest('risk_classifier'):
+        return None
+
+    return kernel
+
+def export_svm_kernel(model_path='models/svm_risk_category_model.pkl',
+                      scaler_path='models/risk_category_scaler.pkl',
+                      output=KERNEL_PATH):
+    """
+    Extract the arrays the NumPy scorer needs from a pickled SVC and scaler
+    """
+    import joblib
+
+    model = joblib.load(model_path)
+    if not hasattr(model, 'support_vectors_') or not getattr(model, 'probability', False):
+        raise ValueError(f"{model_path} is not an SVC trained with probability=True")
+
+    # sklearn flips the sign of the binary case; undo it to get libsvm's values
+    dual_coef = model.dual_coef_
+    intercept = model.intercept_
+    if len(model.classes_) == 2:
+        dual_coef = -dual_coef
+        intercept = -intercept
+
+    arrays = {
+        'classes': np.asarray(model.classes_).astype(str),
+        'kernel': np.array(model.kernel),
+        'gamma': np.array(model._gamma),
+        'coef0': np.array(model.coef0),
+        'degree': np.array(model.degree),
+        'support_vectors': model.support_vectors_,
+        'n_support': model.n_support_,
+        'dual_coef': dual_coef,
+        'intercept': intercept,
+        'prob_a': model.probA_,
+        'prob_b': model.probB_,
+        'source_digest': np.array(_file_digest(model_path))
+    }
+    if hasattr(model, 'feature_names_in_'):
+        arrays['feature_names'] = np.asarray(model.feature_names_in_).astype(str)
+
+    # Bundle the scaler so the prediction path doesn't unpickle sklearn objects
+    if scaler_path and os.path.exists(scaler_path):
+        scaler = joblib.load(scaler_path)
+        arrays['scaler_mean'] = scaler.mean_ if scaler.mean_ is not None else np.zeros(scaler.n_features_in_)
+        arrays['scaler_scale'] = scaler.scale_ if scaler.scale_ is not None else np.ones(scaler.n_features_in_)
+        arrays['scaler_digest'] = np.array(_file_digest(scaler_path))
+        if hasattr(scaler, 'feature_names_in_'):
+            arrays['scaler_feature_names'] = np.asarray(scaler.feature_names_in_).astype(str)
+
+    # np.savez adds .npz to names without it, so keep the suffix on the temp file
+    tmp_path = f"{output}.tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, output)
+
+    return output
+
+# Resolved and shared through the model registry like the pickled models
+get_model_registry().register('risk_kernel', [KERNEL_PATH], loader=SVMKernelScorer.load)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the SVM risk model for the NumPy scorer")
+    parser.add_argument('--model', default='models/svm_risk_category_model.pkl')
+    parser.add_argument('--scaler', default='models/risk_category_scaler.pkl')
+    parser.add_argument('--output', default=KERNEL_PATH)
+    args = parser.parse_args()
+
+    print(f"Wrote {export_svm_kernel(args.model, args.scaler, args.output)}")
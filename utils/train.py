@@ -0,0 +1,271 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from utils.feature_store import LABELLED_STORE, load_feature_store
+from utils.model_registry import get_model_registry
+from utils.scaling import LABELS_DATA, RAW_DATA, SCALING_PATH, labelled_csv
+
+# Features the risk classifier is trained on, as stored in risk_category_features.pkl
+RISK_FEATURES = [
+    'Curricular_units_1st_sem_enrolled', 'Curricular_units_1st_sem_approved',
+    'Passing_ratio_1st_sem', 'Participation_ratio_1st_sem', 'Admission_grade',
+    'Previous_qualification_grade', 'Grade_difference', 'Age_at_enrollment',
+    'Gender', 'Marital_status', 'International', 'Scholarship_holder', 'Debtor',
+    'Tuition_fees_up_to_date', 'Mothers_qualification', 'Fathers_qualification',
+    'Mothers_occupation', 'Application_order', 'Application_mode'
+]
+
+TARGET = 'Risk_Category'
+
+# Search space for the RBF SVM
+DEFAULT_C = [0.1, 1.0, 10.0, 100.0]
+DEFAULT_GAMMA = [0.005, 0.01, 0.05, 0.1, 0.5]
+
+VERSIONS_DIR = 'models/versions'
+
+def load_training_data(path=None):
+    """
+    Feature frame and risk labels from the labelled dataset, or from a
+    labelled CSV at `path`.
+
+    Read through the memory-mapped feature store, which is built from
+    data.csv and its labels chunk by chunk, so only the training columns
+    are paged in and the labelled table is never held whole.
+    """
+    store = load_feature_store(path)
+    missing = [col for col in RISK_FEATURES + [TARGET] if col not in store.columns]
+    if missing:
+        raise ValueError(f"{path or LABELLED_STORE} is missing columns: {missing}")
+
+    X = pd.DataFrame(store.matrix(RISK_FEATURES).astype(np.float64), columns=RISK_FEATURES)
+    return X, store.column(TARGET)
+
+def fold_splits(y, n_folds=5, random_state=42):
+    """
+    Stratified fold indices, computed once and shared by every candidate
+    """
+    from sklearn.model_selection import StratifiedKFold
+
+    folds = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=random_state)
+    return list(folds.split(np.zeros(len(y)), y))
+
+def squared_distances(X):
+    """
+    Pairwise squared Euclidean distances, the part of the RBF kernel shared by all gammas
+    """
+    sq_norms = np.einsum('ij,ij->i', X, X)
+    D = X @ X.T
+    D *= -2
+    D += sq_norms[:, None]
+    D += sq_norms[None, :]
+    return np.maximum(D, 0, out=D)
+
+def _fit_fold(K, y, train, test, C):
+    """
+    Fit one candidate on one fold from the precomputed kernel matrix
+    """
+    from sklearn.svm import SVC
+
+    start = time.perf_counter()
+    model = SVC(kernel='precomputed', C=C).fit(K[np.ix_(train, train)], y[train])
+    fit_seconds = time.perf_counter() - start
+
+    score = float((model.predict(K[np.ix_(test, train)]) == y[test]).mean())
+    return score, fit_seconds
+
+def grid_search(X, y, C_values=DEFAULT_C, gamma_values=DEFAULT_GAMMA, n_folds=5, n_jobs=-1, random_state=42):
+    """
+    Cross-validated grid search over C and gamma on all cores.
+
+    The distance matrix is computed once, and the kernel matrix once per
+    gamma. joblib memory-maps each kernel matrix, so all workers scoring the
+    C values and folds for that gamma read the same copy instead of
+    recomputing it per candidate.
+    """
+    splits = fold_splits(y, n_folds, random_state)
+    D = squared_distances(np.asarray(X, dtype=np.float64))
+
+    candidates = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        with Parallel(n_jobs=n_jobs, temp_folder=cache_dir, max_nbytes='1M') as parallel:
+            for gamma in gamma_values:
+                K = np.exp(-gamma * D)
+
+                results = parallel(
+                    delayed(_fit_fold)(K, y, train, test, C)
+                    for C in C_values
+                    for train, test in splits
+                )
+
+                # Results come back in submission order, one run of folds per C
+                for i, C in enumerate(C_values):
+                    scores, fit_seconds = zip(*results[i * n_folds:(i + 1) * n_folds])
+                    candidates.append({
+                        'C': float(C),
+                        'gamma': float(gamma),
+                        'mean_score': float(np.mean(scores)),
+                        'std_score': float(np.std(scores)),
+                        'fold_scores': list(scores),
+                        'mean_fit_seconds': float(np.mean(fit_seconds))
+                    })
+
+                del K
+
+    return candidates
+
+def _file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def _sources_digest():
+    # The labelled table is fully determined by data.csv, its labels and the scaling
+    return hashlib.sha256(''.join(_file_digest(path) for path in (RAW_DATA, LABELS_DATA, SCALING_PATH)).encode()).hexdigest()
+
+def train_risk_classifier(data_path=None, output_dir=VERSIONS_DIR,
+                          C_values=DEFAULT_C, gamma_values=DEFAULT_GAMMA, n_folds=5,
+                          n_jobs=-1, random_state=42, publish=False):
+    """
+    Search, fit and save a versioned set of risk classifier artifacts.
+
+    Writes the model, scaler, feature list and a training_metadata.json with
+    the search results and timings to output_dir/<version>. The features
+    are columns of the labelled table, min-max scaled from data.csv, so a
+    copy of those scaling parameters is kept with the version as well; the
+    serving pipeline applies the same two steps to form and roster input.
+    With `publish`, the new artifacts also replace the live ones in models/.
+    """
+    import sklearn
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.svm import SVC
+
+    timings = {}
+    started = time.perf_counter()
+
+    # Load and scale the features
+    start = time.perf_counter()
+    X, y = load_training_data(data_path)
+    scaler = StandardScaler().fit(X)
+    X_scaled = scaler.transform(X)
+    timings['load_seconds'] = time.perf_counter() - start
+
+    # Cross-validated search
+    start = time.perf_counter()
+    candidates = grid_search(X_scaled, y, C_values, gamma_values, n_folds, n_jobs, random_state)
+    timings['search_seconds'] = time.perf_counter() - start
+    best = max(candidates, key=lambda candidate: candidate['mean_score'])
+
+    # Refit the best candidate on all rows, with probabilities for the dashboard
+    start = time.perf_counter()
+    model = SVC(kernel='rbf', C=best['C'], gamma=best['gamma'], probability=True, random_state=random_state)
+    model.fit(X_scaled, y)
+    timings['final_fit_seconds'] = time.perf_counter() - start
+    timings['total_seconds'] = time.perf_counter() - started
+
+    # Versioned output directory, never overwritten
+    version = time.strftime('%Y%m%d-%H%M%S')
+    version_dir = os.path.join(output_dir, version)
+    os.makedirs(version_dir)
+
+    joblib.dump(model, os.path.join(version_dir, 'svm_risk_category_model.pkl'))
+    joblib.dump(scaler, os.path.join(version_dir, 'risk_category_scaler.pkl'))
+    joblib.dump(list(RISK_FEATURES), os.path.join(version_dir, 'risk_category_features.pkl'))
+    shutil.copyfile(SCALING_PATH, os.path.join(version_dir, 'feature_scaling.json'))
+
+    metadata = {
+        'version': version,
+        'data_path': data_path or LABELLED_STORE,
+        'data_digest': _file_digest(data_path) if data_path else _sources_digest(),
+        'n_rows': int(len(y)),
+        'features': list(RISK_FEATURES),
+        'feature_scaling_digest': _file_digest(SCALING_PATH),
+        'class_counts': {str(label): int(count) for label, count in zip(*np.unique(y, return_counts=True))},
+        'n_folds': n_folds,
+        'random_state': random_state,
+        'n_jobs': n_jobs,
+        'sklearn_version': sklearn.__version__,
+        'best_params': {'C': best['C'], 'gamma': best['gamma']},
+        'best_score': best['mean_score'],
+        'n_support_vectors': int(len(model.support_vectors_)),
+        'candidates': candidates,
+        'timings': timings
+    }
+    with open(os.path.join(version_dir, 'training_metadata.json'), 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+    if publish:
+        metadata['serving_agreement'] = publish_version(version_dir)
+
+    return version_dir, metadata
+
+def publish_version(version_dir):
+    """
+    Make a versioned set of artifacts the live models.
+
+    The version must have been trained on the live feature scaling, which
+    the serving pipeline applies before the scaler. Returns the agreement
+    of the served predictions with the new model, see check_scoring_paths.
+    """
+    with open(os.path.join(version_dir, 'training_metadata.json'), 'r') as f:
+        metadata = json.load(f)
+    if metadata.get('feature_scaling_digest') != _file_digest(SCALING_PATH):
+        raise ValueError(
+            f"{version_dir} was trained on a different feature scaling than {SCALING_PATH}; "
+            "retrain it on the current labelled dataset"
+        )
+
+    registry = get_model_registry()
+    model = joblib.load(os.path.join(version_dir, 'svm_risk_category_model.pkl'))
+    scaler = joblib.load(os.path.join(version_dir, 'risk_category_scaler.pkl'))
+    features = joblib.load(os.path.join(version_dir, 'risk_category_features.pkl'))
+
+    # Each file is swapped atomically; the classifier goes last so the
+    # scaler it expects is already in place
+    registry.publish('risk_features', features)
+    registry.publish('risk_scaler', scaler)
+    registry.publish('risk_classifier', model)
+
+    # Refresh the NumPy export, the old one no longer matches the pickle
+    from utils.svm_kernel import export_svm_kernel
+    export_svm_kernel()
+
+    # Score data.csv the way the pages do and compare with the new model
+    from utils.classification import check_scoring_paths
+    from utils.scaling import RAW_DATA
+
+    labelled = pd.read_csv(labelled_csv())
+    raw = pd.read_csv(RAW_DATA, sep=';', encoding='utf-8-sig')
+    return check_scoring_paths(raw.iloc[:len(labelled)], labelled)['full']
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the SVM risk classifier with a parallel grid search")
+    parser.add_argument('--data', default=None, help="a labelled CSV; the labelled table built from data.csv and its labels by default")
+    parser.add_argument('--output-dir', default=VERSIONS_DIR)
+    parser.add_argument('--C', type=float, nargs='+', default=DEFAULT_C)
+    parser.add_argument('--gamma', type=float, nargs='+', default=DEFAULT_GAMMA)
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--jobs', type=int, default=-1, help="parallel workers, -1 for all cores")
+    parser.add_argument('--publish', action='store_true', help="replace the live models in models/")
+    args = parser.parse_args()
+
+    version_dir, metadata = train_risk_classifier(
+        args.data, args.output_dir, args.C, args.gamma, args.folds, args.jobs, publish=args.publish
+    )
+
+    print(f"Wrote {version_dir}")
+    print(f"Best C={metadata['best_params']['C']}, gamma={metadata['best_params']['gamma']}: "
+          f"{metadata['best_score']:.4f} mean CV accuracy")
+    print(f"Search {metadata['timings']['search_seconds']:.1f}s, "
+          f"final fit {metadata['timings']['final_fit_seconds']:.1f}s")
+    if args.publish:
+        print(f"Published to models/, served predictions matching the new model: {metadata['serving_agreement']:.1%}")